@@ -8,7 +8,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.fft import fft2, fftshift, ifft2, ifftshift
 from PIL import Image
-from diffraction_propagation import angular_spectrum
+from diffraction_propagation import angular_spectrum, lens_propagation
 path = r"C:\Users\baoch\Downloads\AC7_YF-23_Flyby.png"
 
 
@@ -61,24 +61,16 @@ def lens_phase(shape, wavelength, focal_length, dx):
     return np.exp(-1j * k * (X**2 + Y**2) / (2 * focal_length))
 
 def fourier_4f_system_physical(input_img, wavelength, focal_length, pixel_size, filter_mask=None):
-    # Apply lens 1 phase
-    lens1 = lens_phase(input_img.shape, wavelength, focal_length, pixel_size)
-    field = input_img * lens1
-
-    # Propagate from input plane to Fourier plane
-    field = angular_spectrum(field, wavelength, focal_length, pixel_size)
+    # Lens 1 + propagation over f : scaled Fourier transform, the lens phase is never sampled
+    field, fourier_pixel = lens_propagation(input_img, wavelength, focal_length, focal_length, pixel_size)
 
 #    if filter_mask is not None:
 #        field_filtered = field * filter_mask
 #    else:
     field_filtered = field
 
-    # Apply lens 2 phase
-    lens2 = lens_phase(input_img.shape, wavelength, focal_length, pixel_size)
-    field_filtered *= lens2
-
-    # Propagate to image plane
-    field_out = angular_spectrum(field_filtered, wavelength, focal_length, pixel_size)
+    # Lens 2 + propagation over f, on the grid of the Fourier plane (back to pixel_size)
+    field_out, _ = lens_propagation(field_filtered, wavelength, focal_length, focal_length, fourier_pixel)
 
     return (
         np.abs(field)**2,               # Fourier plane (before filter)
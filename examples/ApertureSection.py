@@ -7,10 +7,13 @@ import sys
 import os
 
 from DiffractionSection import RealTimeCrossSectionViewer
-from apertures import elliptical_aperture, rectangular_aperture, elliptical_aperture_array, square_aperture_array, slit_aperture, estimate_aperture_extent
+from apertures import elliptical_aperture, rectangular_aperture, elliptical_aperture_array, square_aperture_array, slit_aperture, estimate_aperture_extent, element_stamp, point_list_aperture, random_centers, hexagonal_centers, slit_model, square_array_model, elliptical_array_model
 from automatic_sizing import zero_pad
+from binary_mask import BinaryMask
+from aperture_model import Ellipse, Rectangle, render
 from PIL import Image
 import tifffile
+from collections import OrderedDict
 
 class ApertureSection(QWidget):
     def __init__(self):
@@ -21,6 +24,11 @@ class ApertureSection(QWidget):
         self.aperture_size = ("150","150") 
 
         self.doe_mode = False
+        self.antialias = False
+
+        # rendered aperture expressions (packed masks), by (expression, array shape, sampling)
+        self.model_cache = OrderedDict()
+        self.model_cache_size = 16
 
 
         #slit shape details
@@ -34,6 +42,7 @@ class ApertureSection(QWidget):
         self.big_diameter = "10"
         self.small_diameter = "5" 
         self.square_size = "5"
+        self.n_elements = "1000"    #random pinholes
 
         self.distance_unit = "µm"
 
@@ -93,12 +102,18 @@ class ApertureSection(QWidget):
         self.shape_widget = QWidget()
         self.shape_widget_layout = QHBoxLayout(self.shape_widget)
         self.shape_combo = QComboBox()
-        self.shape_combo.addItems(["Elliptic", "Rectangular", "Slit", "Array of ellipses", "Array of rectangles", "Image"])
+        self.shape_combo.addItems(["Elliptic", "Rectangular", "Slit", "Array of ellipses", "Array of rectangles", "Random pinholes", "Hexagonal lattice", "Image"])
         self.shape_combo.setCurrentText(self.aperture_shape)
 
         self.shape_widget_layout.addWidget(shape_label)
         self.shape_widget_layout.addSpacing(20)
         self.shape_widget_layout.addWidget(self.shape_combo)
+        self.shape_widget_layout.addSpacing(20)
+
+        # fractional coverage of the edge pixels : accurate diffraction on coarser grids
+        self.antialias_checkbox = QCheckBox("Anti-aliasing")
+        self.antialias_checkbox.setChecked(self.antialias)
+        self.shape_widget_layout.addWidget(self.antialias_checkbox)
         self.shape_widget_layout.addStretch()
         self.page_layout.addWidget(self.shape_widget)
     def setup_aperture_details(self):
@@ -229,7 +244,21 @@ class ApertureSection(QWidget):
         self.matrix_spacing_widget_layout.addStretch()
 
 
+        self.n_elements_widget = QWidget()
+        self.n_elements_widget_layout = QHBoxLayout(self.n_elements_widget)
+        n_elements_label = QLabel("Number of elements")
+
+        self.n_elements_line_edit = QLineEdit()
+        self.n_elements_line_edit.setFixedWidth(100)
+        self.n_elements_line_edit.setText(self.n_elements)
+
+        self.n_elements_widget_layout.addWidget(n_elements_label)
+        self.n_elements_widget_layout.addSpacing(20)
+        self.n_elements_widget_layout.addWidget(self.n_elements_line_edit)
+        self.n_elements_widget_layout.addStretch()
+
         self.array_aperture_widget_layout.addWidget(self.array_matrix_widget)
+        self.array_aperture_widget_layout.addWidget(self.n_elements_widget)
         self.array_aperture_widget_layout.addWidget(self.matrix_spacing_widget)
         self.page_layout.addWidget(self.array_aperture_widget)
 
@@ -345,10 +374,12 @@ class ApertureSection(QWidget):
         self.slit_distance_line_edit.textChanged.connect(self.update_aperture_graph)
 
         self.doe_mode_checkbox.stateChanged.connect(self.update_aperture_graph)
+        self.antialias_checkbox.stateChanged.connect(self.update_aperture_graph)
         # Array aperture
         self.matrix_h_line_edit.textChanged.connect(self.update_aperture_graph)
         self.matrix_w_line_edit.textChanged.connect(self.update_aperture_graph)
         self.matrix_spacing_line_edit.textChanged.connect(self.update_aperture_graph)
+        self.n_elements_line_edit.textChanged.connect(self.update_aperture_graph)
 
         self.hel_bd_line_edit.textChanged.connect(self.update_aperture_graph)
         self.hel_sd_line_edit.textChanged.connect(self.update_aperture_graph)
@@ -366,12 +397,15 @@ class ApertureSection(QWidget):
         self.simple_aperture_widget.hide()
         self.slit_aperture_widget.hide()
         self.array_aperture_widget.hide()
+        self.array_matrix_widget.hide()
+        self.n_elements_widget.hide()
         self.hel_bd_widget.hide()
         self.hel_sd_widget.hide()
         self.squ_array_widget.hide()
         self.img_import_widget.hide()
         self.use_img_as_widget.hide()
         self.doe_mode_checkbox.hide()
+        self.antialias_checkbox.setVisible(text != "Image")
 
         # Show only the relevant widgets
         if text == "Elliptic" or text == "Rectangular":  # Fixed condition
@@ -380,11 +414,21 @@ class ApertureSection(QWidget):
             self.slit_aperture_widget.show()
         elif text == "Array of ellipses":
             self.array_aperture_widget.show()
+            self.array_matrix_widget.show()
             self.hel_bd_widget.show()
             self.hel_sd_widget.show()
         elif text == "Array of rectangles":
             self.array_aperture_widget.show()
+            self.array_matrix_widget.show()
             self.squ_array_widget.show()
+        elif text in ["Random pinholes", "Hexagonal lattice"]:
+            # elements spread over the aperture size, spacing = pitch (minimum distance for random pinholes)
+            self.simple_aperture_widget.show()
+            self.array_aperture_widget.show()
+            self.hel_bd_widget.show()
+            self.hel_sd_widget.show()
+            if text == "Random pinholes":
+                self.n_elements_widget.show()
         elif text == "Image":
             self.img_import_widget.show()
             self.use_img_as_widget.show()
@@ -405,6 +449,8 @@ class ApertureSection(QWidget):
             "big_diameter": self.big_diameter,
             "small_diameter": self.small_diameter,
             "square_size": self.square_size,
+            "n_elements": self.n_elements,
+            "antialias": self.antialias,
             "img_path" : self.img_path
         }
     def generate_aperture(self):
@@ -412,22 +458,35 @@ class ApertureSection(QWidget):
         shape = params["aperture_shape"]
         array_shape = tuple(map(int,self.array_shape))
         dx = float(self.sampling)
+        antialias = params["antialias"]
         if shape == "Elliptic":
             size = tuple(map(int, params["aperture_size"]))
             assert max(size) <= max((dx*array_shape[0], dx*array_shape[1]))
-            return elliptical_aperture(shape=array_shape,size=size, dx = dx)
+            if not antialias:
+                return self.render_model(Ellipse(*size), array_shape, dx)
+            return elliptical_aperture(shape=array_shape,size=size, dx = dx, antialias=antialias)
 
         elif shape == "Rectangular":
             size = tuple(map(int, params["aperture_size"]))
             assert max(size) < max((dx*array_shape[0], dx*array_shape[1]))
-            return rectangular_aperture(shape=array_shape,size=size, dx=dx)
+            if not antialias:
+                # same pixel grid as rectangular_aperture : origin at pixel (ceil(h/2), ceil(w/2))
+                origin = (-(-array_shape[0] // 2), -(-array_shape[1] // 2))
+                return self.render_model(Rectangle(*size), array_shape, dx, origin)
+            return rectangular_aperture(shape=array_shape,size=size, dx=dx, antialias=antialias)
 
         elif shape == "Slit":
             size = tuple(map(int, self.aperture_size))
             width = int(params["slit_width"])
             distance = int(params["slit_distance"])
             assert max(size) <= max((dx*array_shape[0], dx*array_shape[1]))
-            return slit_aperture(shape=array_shape,size=size, d=distance, W=width, dx=dx)
+            if not antialias:
+                # expression in pixels, same mask as slit_aperture
+                model = slit_model(array_shape, size, width, distance, dx)
+                if model is None:
+                    return BinaryMask.zeros(array_shape)
+                return self.render_model(model, array_shape, 1.0, (0, 0))
+            return slit_aperture(shape=array_shape,size=size, d=distance, W=width, dx=dx, antialias=antialias)
 
         elif shape == "Array of ellipses":
             matrix = tuple(map(int, params["array_matrix"]))
@@ -437,7 +496,10 @@ class ApertureSection(QWidget):
             new_size = estimate_aperture_extent(big_diameter=big_d,small_diameter=small_d, spacing=spacing, grid_size=matrix)
             assert max(new_size) <= max((dx*array_shape[0], dx*array_shape[1]))
             self.aperture_size = tuple(map(str,new_size))
-            return elliptical_aperture_array(shape=array_shape,grid_size=matrix, spacing=spacing, big_diameter=big_d, small_diameter=small_d, dx=dx)
+            if not antialias:
+                model = elliptical_array_model(array_shape, big_d, small_d, spacing, matrix, dx)
+                return self.render_model(model, array_shape, 1.0, (0, 0))
+            return elliptical_aperture_array(shape=array_shape,grid_size=matrix, spacing=spacing, big_diameter=big_d, small_diameter=small_d, dx=dx, antialias=antialias)
 
 
         elif shape == "Array of rectangles":
@@ -448,7 +510,21 @@ class ApertureSection(QWidget):
             new_size = estimate_aperture_extent(big_diameter=square_size,small_diameter=square_size, spacing=spacing, grid_size=matrix)
             assert max(new_size) <= max((dx*array_shape[0], dx*array_shape[1]))
             self.aperture_size = tuple(map(str,new_size))
-            return square_aperture_array(shape=array_shape,grid_size=matrix, spacing=spacing, square_size=square_size, dx=dx)
+            if not antialias:
+                model = square_array_model(array_shape, square_size, spacing, matrix, dx)
+                return self.render_model(model, array_shape, 1.0, (0, 0))
+            return square_aperture_array(shape=array_shape,grid_size=matrix, spacing=spacing, square_size=square_size, dx=dx, antialias=antialias)
+
+        elif shape in ["Random pinholes", "Hexagonal lattice"]:
+            size = tuple(map(float, params["aperture_size"]))
+            spacing = float(params["array_spacing"])
+            stamp = element_stamp((float(params["big_diameter"]), float(params["small_diameter"])), dx=dx, antialias=antialias)
+            assert max(size) <= max((dx*array_shape[0], dx*array_shape[1]))
+            if shape == "Random pinholes":
+                centers = random_centers(int(params["n_elements"]), size, min_distance=spacing)
+            else:
+                centers = hexagonal_centers(size, spacing)
+            return point_list_aperture(array_shape, centers, stamp, dx=dx)
         
         elif shape == "Image":
             img = self.open_image()
@@ -457,11 +533,42 @@ class ApertureSection(QWidget):
             else:
                 return np.exp(1j*img)
               
+    def render_model(self, model, array_shape, dx, origin=None):
+        """
+        Render an aperture expression (see aperture_model), or reuse its cached mask.
+
+        Args:
+            model (ApertureNode): Aperture expression.
+            array_shape (tuple): Output size (height, width) in pixels.
+            dx (float): Sampling rate, 1.0 for expressions in pixels.
+            origin (tuple): Pixel of the coordinate origin, see aperture_model.render.
+
+        Returns:
+            BinaryMask: (height, width) mask.
+        """
+        key = (repr(model), array_shape, dx, origin)
+        if key in self.model_cache:
+            self.model_cache.move_to_end(key)  # least recently used first
+        else:
+            if len(self.model_cache) >= self.model_cache_size:
+                self.model_cache.popitem(last=False)
+            self.model_cache[key] = render(model, array_shape, dx, origin=origin)
+        return self.model_cache[key]
+
     def update_aperture_graph(self):
         self.update_attributes()  # sync attributes from widgets before generating aperture
         aperture = self.generate_aperture()
-        self.aperture = np.repeat(aperture[np.newaxis, :, :], 1, axis=0)
-        self.graph_widget.update_data(self.aperture)
+        if isinstance(aperture, BinaryMask):
+            # rendered expression : already packed
+            self.graph_widget.update_data(aperture.unpack(np.float32)[np.newaxis, :, :])
+            self.aperture = BinaryMask(aperture.packed[np.newaxis], (1, *aperture.shape))
+            return
+        self.graph_widget.update_data(aperture[np.newaxis, :, :])
+        # binary apertures are kept packed (1 bit per pixel), unpacked only at the propagator
+        if BinaryMask.is_binary(aperture):
+            self.aperture = BinaryMask.from_array(aperture[np.newaxis, :, :])
+        else:
+            self.aperture = aperture[np.newaxis, :, :]
 
     def update_attributes(self):
         try:
@@ -469,6 +576,7 @@ class ApertureSection(QWidget):
             self.distance_unit = self.unit_combo.currentText()
             self.graph_widget.sampling = float(self.sampling)
             self.doe_mode = True if self.doe_mode_checkbox.isChecked() else False
+            self.antialias = self.antialias_checkbox.isChecked()
 
             if self.aperture_shape in ["Elliptic", "Rectangular"]:
                 self.aperture_size = (self.simple_size_h_line_edit.text(), self.simple_size_w_line_edit.text())
@@ -485,6 +593,12 @@ class ApertureSection(QWidget):
                 self.array_matrix = (self.matrix_h_line_edit.text(), self.matrix_w_line_edit.text())
                 self.array_spacing = self.matrix_spacing_line_edit.text()
                 self.square_size = self.squ_square_size_line_edit.text()
+            elif self.aperture_shape in ["Random pinholes", "Hexagonal lattice"]:
+                self.aperture_size = (self.simple_size_h_line_edit.text(), self.simple_size_w_line_edit.text())
+                self.array_spacing = self.matrix_spacing_line_edit.text()
+                self.big_diameter = self.hel_bd_line_edit.text()
+                self.small_diameter = self.hel_sd_line_edit.text()
+                self.n_elements = self.n_elements_line_edit.text()
             if "array" in self.aperture_shape.lower():
                 self.array_matrix = (
                     self.matrix_h_line_edit.text(),
@@ -1,7 +1,7 @@
 import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QWidget, QCheckBox,
-    QSplitter, QLabel, QGridLayout , QPushButton, QFileDialog, QHBoxLayout,QLineEdit, QSizePolicy, QProgressBar
+    QSplitter, QLabel, QGridLayout , QPushButton, QFileDialog, QHBoxLayout,QLineEdit, QSizePolicy, QProgressBar, QComboBox
 )
 from PyQt5.QtCore import Qt, QSize
 from PyQt5.QtGui import QIcon
@@ -12,7 +12,10 @@ from SimulationSection import SimulationSection
 from GenericThread import GenericThread
 import sys
 from PIL import Image
-from ifmta.ifta import IftaImproved
+from ifmta.ifta import IftaImproved, IftaFresnel, IftaResume
+from ifmta.gradient import GradientDesign
+from ifmta.autotune import IftaAutotune
+from ifmta.tools import IsBinaryPhase, PropagationKernel
 from automatic_sizing import zero_pad
 from ressource_path import resource_path
 import tifffile
@@ -24,10 +27,16 @@ class DOEDesignSimulation(QMainWindow):
         self.nbiter_ph1 = "25"
         self.nbiter_ph2 = "25"
         self.rfact = "1.2"
+        self.design_plane = "Infinity"
+        self.engine = "IFTA"
+        self.delta_power = "1.0"
+        self.real_fft = 0
+        self.autotune_time = "120"
         self.seed = 0
         self.compute_efficiency = 0
         self.compute_uniformity = 0
         self.npy_path = None
+        self.checkpoint_path = None
 
         self.phases = None
         self.doe = None
@@ -80,10 +89,15 @@ class DOEDesignSimulation(QMainWindow):
         self.setup_rfact()
         self.setup_nbiter_amp()
         self.setup_nbiter_pha()
+        self.setup_design_plane()
+        self.setup_engine()
+        self.setup_delta_power()
+        self.setup_autotune_time()
         self.setup_extras() #for efficiency and uniformity, if needed
 
         self.left_layout.addWidget(splitter)
         self.left_layout.addWidget(self.ifta_params_widget)
+        self.setup_preview()
         splitter_.addWidget(self.left)
         splitter_.addWidget(self.simulation_section)
 
@@ -153,6 +167,118 @@ class DOEDesignSimulation(QMainWindow):
         self.ifta_params_widget_layout.addWidget(self.nbiter_pha_widget, 0, 2)
 
 
+    def setup_design_plane(self):
+
+        self.design_plane_widget = QWidget()
+        self.design_plane_widget_layout = QHBoxLayout(self.design_plane_widget)
+
+        design_plane_label = QLabel("Target plane")
+
+        # Infinity : IFTA (Fourier transforms). Otherwise the target is set at the simulation distance
+        self.design_plane_combo = QComboBox()
+        self.design_plane_combo.addItems(["Infinity", "Fresnel", "Angular spectrum"])
+        self.design_plane_combo.setCurrentText(self.design_plane)
+
+        self.design_plane_widget_layout.addWidget(design_plane_label)
+        self.design_plane_widget_layout.addSpacing(20)
+        self.design_plane_widget_layout.addWidget(self.design_plane_combo)
+        self.design_plane_widget_layout.addStretch()
+
+        self.ifta_params_widget_layout.addWidget(self.design_plane_widget, 1, 0)
+
+
+    def setup_engine(self):
+
+        self.engine_widget = QWidget()
+        self.engine_widget_layout = QHBoxLayout(self.engine_widget)
+
+        engine_label = QLabel("Engine")
+
+        # Gradient engines : iterations phase 1 + 2 loss evaluations, phase 2 being the quantization
+        self.engine_combo = QComboBox()
+        self.engine_combo.addItems(["IFTA", "Gradient (L-BFGS)", "Gradient (Adam)"])
+        self.engine_combo.setCurrentText(self.engine)
+
+        self.engine_widget_layout.addWidget(engine_label)
+        self.engine_widget_layout.addSpacing(20)
+        self.engine_widget_layout.addWidget(self.engine_combo)
+        self.engine_widget_layout.addStretch()
+
+        self.ifta_params_widget_layout.addWidget(self.engine_widget, 1, 1)
+
+
+    def setup_delta_power(self):
+
+        self.delta_power_widget = QWidget()
+        self.delta_power_widget_layout = QHBoxLayout(self.delta_power_widget)
+
+        # IFTA phase 2 : delta_phase = pi/nlevels * (k/n)**power
+        delta_power_label = QLabel("Quantization schedule power")
+
+        self.delta_power_line_edit = QLineEdit()
+        self.delta_power_line_edit.setFixedWidth(100)
+        self.delta_power_line_edit.setText(self.delta_power)
+
+        # binary DOEs : second loop on real FFTs, twice cheaper, without quantization schedule
+        self.real_fft_checkbox = QCheckBox("Real FFT binary loop")
+        self.real_fft_checkbox.setToolTip("2 levels only : half the FFT cost, a few % less efficiency on targets "
+                                          "that are not point symmetric, no quantization schedule")
+        self.real_fft_checkbox.setChecked(int(self.real_fft))
+
+        self.delta_power_widget_layout.addWidget(delta_power_label)
+        self.delta_power_widget_layout.addSpacing(20)
+        self.delta_power_widget_layout.addWidget(self.delta_power_line_edit)
+        self.delta_power_widget_layout.addSpacing(20)
+        self.delta_power_widget_layout.addWidget(self.real_fft_checkbox)
+        self.delta_power_widget_layout.addStretch()
+
+        self.ifta_params_widget_layout.addWidget(self.delta_power_widget, 1, 2)
+
+
+    def setup_autotune_time(self):
+
+        self.autotune_time_widget = QWidget()
+        self.autotune_time_widget_layout = QHBoxLayout(self.autotune_time_widget)
+
+        # auto-tune : no new run after this time, empty for no limit
+        autotune_time_label = QLabel("Auto-tune time limit (s)")
+
+        self.autotune_time_line_edit = QLineEdit()
+        self.autotune_time_line_edit.setFixedWidth(100)
+        self.autotune_time_line_edit.setText(self.autotune_time)
+
+        self.autotune_time_widget_layout.addWidget(autotune_time_label)
+        self.autotune_time_widget_layout.addSpacing(20)
+        self.autotune_time_widget_layout.addWidget(self.autotune_time_line_edit)
+        self.autotune_time_widget_layout.addStretch()
+
+        self.ifta_params_widget_layout.addWidget(self.autotune_time_widget, 2, 0)
+
+
+    def setup_preview(self):
+        # live preview of the DOE design : phase and image irradiance, downsampled
+        self.preview_widget = pg.GraphicsLayoutWidget()
+        self.preview_widget.setFixedHeight(260)
+
+        self.preview_label = self.preview_widget.addLabel("", colspan=2)
+        self.preview_widget.nextRow()
+        phase_view = self.preview_widget.addViewBox(lockAspect=True, invertY=True)
+        self.preview_phase_item = pg.ImageItem(axisOrder="row-major")
+        phase_view.addItem(self.preview_phase_item)
+        image_view = self.preview_widget.addViewBox(lockAspect=True, invertY=True)
+        self.preview_image_item = pg.ImageItem(axisOrder="row-major")
+        image_view.addItem(self.preview_image_item)
+
+        self.left_layout.addWidget(self.preview_widget)
+        self.preview_widget.hide()
+
+    def on_ifta_preview(self, preview):
+        self.preview_label.setText(f"Iteration {preview['iteration']} / {preview['total']}")
+        self.preview_phase_item.setImage(preview["phase"], levels=(0, 255))
+        self.preview_image_item.setImage(preview["image"], levels=(0, 1))
+        self.preview_widget.show()
+
+
     def setup_extras(self):
 
         self.efficiency_checkbox = QCheckBox("Compute efficiency")
@@ -239,11 +365,23 @@ class DOEDesignSimulation(QMainWindow):
         self.sim_button.setFixedWidth(220)
 
 
+        self.autotune_button = QPushButton("Auto-tune")
+        self.autotune_button.setStyleSheet(button_style.format(color="orange", hover="#fff3e0"))
+        self.autotune_button.setFixedWidth(220)
+
         self.save_button = QPushButton("Save DOE")
         self.save_button.setIcon(QIcon(resource_path("icons/floppy-disk.png")))
         self.save_button.setIconSize(QSize(24, 24))
         self.save_button.setStyleSheet(button_style.format(color="blue", hover="#d2f1ff"))
 
+        self.resume_button = QPushButton("Resume")
+        self.resume_button.setToolTip("Continue an IFTA run from its checkpoint, with the iterations of the form")
+        self.resume_button.setStyleSheet(button_style.format(color="green", hover="#eaffea"))
+        self.resume_button.setFixedWidth(120)
+
+        self.checkpoint_checkbox = QCheckBox("Save checkpoints")
+        self.checkpoint_checkbox.setChecked(False)
+
         self.sim_checkbox = QCheckBox("Show Simulation Window")
         self.sim_checkbox.setChecked(False)
 
@@ -268,12 +406,18 @@ class DOEDesignSimulation(QMainWindow):
         self.buttons_widget_layout.addStretch()
         self.buttons_widget_layout.addWidget(self.sim_button)
         self.buttons_widget_layout.addSpacing(10)  # optional spacing
+        self.buttons_widget_layout.addWidget(self.autotune_button)
+        self.buttons_widget_layout.addSpacing(10)
+        self.buttons_widget_layout.addWidget(self.resume_button)
+        self.buttons_widget_layout.addSpacing(10)
         self.buttons_widget_layout.addWidget(self.progress)  # optional spacing
         self.progress.hide()
         self.buttons_widget_layout.addSpacing(10)
         self.buttons_widget_layout.addWidget(self.save_button)
         self.buttons_widget_layout.addSpacing(20)  # optional spacing
         self.buttons_widget_layout.addStretch()
+        self.buttons_widget_layout.addWidget(self.checkpoint_checkbox)
+        self.buttons_widget_layout.addSpacing(10)
         self.buttons_widget_layout.addWidget(self.sim_checkbox)
 
         self.left_layout.addWidget(self.buttons_widget)
@@ -281,6 +425,9 @@ class DOEDesignSimulation(QMainWindow):
 
     def setup_connections(self):
         self.sim_button.clicked.connect(self.start_sim_EOD)        
+        self.autotune_button.clicked.connect(self.start_autotune)
+        self.resume_button.clicked.connect(self.start_resume)
+        self.checkpoint_checkbox.toggled.connect(self.select_checkpoint_path)
         
         self.save_button.clicked.connect(self.save_file)
         self.efficiency_checkbox.stateChanged.connect(self.sync_inputs)
@@ -288,6 +435,11 @@ class DOEDesignSimulation(QMainWindow):
         self.rfact_line_edit.textChanged.connect(self.sync_inputs)
         self.nbiter_line_edit.textChanged.connect(self.sync_inputs)
         self.nbiter_pha_line_edit.textChanged.connect(self.sync_inputs)
+        self.design_plane_combo.currentTextChanged.connect(self.sync_inputs)
+        self.engine_combo.currentTextChanged.connect(self.sync_inputs)
+        self.delta_power_line_edit.textChanged.connect(self.sync_inputs)
+        self.real_fft_checkbox.stateChanged.connect(self.sync_inputs)
+        self.autotune_time_line_edit.textChanged.connect(self.sync_inputs)
 
         self.sim_doe.clicked.connect(self.run_simulation)
         self.sim_doe_sweep.clicked.connect(self.run_sweep)
@@ -313,6 +465,10 @@ class DOEDesignSimulation(QMainWindow):
         compute_efficiency = self.compute_efficiency
         compute_uniformity = self.compute_uniformity
         seed = self.seed
+        design_plane = self.design_plane
+        wavelength = float(self.simulation_section.wavelength)
+        distance = float(self.simulation_section.simulation_distance)
+        dx = float(eod_params["sampling"])
 
         print(nlevels, rfact, nbiter_ph1, nbiter_ph2, image_params["image_shape"])
 
@@ -325,8 +481,18 @@ class DOEDesignSimulation(QMainWindow):
                                         nlevels,
                                         compute_efficiency,
                                         compute_uniformity, 
-                                        seed)
+                                        seed,
+                                        design_plane=design_plane,
+                                        engine=self.engine,
+                                        delta_power=1. if self.real_fft else float(self.delta_power),
+                                        real_fft=self.real_fft,
+                                        checkpoint_path=self.checkpoint_path,
+                                        partial_kwarg="preview",
+                                        wavelength=wavelength,
+                                        distance=distance,
+                                        dx=dx)
         self.ifta_thread.progress_changed.connect(self.progress.setValue)
+        self.ifta_thread.partial_result.connect(self.on_ifta_preview)
         self.ifta_thread.finished_with_result.connect(self.on_ifta_done)
 
         self.progress.show()
@@ -338,11 +504,36 @@ class DOEDesignSimulation(QMainWindow):
 
     
     def sim_EOD(self, image, image_size, n_iter_ph1, n_iter_ph2, rfact, n_levels, 
-                      compute_efficiency, compute_uniformity, seed, callback=None):
-
-
+                      compute_efficiency, compute_uniformity, seed, design_plane="Infinity",
+                      wavelength=None, distance=None, dx=None, engine="IFTA", delta_power=1., real_fft=0, 
+                      checkpoint_path=None, preview=None, callback=None):
+
+        if engine != "IFTA":
+            kernel = None
+            if design_plane != "Infinity":
+                method = "fresnel" if design_plane == "Fresnel" else "angular_spectrum"
+                kernel = PropagationKernel(image_size, wavelength, distance, dx, method)
+            optimizer = "adam" if engine == "Gradient (Adam)" else "lbfgs"
+            n_iter = n_iter_ph1 + n_iter_ph2
+            if n_iter <= 0:
+                raise ValueError("The gradient engines need at least one iteration (phase 1 + phase 2)")
+            return GradientDesign(image, image_size=image_size, n_iter=n_iter, n_levels=n_levels, optimizer=optimizer,
+                                  quantization_ratio=n_iter_ph2/n_iter, kernel=kernel, 
+                                  compute_efficiency=compute_efficiency, compute_uniformity=compute_uniformity, 
+                                  seed=seed, preview=preview, callback=callback)
+
+        if design_plane != "Infinity":
+            method = "fresnel" if design_plane == "Fresnel" else "angular_spectrum"
+            return IftaFresnel(image, wavelength=wavelength, distance=distance, dx=dx, image_size=image_size, method=method,
+                               n_iter_ph1=n_iter_ph1, n_iter_ph2=n_iter_ph2, rfact=rfact, n_levels=n_levels, 
+                               compute_efficiency=compute_efficiency, compute_uniformity=compute_uniformity, seed=seed, 
+                               keep_history=False, preview=preview, callback=callback)
+
+        # real_fft : real FFT loop for binary DOEs, see IftaImproved
         phases = IftaImproved(image, image_size=image_size, n_iter_ph1=n_iter_ph1, n_iter_ph2=n_iter_ph2, rfact=rfact, n_levels=n_levels, 
-                      compute_efficiency=compute_efficiency, compute_uniformity=compute_uniformity, seed=seed, callback=callback)
+                      compute_efficiency=compute_efficiency, compute_uniformity=compute_uniformity, seed=seed, 
+                      delta_power=delta_power, real_fft=real_fft, checkpoint_path=checkpoint_path, 
+                      keep_history=False, preview=preview, callback=callback)
 
         return phases
 
@@ -350,7 +541,6 @@ class DOEDesignSimulation(QMainWindow):
         print(phases.shape, "computation done")
         self.eod_section.volume = phases
         self.phases = phases
-        does = np.exp(1j * phases)
         self.eod_section.graph_view.samplings = float(self.eod_section.sampling) * np.ones((len(phases),))
         self.doe = phases[-1]
         self.doe = self.doe[np.newaxis, :, :]
@@ -359,10 +549,78 @@ class DOEDesignSimulation(QMainWindow):
 
 
 
+    def start_autotune(self):
+        image_params = self.image_section.get_inputs()
+        eod_params = self.eod_section.get_inputs()
+
+        eod_shape = tuple(map(int,eod_params["EOD_shape"]))
+        nlevels = int(eod_params["nlevels"])
+        max_iter = int(self.nbiter_ph1) + int(self.nbiter_ph2)   # budget of the best runs
+        max_time = float(self.autotune_time) if self.autotune_time.strip() else None
+
+        self.autotune_thread = GenericThread(IftaAutotune,
+                                             image_params["image"],
+                                             image_size=eod_shape,
+                                             n_levels=nlevels,
+                                             min_iter=max(5, max_iter//9),
+                                             max_iter=max_iter,
+                                             max_time=max_time)
+        self.autotune_thread.progress_changed.connect(self.progress.setValue)
+        self.autotune_thread.finished_with_result.connect(self.on_autotune_done)
+
+        self.progress.show()
+        self.progress.setValue(0)
+        self.autotune_thread.start()
+
+    def on_autotune_done(self, result):
+        best, phase, results = result
+        print(f"Auto-tune : {len(results)} runs, best {best}")
+        self.rfact_line_edit.setText(f"{best['rfact']:.3f}")
+        self.nbiter_line_edit.setText(str(best["n_iter_ph1"]))
+        self.nbiter_pha_line_edit.setText(str(best["n_iter_ph2"]))
+        if "delta_power" in best:                                # tuned only with quantization
+            self.delta_power_line_edit.setText(f"{best['delta_power']:.3f}")
+        self.on_ifta_done(phase[np.newaxis])
+
+    def select_checkpoint_path(self, checked):
+        if not checked:
+            self.checkpoint_path = None
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "Checkpoint File", "ifta_checkpoint.npz", 
+                                                   "NumPy archive (*.npz)")
+        if not file_path:
+            self.checkpoint_checkbox.setChecked(False)
+            return
+        if not file_path.endswith(".npz"):
+            file_path += ".npz"
+        self.checkpoint_path = file_path
+
+    def start_resume(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open Checkpoint", "", "NumPy archive (*.npz)")
+        if not file_path:
+            return
+
+        # the first loop is kept as saved, the second one gets the iterations of the form
+        self.ifta_thread = GenericThread(IftaResume, file_path, n_iter_ph2=int(self.nbiter_ph2), keep_history=False,
+                                         partial_kwarg="preview")
+        self.ifta_thread.progress_changed.connect(self.progress.setValue)
+        self.ifta_thread.partial_result.connect(self.on_ifta_preview)
+        self.ifta_thread.finished_with_result.connect(self.on_ifta_done)
+
+        self.progress.show()
+        self.progress.setValue(0)
+        self.ifta_thread.start()
+
     def sync_inputs(self):
         self.rfact = self.rfact_line_edit.text()
         self.nbiter_ph1 = self.nbiter_line_edit.text()
         self.nbiter_ph2 = self.nbiter_pha_line_edit.text()
+        self.design_plane = self.design_plane_combo.currentText()
+        self.engine = self.engine_combo.currentText()
+        self.delta_power = self.delta_power_line_edit.text()
+        self.real_fft = 1 if self.real_fft_checkbox.isChecked() else 0
+        self.delta_power_line_edit.setEnabled(not self.real_fft)     # no schedule on the real FFT loop
+        self.autotune_time = self.autotune_time_line_edit.text()
         
         self.compute_efficiency = 1 if self.efficiency_checkbox.isChecked() else 0
         self.compute_uniformity = 1 if self.uniformity_checkbox.isChecked() else 0
@@ -373,17 +631,27 @@ class DOEDesignSimulation(QMainWindow):
             "rfact" : self.rfact,
             "nbiter_ph1" : self.nbiter_ph1,
             "nbiter_ph2" : self.nbiter_ph2,
+            "design_plane" : self.design_plane,
+            "engine" : self.engine,
+            "delta_power" : self.delta_power,
+            "real_fft" : self.real_fft,
+            "autotune_time" : self.autotune_time,
             "compute_uniformity" : self.compute_uniformity,
             "compute_efficiency" : self.compute_efficiency,
             "npy_path" : self.npy_path, 
         }
                 
+    def doe_transmittance(self):
+        # binary DOE : exp(1j*phase) is +-1, kept real so that the propagators take the real FFT path
+        if IsBinaryPhase(self.doe):
+            return np.cos(self.doe)
+        return np.exp(1j*self.doe)
+
     def run_simulation(self):
         try:
         # 1. Get the aperture mask
             eod_params = self.eod_section.get_inputs()
-            doe_phase = self.doe
-            doe = np.exp(1j*doe_phase)
+            doe = self.doe_transmittance()
             tile = int(self.simulation_section.tile)
             print(tile)
             tile_shape = (tile, tile)
@@ -410,8 +678,7 @@ class DOEDesignSimulation(QMainWindow):
         try:
         # 1. Get the aperture mask
             eod_params = self.eod_section.get_inputs()
-            doe_phase = self.doe
-            doe = np.exp(1j*doe_phase)
+            doe = self.doe_transmittance()
             tile = int(self.simulation_section.tile)
             tile_shape = (tile, tile)
             doe = np.tile(doe, tile_shape)
@@ -437,9 +704,7 @@ class DOEDesignSimulation(QMainWindow):
         try:
         # 1. Get the aperture mask
             eod_params = self.eod_section.get_inputs()
-            doe_phase = self.doe
-            doe = np.exp(1j*doe_phase)
-            doe[np.newaxis, :, :]
+            doe = self.doe_transmittance()
             tile = int(self.simulation_section.tile)
             tile_shape = (tile, tile)
             doe = np.tile(doe, tile_shape)
@@ -1,13 +1,162 @@
 import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QVBoxLayout, QWidget, QCheckBox,
-    QSplitter, QLabel, QSlider, QGridLayout,QGraphicsLineItem, QComboBox, QHBoxLayout
+    QSplitter, QLabel, QSlider, QGridLayout,QGraphicsLineItem, QComboBox, QHBoxLayout, QGraphicsRectItem,
+    QPushButton, QFileDialog
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QRectF, QTimer
 import pyqtgraph as pg
 from pyqtgraph import LineSegmentROI, InfiniteLine
-from scipy.ndimage import map_coordinates
 from resizing_ import format_if_large
+from display_pipeline import DISPLAY_MODES, DisplayWorker, SliceCache, estimate_levels, profile_stack, sample_bilinear
+from sweep_export import export_sweep, sweep_levels
+from GenericThread import GenericThread
+
+
+class FrameImageView(pg.ImageView):
+    """
+    pg.ImageView showing a (l, h, w) volume one frame at a time.
+
+    set_frames() sets up the timeline (sigTimeChanged, play, keys) with a zero-strided placeholder of the
+    volume's shape instead of the volume, which is never normalized nor scanned for levels. The frame of
+    the current index is asked to frame_source, a callable returning a DisplaySlice or None when the slice
+    is not ready yet: the previous frame stays on screen and updateImage() is called again once it is.
+
+    The image item only holds one level of the frame's pyramid, the one matching the screen resolution for
+    the current view range, cropped to the visible region (plus a margin) when the level is large: a
+    8192 x 8192 pattern shown in a 800 pixels widget uploads a 1024 x 1024 level, and full resolution
+    tiles only when zoomed in.
+    """
+
+    sigFrameShown = pg.QtCore.Signal(int)
+    sigPlaybackChanged = pg.QtCore.Signal(float)  # play rate in frames per second, 0 when stopped
+
+    tile_align = 256            # tile boundaries, in pixels of the level
+    max_whole_level = 2**21     # levels up to this number of pixels are shown whole
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fps = 30  # play rate of the space bar
+        self.frame_source = None
+        self.frame = None
+        self.auto_levels = "range"  # levels applied to every new frame : "range", "percentile" or None
+        self._pending_auto_range = False
+        self._tile = None  # (level, row0, row1, col0, col1) of the tile on screen
+
+        # extent of the whole frame for autoRange, the image item only covers the tile
+        self._bounds = QGraphicsRectItem()
+        self._bounds.setPen(pg.mkPen(None))
+        self.view.addItem(self._bounds)
+        self.view.sigRangeChanged.connect(self.update_tile)
+
+    def set_frames(self, shape, frame_source, xvals=None, auto_range=True):
+        """
+        Args:
+            shape (tuple): (l, h, w) shape of the volume.
+            frame_source (callable): index -> DisplaySlice or None.
+            xvals (np.array): Timeline values, np.arange(l) if None.
+            auto_range (bool): Fit the view to the first frame shown.
+        """
+        self.frame_source = frame_source
+        self._pending_auto_range = auto_range
+        placeholder = np.broadcast_to(np.zeros((), dtype=np.float32), shape)
+        self.setImage(placeholder, autoRange=False, autoLevels=False, axes={'t': 0, 'x': 1, 'y': 2}, xvals=xvals)
+        self._bounds.setRect(0, 0, shape[1], shape[2])
+        if self.frame is not None:
+            self.update_tile(force=True)  # setImage reset the transform of the image item
+
+    def extend_frames(self, length):
+        """
+        Lengthen the timeline to length frames (volume growing while it is computed), without setImage:
+        the current frame, its levels and the view range are kept.
+        """
+        self.image = np.broadcast_to(np.zeros((), dtype=np.float32), (length, *self.image.shape[1:]))
+        self.imageDisp = None
+        self.tVals = np.arange(length)
+        self.ui.roiPlot.setXRange(0, length - 1)
+        self.frameTicks.setXVals(self.tVals)
+        bounds = [0, (length - 1) * 1.02] if length > 1 else [-0.5, 0.5]
+        for item in [self.timeLine, self.normRgn]:
+            item.setBounds(bounds)
+
+    def getProcessedImage(self):
+        if self.imageDisp is None:
+            self.imageDisp = self.image
+            self._imageLevels = [(0.0, 1.0)]
+            self.levelMin, self.levelMax = 0.0, 1.0
+        return self.imageDisp
+
+    def updateImage(self, autoHistogramRange=True):
+        if self.image is None or self.frame_source is None:
+            return
+        if self.axes['t'] is not None:
+            self.ui.roiPlot.show()
+        frame = self.frame_source(self.currentIndex)
+        if frame is None:
+            return
+        self.frame = frame
+        self.update_tile(force=True)
+        if autoHistogramRange:
+            self.ui.histogram.setHistogramRange(*frame.value_range)
+        if self.auto_levels == "percentile":
+            self.ui.histogram.setLevels(*frame.levels)
+        elif self.auto_levels == "range":
+            self.ui.histogram.setLevels(*frame.value_range)
+        if self._pending_auto_range:
+            self._pending_auto_range = False
+            self.view.autoRange()
+        self.sigFrameShown.emit(self.currentIndex)
+
+    def play(self, rate=None):
+        super().play(rate)
+        self.sigPlaybackChanged.emit(float(self.playRate or 0))
+
+    def setLevels(self, *args, **kwds):
+        # explicit levels replace the automatic ones, also for the frames still being computed
+        self.auto_levels = None
+        super().setLevels(*args, **kwds)
+
+    def update_tile(self, *args, force=False):
+        """Show the pyramid level and the tile of the current frame for the view range, if it changed."""
+        if self.frame is None:
+            return
+        pyramid = self.frame.pyramid
+        (x0, x1), (y0, y1) = self.view.viewRange()
+        width, height = self.view.width(), self.view.height()
+        if width < 1 or height < 1:  # not laid out yet
+            width = height = 1024
+        image_pixels_per_screen_pixel = max((x1 - x0) / width, (y1 - y0) / height, 1)
+        level = min(int(np.log2(image_pixels_per_screen_pixel)), len(pyramid) - 1)
+        image = pyramid[level]
+        scale = 2 ** level
+        n_rows, n_cols = image.shape  # col-major display: x along the rows of the array
+
+        def visible(low, high, n):
+            low = min(max(int(low / scale), 0), n - 1)
+            return low, min(max(int(np.ceil(high / scale)), low + 1), n)
+
+        row0, row1 = visible(x0, x1, n_rows)
+        col0, col1 = visible(y0, y1, n_cols)
+        if not force and self._tile is not None:
+            tile_level, tile_row0, tile_row1, tile_col0, tile_col1 = self._tile
+            if tile_level == level and tile_row0 <= row0 and row1 <= tile_row1 and tile_col0 <= col0 and col1 <= tile_col1:
+                return
+
+        if image.size <= self.max_whole_level:
+            row0, row1, col0, col1 = 0, n_rows, 0, n_cols
+        else:
+            # visible region with a margin of half the view on each side, aligned
+            align = self.tile_align
+            margin_rows, margin_cols = (row1 - row0) // 2, (col1 - col0) // 2
+            row0 = max(row0 - margin_rows, 0) // align * align
+            col0 = max(col0 - margin_cols, 0) // align * align
+            row1 = min(-(-(row1 + margin_rows) // align) * align, n_rows)
+            col1 = min(-(-(col1 + margin_cols) // align) * align, n_cols)
+
+        self._tile = (level, row0, row1, col0, col1)
+        self.imageItem.setImage(image[row0:row1, col0:col1], autoLevels=False)
+        self.imageItem.setRect(QRectF(row0 * scale, col0 * scale, (row1 - row0) * scale, (col1 - col0) * scale))
+
 
 class RealTimeCrossSectionViewer(QWidget):
     """
@@ -23,6 +172,21 @@ class RealTimeCrossSectionViewer(QWidget):
         self.distances = None
         self.wavelengths = None
         self.unit_distance = "µm"
+
+        # display slices are computed off the GUI thread, cached per (slice, mode)
+        self.display_volume = None
+        self.display_mode = None
+        self.display_levels = None
+        self.prefetch_slices = 2
+        self.playback_frames = 16  # slices computed ahead of the playhead while playing
+        self.playback_rate = 0
+        self.colormaps = {}  # (wavelength, unit) -> colour map
+        self.max_profile_samples = 4096
+        self.last_index = 0
+        self.display_cache = SliceCache()
+        self.display_worker = DisplayWorker(self.display_cache)
+        self.display_worker.slice_ready.connect(self.on_slice_ready)
+
         self.setup_ui()
         self.add_overlay_scale_bar(pixel_length=10)
         self.setup_interaction()
@@ -35,8 +199,10 @@ class RealTimeCrossSectionViewer(QWidget):
 
         self.layout = QVBoxLayout(self)
         
-        self.slice_view = pg.ImageView()
+        self.slice_view = FrameImageView()
         self.slice_view.sigTimeChanged.connect(self.on_time_changed)
+        self.slice_view.sigFrameShown.connect(self.on_frame_shown)
+        self.slice_view.sigPlaybackChanged.connect(self.on_playback_changed)
 
         self.slice_view.ui.roiBtn.hide()
         self.slice_view.ui.menuBtn.hide()
@@ -46,8 +212,6 @@ class RealTimeCrossSectionViewer(QWidget):
         self.slider.setMaximum(1000)
         self.slider.setValue(0)
 
-        self.slice_view.setImage(self.volume, xvals=np.arange(self.volume.shape[0]))
-        self.slider_visibility()
         self.splitter.addWidget(self.slice_view)
         view = self.slice_view.getView()
         view.setRange(xRange=(0, self.volume.shape[2]), yRange=(0, self.volume.shape[1]), padding=0)
@@ -69,6 +233,22 @@ class RealTimeCrossSectionViewer(QWidget):
         self.cross_section_plot = pg.PlotWidget()
         cross_layout.addWidget(self.cross_section_plot)
 
+        self.kymograph_plot = pg.PlotWidget()
+        self.kymograph_plot.setLabel('left', "Slice")
+        self.kymograph_item = pg.ImageItem()
+        self.kymograph_plot.addItem(self.kymograph_item)
+        cross_layout.addWidget(self.kymograph_plot)
+        self.kymograph_plot.hide()
+
+        self.kymograph_cb = QCheckBox("Profile along the sweep")
+        self.kymograph_cb.stateChanged.connect(self.toggle_kymograph)
+        cross_layout.addWidget(self.kymograph_cb)
+
+        self.profile_timer = QTimer(self)
+        self.profile_timer.setSingleShot(True)
+        self.profile_timer.setInterval(16)  # display refresh
+        self.profile_timer.timeout.connect(self.update_cross_section)
+
 
         self.splitter.addWidget(self.cross_section_container)
         self.layout.addWidget(self.splitter)
@@ -151,22 +331,28 @@ class RealTimeCrossSectionViewer(QWidget):
         self.display_widget = QWidget()
         self.display_widget_layout = QHBoxLayout(self.display_widget)
         self.mode_selector = QComboBox()
-        self.mode_selector.addItems(["Intensity", "Amplitude", "Log-Amplitude", "Phase"])
+        self.mode_selector.addItems(DISPLAY_MODES)
         self.mode_selector.currentIndexChanged.connect(self.update_display_mode)
         self.mode_selector.currentIndexChanged.connect(self.on_time_changed)
         self.display_widget_layout.addWidget(QLabel("Display Mode:"))
         self.display_widget_layout.addSpacing(20)
         self.display_widget_layout.addWidget(self.mode_selector)
+        self.display_widget_layout.addSpacing(20)
+        self.export_button = QPushButton("Export sweep")
+        self.export_button.clicked.connect(self.export_dialog)
+        self.display_widget_layout.addWidget(self.export_button)
         self.display_widget_layout.addStretch()
 
         self.layout.addWidget(self.display_widget)
 
+        self.show_volume(self.volume, auto_levels="range")
+        self.slider_visibility()
 
 
 
 
     def setup_interaction(self):
-        self.line.sigRegionChanged.connect(self.update_cross_section)
+        self.line.sigRegionChanged.connect(self.schedule_cross_section)
         self.cross_section_plot.scene().sigMouseMoved.connect(self.mouse_moved_on_plot)
         self.update_cross_section()
         self.cursor_line1.sigPositionChanged.connect(self.update_cursor_labels)
@@ -199,86 +385,64 @@ class RealTimeCrossSectionViewer(QWidget):
             self.cursor_toggle_cb.show()
             self.cursor_lines_toggle_cb.show()
             self.update_cross_section()  # Restore data
+
+    def schedule_cross_section(self):
+        # a ROI drag emits sigRegionChanged at every mouse move : the profile is redrawn at most once a frame
+        if not self.profile_timer.isActive():
+            self.profile_timer.start()
+
+    def line_samples(self, shape):
+        """
+        Positions of the samples along the line, one per pixel of its length.
+
+        Args:
+            shape (tuple): (h, w) of the slices.
+
+        Returns:
+            tuple: rows and columns (clipped inside the slice), mask of the samples inside the slice, physical length.
+        """
+        state = self.line.getState()
+        start = state['points'][0] + state['pos']
+        end = state['points'][1] + state['pos']
+        distance = np.hypot(end[0] - start[0], end[1] - start[1])
+        n_samples = int(np.clip(np.ceil(distance) + 1, 2, self.max_profile_samples))
+        x = np.linspace(start[1], end[1], n_samples)
+        y = np.linspace(start[0], end[0], n_samples)
+        valid_mask = (x >= 0) & (x <= shape[1] - 1) & \
+                     (y >= 0) & (y <= shape[0] - 1)
+        return np.clip(y, 0, shape[0] - 1), np.clip(x, 0, shape[1] - 1), valid_mask, distance * self.sampling
+
     def update_cross_section(self):
         try:
-            volume = self.apply_display_mode()
-            pixel_size = self.sampling
-            state = self.line.getState()
-            start = state['points'][0] + state['pos']
-            end = state['points'][1] + state['pos']
-            n_samples = 300
-            distance = np.hypot(end[0] - start[0], end[1] - start[1])
-            physical_length = distance * pixel_size
-            x = np.linspace(start[1], end[1], n_samples)  # microns
-            y = np.linspace(start[0], end[0], n_samples)
-            valid_mask = (x >= 0) & (x <= volume.shape[2] - 1) & \
-                        (y >= 0) & (y <= volume.shape[1] - 1)
-
-            x_safe = np.copy(x)
-            y_safe = np.copy(y)
-            x_safe[~valid_mask] = -1
-            y_safe[~valid_mask] = -1
-
-            x = np.clip(x, 0, volume.shape[2] - 1)
-            y = np.clip(y, 0, volume.shape[1] - 1)
-
-            profile = map_coordinates(
-                volume[self.current_slice],
-                np.vstack([y, x]),
-                order=1,
-                mode='constant',
-                cval=0.0
-            )
+            display_slice = self.current_display_slice()
+            if display_slice is None:
+                return  # drawn when the slice is shown (on_frame_shown)
+            y, x, valid_mask, physical_length = self.line_samples(display_slice.image.shape)
 
+            profile = sample_bilinear(display_slice.image, y, x)
             profile[~valid_mask] = 0
 
-            x_physical = np.linspace(0, physical_length, n_samples)
+            x_physical = np.linspace(0, physical_length, len(profile))
             if not hasattr(self, 'profile_curve'):
                 self.profile_curve = self.cross_section_plot.plot(x_physical,profile, pen='y')
             else:
                 self.profile_curve.setData(x_physical,profile)
+
+            if self.kymograph_cb.isChecked() and len(self.display_volume) > 1:
+                self.update_kymograph(y, x, valid_mask, physical_length)
         except Exception as e:
             print(f"Update error: {str(e)}")
 
-    def update_cross_section_slice(self, slice_data):
-            
-            volume = slice_data
-            pixel_size = self.sampling
-            state = self.line.getState()
-            start = state['points'][0] + state['pos']
-            end = state['points'][1] + state['pos']
-            n_samples = 300
-            distance = np.hypot(end[0] - start[0], end[1] - start[1])
-            physical_length = distance * pixel_size
-            x = np.linspace(start[1], end[1], n_samples)  # microns
-            y = np.linspace(start[0], end[0], n_samples)
-            valid_mask = (x >= 0) & (x <= volume.shape[2] - 1) & \
-                         (y >= 0) & (y <= volume.shape[1] - 1)
-
-            x_safe = np.copy(x)
-            y_safe = np.copy(y)
-            x_safe[~valid_mask] = -1
-            y_safe[~valid_mask] = -1
-
-            x = np.clip(x, 0, volume.shape[2] - 1)
-            y = np.clip(y, 0, volume.shape[1] - 1)
-
-            profile = map_coordinates(
-                slice_data[0],
-                np.vstack([y, x]),
-                order=1,
-                mode='constant',
-                cval=0.0
-            )
-
-            profile[~valid_mask] = 0
-
-            x_physical = np.linspace(0, physical_length, n_samples)
-            if not hasattr(self, 'profile_curve'):
-                self.profile_curve = self.cross_section_plot.plot(x_physical,profile, pen='y')
-            else:
-                self.profile_curve.setData(x_physical, profile)
+    def update_kymograph(self, y, x, valid_mask, physical_length):
+        """Profile of every slice along the line, as a (position, slice) image."""
+        profiles = profile_stack(self.display_volume, y, x, self.current_mode())
+        profiles[:, ~valid_mask] = 0
+        self.kymograph_item.setImage(profiles.T, levels=estimate_levels(profiles))
+        self.kymograph_item.setRect(QRectF(0, 0, physical_length, len(profiles)))
 
+    def toggle_kymograph(self, state):
+        self.kymograph_plot.setVisible(state == Qt.Checked)
+        self.schedule_cross_section()
 
     def mouse_moved_on_plot(self, pos):
         vb = self.cross_section_plot.getViewBox()
@@ -351,26 +515,124 @@ class RealTimeCrossSectionViewer(QWidget):
             self.cursor_label.hide()
             self.vline.hide()
             self.hline.hide()
-    def update_data(self, new_source, eod = False):
+    def update_data(self, new_source, eod = False, levels = None):
         self.volume = new_source
-        volume = self.apply_display_mode()
-        self.current_slice = 0
-        self.slice_view.setImage(volume, xvals=np.arange(volume.shape[0]))
+        self.show_volume(self.volume, auto_levels="range" if eod else "percentile", levels=levels)
         self.slider_visibility()
         self.update_line()
         self.window_info_widget.setText(f"Matrix Size = {self.volume.shape[1]} x {self.volume.shape[2]}, Pixel size = {format_if_large(self.sampling)} {self.unit_distance}")
-        if not eod:
-            lower, upper = np.percentile(volume, [1, 99.98])
-            self.slice_view.setLevels(lower, upper)
 
 
 
     def update_data_ap(self, new_source): #useful only for apertures
-        volume = self.apply_display_mode_manual(new_source,"Intensity")
+        self.show_volume(new_source, mode="Intensity", auto_levels="range")
+        self.slider_visibility()
+
+    def show_volume(self, volume, mode=None, auto_levels="percentile", levels=None):
+        """
+        Display a (l, h, w) volume, starting at slice 0.
+
+        The display slices are computed by the display worker when they are shown, and cached per
+        (slice, mode): only the visible slice is transformed, and switching back to a mode already
+        shown is immediate.
+
+        Args:
+            volume (np.array or VolumeProvider): Field to display, read one slice at a time.
+            mode (str): Display mode, None to follow the mode selector.
+            auto_levels (str): Levels of the new frames, "percentile", "range" or None (see FrameImageView).
+            levels (list): Precomputed levels of each slice (display_pipeline.field_levels), estimated
+                           on the display slices if None.
+        """
+        if volume is not self.display_volume:
+            self.display_cache.reset()
+        self.display_volume = volume
+        self.display_mode = mode
+        self.display_levels = levels
         self.current_slice = 0
-        self.slice_view.setImage(volume, xvals=np.arange(volume.shape[0]))
+        self.slice_view.auto_levels = auto_levels
+        self.slice_view.set_frames(volume.shape, self.display_slice, xvals=np.arange(volume.shape[0]))
+
+    def extend_volume(self, volume, levels=None):
+        """
+        New slices at the end of the displayed volume (sweep planes streamed while they are computed).
+
+        The slices already shown and cached are unchanged: the timeline is lengthened, the current slice
+        stays on screen.
+
+        Args:
+            volume (VolumeProvider): Displayed volume, now len(volume) slices long.
+            levels (list): Precomputed levels of each slice, see show_volume.
+        """
+        self.volume = volume
+        self.display_levels = levels
+        self.slice_view.extend_frames(len(volume))
         self.slider_visibility()
 
+    def current_mode(self):
+        return self.display_mode or self.mode_selector.currentText()
+
+    def display_slice(self, index):
+        """Cached display slice of the displayed volume, or None after requesting it from the worker."""
+        mode = self.current_mode()
+        display_slice = self.display_cache.get((index, mode))
+        if display_slice is None:
+            self.request_slice(index, mode)
+        if self.playback_rate:
+            self.prefetch_ahead(index, mode, display_slice or self.slice_view.frame)
+        elif display_slice is not None and \
+                display_slice.nbytes * (2 * self.prefetch_slices + 1) <= self.display_cache.max_bytes:
+            self.prefetch_neighbours(index, mode)
+        self.last_index = index
+        return display_slice
+
+    def request_slice(self, index, mode, prefetch=False):
+        levels = None if self.display_levels is None else self.display_levels[index]
+        self.display_worker.request(self.display_volume, index, mode, levels, prefetch)
+
+    def prefetch_neighbours(self, index, mode):
+        # the next slices on both sides, in the scrubbing direction first, are computed in the background
+        step = -1 if index < self.last_index else 1
+        for offset in range(1, self.prefetch_slices + 1):
+            for neighbour in (index + step * offset, index - step * offset):
+                if 0 <= neighbour < len(self.display_volume) and (neighbour, mode) not in self.display_cache:
+                    self.request_slice(neighbour, mode, prefetch=True)
+
+    def prefetch_ahead(self, index, mode, frame=None):
+        """
+        While playing, the next playback_frames slices in the play direction are computed in the background,
+        in the order they will be shown, so that the playhead only reads the cache.
+
+        At most half of the cache is used ahead of the playhead (frame gives the size of a slice), so that the
+        prefetched slices do not evict each other before they are shown.
+        """
+        ahead = self.playback_frames
+        if frame is not None:
+            ahead = min(ahead, self.display_cache.max_bytes // (2 * frame.nbytes))
+        step = 1 if self.playback_rate > 0 else -1
+        for offset in range(1, ahead + 1):
+            neighbour = index + step * offset
+            if not 0 <= neighbour < len(self.display_volume):
+                break
+            if (neighbour, mode) not in self.display_cache:
+                self.request_slice(neighbour, mode, prefetch=True)
+
+    def on_playback_changed(self, rate):
+        self.playback_rate = rate
+        if rate and self.display_volume is not None:
+            self.prefetch_ahead(self.slice_view.currentIndex, self.current_mode(), self.slice_view.frame)
+
+    def current_display_slice(self):
+        return self.display_cache.get((self.slice_view.currentIndex, self.current_mode()))
+
+    def on_slice_ready(self, generation, index, mode):
+        if generation == self.display_cache.generation and index == self.slice_view.currentIndex \
+                and mode == self.current_mode():
+            self.slice_view.updateImage()
+
+    def on_frame_shown(self, index):
+        self.schedule_cross_section()  # at most once per display refresh while playing
+        self.update_cursor_labels()
+
     def add_overlay_scale_bar(self, pixel_length=100):
         """
         Adds a floating overlay scale bar that stays in the same screen position.
@@ -466,7 +728,7 @@ class RealTimeCrossSectionViewer(QWidget):
         self.line.setVisible(was_visible)
     
         # Reconnect signal
-        self.line.sigRegionChanged.connect(self.update_cross_section)
+        self.line.sigRegionChanged.connect(self.schedule_cross_section)
 
         # Only update cross-section if line is meant to be visible
         if was_visible:
@@ -478,53 +740,19 @@ class RealTimeCrossSectionViewer(QWidget):
 
         else:
             self.slice_view.ui.roiPlot.show()
+        stack = len(self.display_volume) > 1
+        self.kymograph_cb.setVisible(stack)
+        self.export_button.setVisible(stack)
+        self.kymograph_plot.setVisible(stack and self.kymograph_cb.isChecked())
 
     def update_display_mode(self):
-        volume = self.apply_display_mode()
-        self.current_slice = 0
-        self.slice_view.setImage(volume, xvals=np.arange(volume.shape[0]))
+        # the precomputed levels of the sweep hold every mode, they stay valid for the same volume
+        levels = self.display_levels if self.volume is self.display_volume else None
+        self.show_volume(self.volume, auto_levels="percentile" if len(self.volume) > 1 else "range", levels=levels)
         self.slider_visibility()
         self.update_line()
         self.window_info_widget.setText(f"Matrix Size = {self.volume.shape[1]} x {self.volume.shape[2]}, Pixel size = {format_if_large(self.sampling)} {self.unit_distance}")
 
-    def apply_display_mode(self):
-        mode = self.mode_selector.currentText()
-        if mode == "Amplitude":
-            return np.abs(self.volume)
-        elif mode == "Intensity":
-            return np.abs(self.volume) ** 2
-        elif mode == "Log-Amplitude":
-            return np.log1p(np.abs(self.volume))  # log(1 + amplitude)
-        elif mode == "Phase":
-            return np.angle(self.volume)
-        else:
-            return np.abs(self.volume)
-        
-    def apply_display_mode_manual(self,new_source,mode):
-        if mode == "Amplitude":
-            return np.abs(new_source)
-        elif mode == "Intensity":
-            return np.abs(new_source) ** 2
-        elif mode == "Log-Amplitude":
-            return np.log(np.abs(new_source))  # log(1 + amplitude)
-        elif mode == "Phase":
-            return np.angle(new_source)
-        else:
-            return np.abs(new_source)
-        
-    def apply_display_mode_slice(self, slice):
-        mode = self.mode_selector.currentText()
-        if mode == "Amplitude":
-            return np.abs(slice)
-        elif mode == "Intensity":
-            return np.abs(slice) ** 2
-        elif mode == "Log-Amplitude":
-            return np.log1p(np.abs(slice))  # log(1 + amplitude)
-        elif mode == "Phase":
-            return np.angle(slice)
-        else:
-            return np.abs(slice)
-
     def wavelength_to_rgb(self,wavelength):
         """
         Convert a wavelength in nm (380 to 750) to an RGB color.
@@ -572,32 +800,82 @@ class RealTimeCrossSectionViewer(QWidget):
             color = np.array([0, 0, 0, 0])
         return color
     
-    def update_color(self, wavelength):
-        conversion = {"µm":1e3, "mm": 1e6, "m": 1e9}
-        wavelength = wavelength * conversion[self.unit_distance]
-        color = self.wavelength_to_rgb(wavelength)
+    def export_dialog(self):
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self,
+            "Export sweep",
+            "sweep",
+            "Animated GIF (*.gif);;TIFF stack (*.tiff);;PNG sequence (*.png)"
+        )
+        if not file_path:
+            return
+        if not file_path.lower().endswith((".gif", ".tif", ".tiff", ".png")):
+            file_path += {"Animated GIF": ".gif", "TIFF stack": ".tiff"}.get(selected_filter.split(" (")[0], ".png")
+        self.export(file_path)
+
+    def export(self, file_path):
+        """
+        Export the displayed sweep in the background (sweep_export.export_sweep), with the display mode and the
+        colour maps of the viewer. The levels are the ones set by hand on the histogram if any, else the widest
+        levels of the slices, the same for every frame.
+        """
+        mode = self.current_mode()
+        if self.slice_view.auto_levels is None:
+            levels = self.slice_view.ui.histogram.getLevels()
+        elif self.display_levels is not None:
+            levels = sweep_levels(self.display_volume, mode, self.display_levels[:len(self.display_volume)])
+        else:
+            levels = None  # estimated on the sweep by the export thread
+        if self.wavelengths is not None:
+            luts = [self.wavelength_colormap(w).getLookupTable(nPts=256, alpha=False) for w in self.wavelengths]
+        else:
+            luts = self.slice_view.ui.histogram.gradient.getLookupTable(256, alpha=False)
+
+        self.export_thread = GenericThread(self.run_export, file_path, self.display_volume, mode, levels, luts)
+        self.export_thread.progress_changed.connect(lambda percent: self.export_button.setText(f"Exporting {percent} %"))
+        self.export_thread.finished_with_result.connect(self.on_export_done)
+        self.export_button.setEnabled(False)
+        self.export_thread.start()
+
+    def run_export(self, file_path, volume, mode, levels, luts, callback = None):
+        try:
+            export_sweep(file_path, volume, mode, levels, luts, callback=callback)
+        except Exception as e:
+            print(f"Export error : {e}")
+            return None
+        return file_path
 
-        R,G,B,V = color
+    def on_export_done(self, file_path):
+        self.export_button.setText("Export sweep")
+        self.export_button.setEnabled(True)
+        if file_path:
+            print(f"Sweep exported to {file_path}")
 
-        if V == 1:
-            lut = np.zeros((256, 3), dtype=np.uint8)
-            lut[:, 0] = np.linspace(0, R, 256)  
-            lut[:, 1] = np.linspace(0, G, 256)  
-            lut[:, 2] = np.linspace(0, B, 256)  
+    def wavelength_colormap(self, wavelength):
+        """
+        Colour map of a wavelength, black to its colour (grey scale outside the visible range), cached.
 
-            self.slice_view.setColorMap(pg.ColorMap(pos=np.linspace(0,1,256), color=lut))
-        else: 
-            gray_lut = pg.ColorMap(pos=[0, 1], color=[[0, 0, 0], [255, 255, 255]])
-            self.slice_view.setColorMap(gray_lut)
+        The map has two stops: the gradient editor of the histogram builds one tick per stop, so a 256 stops
+        map took ~40 ms per frame of a wavelength sweep for the same linear LUT.
+        """
+        colormap = self.colormaps.get((wavelength, self.unit_distance))
+        if colormap is None:
+            conversion = {"µm":1e3, "mm": 1e6, "m": 1e9}
+            R,G,B,V = self.wavelength_to_rgb(wavelength * conversion[self.unit_distance])
+            top = [R, G, B] if V == 1 else [255, 255, 255]
+            colormap = self.colormaps[(wavelength, self.unit_distance)] = pg.ColorMap(pos=[0, 1], color=[[0, 0, 0], top])
+        return colormap
+
+    def update_color(self, wavelength):
+        self.slice_view.setColorMap(self.wavelength_colormap(wavelength))
 
     def on_time_changed(self):
         if len(self.volume) > 1:
             idx = int(self.slice_view.currentIndex)  # current slice index
-            slice_data = self.volume[idx][np.newaxis, :]
-            slice_data = self.apply_display_mode_slice(slice_data)
-            lower, upper = np.percentile(slice_data, [1, 99.98])
+            self.current_slice = idx
+            # the levels of the new slice follow slice_view.auto_levels : per-slice percentiles when automatic,
+            # unchanged after an explicit setLevels (None) and for the "range" volumes
             self.sampling = self.samplings[idx]
-            self.update_cross_section_slice(slice_data)
             self.update_overlay_scale_bar_position()
             if self.distances is not None:
                 self.window_info_widget.setText(f"Matrix Size = {self.volume.shape[1]} x {self.volume.shape[2]}, Pixel size = {format_if_large(self.sampling)} {self.unit_distance}, Simulation distance = {format_if_large(self.distances[idx])}{self.unit_distance}")
@@ -606,7 +884,8 @@ class RealTimeCrossSectionViewer(QWidget):
                 self.update_color(self.wavelengths[idx])
             else:
                 self.window_info_widget.setText(f"Matrix Size = {self.volume.shape[1]} x {self.volume.shape[2]}, Pixel size = {format_if_large(self.sampling)} {self.unit_distance}")
-            self.slice_view.setLevels(lower, upper)
+            # new sampling : the image, the levels and the profile follow when the slice is ready (on_frame_shown)
+            self.schedule_cross_section()
 
 
 
@@ -4,13 +4,18 @@ class GenericThread(QThread):
 
     progress_changed = pyqtSignal(int)
     finished_with_result = pyqtSignal(object)
+    partial_result = pyqtSignal(object)
 
-    def __init__(self, func, *args, **kwargs):
+    def __init__(self, func, *args, partial_kwarg=None, **kwargs):
         super().__init__()
         self.func = func
         self.args = args
         self.kwargs = kwargs
 
+        # intermediate results : func receives partial_result.emit as its partial_kwarg argument
+        if partial_kwarg is not None:
+            self.kwargs[partial_kwarg] = self.partial_result.emit
+
         def progress_callback(percent):
             QMetaObject.invokeMethod(self, "_emit_progress", Qt.QueuedConnection, Q_ARG(int, int(percent)))
 
@@ -10,6 +10,7 @@ import sys
 
 from automatic_sizing import zero_pad
 from ressource_path import resource_path
+from display_pipeline import estimate_levels
 
 from SourceSection import SourceSection
 from ApertureSection import ApertureSection
@@ -112,6 +113,7 @@ class OpticalDiffractionSimulator(QMainWindow):
         self.go_button = self.simulation_section.go_button
         self.sweep_button = self.simulation_section.sweep_button
         self.sweep_button_w = self.simulation_section.sweep_button_w
+        self.meridional_button = self.simulation_section.meridional_button
         self.go_filtering_button = self.simulation_section.go_filtering_button
 
 
@@ -138,6 +140,7 @@ class OpticalDiffractionSimulator(QMainWindow):
         self.go_button.clicked.connect(self.run_simulation)
         self.sweep_button.clicked.connect(self.run_sweep)
         self.sweep_button_w.clicked.connect(self.run_sweep_w)
+        self.meridional_button.clicked.connect(self.run_meridional_plane)
         self.go_filtering_button.clicked.connect(self.update_fourier_filtering_graph)
 
         self.simulation_section.intermediate_updated.connect(self.update_intermediate_graph)
@@ -171,9 +174,13 @@ class OpticalDiffractionSimulator(QMainWindow):
         self.source_section.option1.toggled.connect(self.update_illumination_of_aperture)
         self.source_section.option2.toggled.connect(self.update_illumination_of_aperture)
         self.source_section.option3.toggled.connect(self.update_illumination_of_aperture)
+        self.source_section.option4.toggled.connect(self.update_illumination_of_aperture)
+        self.source_section.zernike_line_edit.editingFinished.connect(self.update_illumination_of_aperture)
+        self.source_section.pupil_radius_line_edit.editingFinished.connect(self.update_illumination_of_aperture)
 
         self.aperture_section.img_file_button.clicked.connect(self.update_illumination_of_aperture)
         self.aperture_section.doe_mode_checkbox.stateChanged.connect(self.update_illumination_of_aperture)
+        self.aperture_section.antialias_checkbox.stateChanged.connect(self.update_illumination_of_aperture)
 
         self.aperture_section.img_amp.toggled.connect(self.update_illumination_of_aperture)
         self.aperture_section.img_pha.toggled.connect(self.update_illumination_of_aperture)
@@ -206,9 +213,11 @@ class OpticalDiffractionSimulator(QMainWindow):
         self.source_section.option1.toggled.connect(self.update_intermediate_graph)
         self.source_section.option2.toggled.connect(self.update_intermediate_graph)
         self.source_section.option3.toggled.connect(self.update_intermediate_graph)
+        self.source_section.option4.toggled.connect(self.update_intermediate_graph)
 
         self.aperture_section.img_file_button.clicked.connect(self.update_intermediate_graph)
         self.aperture_section.doe_mode_checkbox.stateChanged.connect(self.update_intermediate_graph)
+        self.aperture_section.antialias_checkbox.stateChanged.connect(self.update_intermediate_graph)
 
         self.aperture_section.img_amp.toggled.connect(self.update_intermediate_graph)
         self.aperture_section.img_pha.toggled.connect(self.update_intermediate_graph)
@@ -277,6 +286,29 @@ class OpticalDiffractionSimulator(QMainWindow):
         except Exception as e:
             print(f"Sweep error : {e}")
 
+    def run_meridional_plane(self):
+        try:
+            aperture_params = self.aperture_section.get_inputs()
+            aperture = self.aperture_section.aperture
+
+            source_params = self.source_section.get_inputs()
+            source = self.source_section.light_source
+
+            wavelength = float(source_params['wavelength'])
+            assert self.source_section.sampling == self.aperture_section.sampling
+            dx = float(self.source_section.sampling)
+            assert max(aperture.shape) == max(source.shape)
+            N_win =  max(aperture.shape)
+            N_target = int(self.simulation_section.resolution_multiplier) * N_win
+            if N_win < N_target :
+                new_shape = (N_target, N_target)
+                source = zero_pad(source, new_shape)
+                aperture = zero_pad(aperture, new_shape)
+            # no transverse plane is stored : any number of distances
+            self.simulation_section.start_meridional_plane(source, aperture, wavelength, dx)
+        except Exception as e:
+            print(f"Meridional plane error : {e}")
+
     def run_sweep_w(self):
         try:
         # 1. Get the aperture mask
@@ -352,10 +384,10 @@ class OpticalDiffractionSimulator(QMainWindow):
         self.update_intermediate_graph()
 
     def update_illumination_of_aperture(self):
-        aperture = self.aperture_section.aperture
+        aperture = np.asarray(self.aperture_section.aperture)
         source = self.source_section.light_source
 
-        if self.source_section.source_type != "Gaussian beam":
+        if self.source_section.source_type not in ["Gaussian beam", "Aberrated Gaussian beam"]:
             U0 = np.abs(aperture) + 0.5*np.abs(source)
             self.aperture_section.graph_widget.update_data_ap(U0)
             self.aperture_section.graph_widget.slice_view.setLevels(0,1.5)
@@ -450,7 +482,7 @@ class OpticalDiffractionSimulator(QMainWindow):
             aperture = self.aperture_section.aperture
             self.simulation_section.update_intermediate_graph(source, aperture)
 
-            filter = self.simulation_section.filter
+            filter = np.asarray(self.simulation_section.filter)  # the overlay below needs the values
             intermediate_volume = self.simulation_section.intermediate_volume
             self.simulation_section.intermediate_graph_widget.sampling = 1/(max(intermediate_volume.shape)*float(self.aperture_section.sampling))
 
@@ -459,7 +491,7 @@ class OpticalDiffractionSimulator(QMainWindow):
             log_intermediate_volume = np.log1p(np.abs(intermediate_volume))
             log_filtered_volume = np.log1p(np.abs(filtered_volume))
             U0 = filter*log_filtered_volume + 0.4*(1-filter)*log_intermediate_volume
-            lower, upper = np.percentile(U0,[0,99.95])
+            lower, upper = estimate_levels(U0, (0, 99.95))
             self.simulation_section.intermediate_graph_widget.update_data_ap(U0)
             self.simulation_section.intermediate_graph_widget.slice_view.setLevels(-0.1*upper,upper)
 
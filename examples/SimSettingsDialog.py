@@ -9,6 +9,7 @@ import os
 import tifffile
 from PIL import Image
 from automatic_sizing import zero_pad
+from fields import SeparableField
 
 from filters import elliptic_filter, rectangular_filter, elliptic_filter_band, rectangular_filter_band
 
@@ -169,7 +170,7 @@ class SimSettingsDialog(QDialog):
 
     def get_values(self):
         filter = self.generate_filter()
-        filter = filter[np.newaxis,:]
+        filter = filter.expand_dims() if isinstance(filter, SeparableField) else filter[np.newaxis,:]
         return {
             "filter_type": self.filter_type_combo.currentText(),
             "remove_outside": self.remove_outside_checkbox.isChecked(),
@@ -231,6 +232,7 @@ class SimSettingsDialog(QDialog):
         if filter_type != "No filter":
             filter = self.insert_with_offset(filter, shape, (offset_x, offset_y))
         if remove_outside:
+            filter = np.asarray(filter)  # the complement of a lazy filter is not separable
             filter = filter.max()-filter
         return filter
 
@@ -247,7 +249,10 @@ class SimSettingsDialog(QDialog):
 
         Returns:
             np.ndarray of shape target_shape with image placed at offset
+            (SeparableField for a lazy filter, see fields.SeparableField.place)
         """
+        if isinstance(image, SeparableField):
+            return image.place(target_shape, offset)
         new_image = np.zeros(target_shape, dtype=image.dtype)
 
         H, W = target_shape
@@ -297,8 +302,7 @@ class SimSettingsDialog(QDialog):
     
     def update_filter(self):
         filter = self.generate_filter()
-        filter = filter[np.newaxis,:]
-        print(filter.max())
+        filter = filter.expand_dims() if isinstance(filter, SeparableField) else filter[np.newaxis,:]
         self.graph_widget.update_data(filter)
         self.graph_widget.sampling = self.current_values["df"]
         self.graph_widget.slice_view.setLevels(0,1)
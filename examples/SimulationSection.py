@@ -3,19 +3,24 @@ from PyQt5.QtWidgets import (
     QApplication, QVBoxLayout, QWidget, QCheckBox,
     QLabel, QComboBox, QLineEdit,QHBoxLayout, QPushButton, QProgressBar, QDialog
 )
-from PyQt5.QtCore import QSize, pyqtSignal
+from PyQt5.QtCore import QSize, QRectF, pyqtSignal
 from PyQt5.QtGui import QIcon
+import pyqtgraph as pg
 from scipy.ndimage import map_coordinates
 import sys
 
 from ressource_path import resource_path
 from DiffractionSection import RealTimeCrossSectionViewer
-from diffraction_propagation import far_field, angular_spectrum, sweep, sweep_w, fraunhofer, ft_1, ft_2
+from diffraction_propagation import far_field, angular_spectrum, sweep, sweep_w, fraunhofer, ft_1, ft_2, lens_propagation, meridional_plane
 from GenericThread import GenericThread
 from MessageWorker import MessageWorker
 
 from SimSettingsDialog import SimSettingsDialog
 from filters import elliptic_filter, elliptic_filter_band, rectangular_filter, rectangular_filter_band
+from binary_mask import transmit
+from fields import SeparableField, ThinLensField
+from display_pipeline import estimate_levels, field_levels
+from volume_providers import GrowingVolume, MemmapVolume
 
 
 class SimulationSection(QWidget):
@@ -42,6 +47,9 @@ class SimulationSection(QWidget):
 
         self.fourier_mode = False
 
+        self.max_sweep_bytes = 2 * 2**30  # larger sweeps are stored on disk
+        self.stream_volume = None  # sweep being computed, shown plane by plane (GrowingVolume)
+
         self.graph_widget = RealTimeCrossSectionViewer(self.volume)
 
         self.filter = np.ones((1,512,512))
@@ -87,6 +95,14 @@ class SimulationSection(QWidget):
 
         self.widget_layout.addWidget(self.graph_widget)
 
+        # xz / yz intensity along the Z sweep range (meridional_plane)
+        self.meridional_plot = pg.PlotWidget()
+        self.meridional_plot.setLabel('bottom', "z", units=self.unit_distance)
+        self.meridional_item = pg.ImageItem()
+        self.meridional_plot.addItem(self.meridional_item)
+        self.widget_layout.addWidget(self.meridional_plot)
+        self.meridional_plot.hide()
+
         self.resolution_widget = QWidget()
         self.resolution_widget_layout = QHBoxLayout(self.resolution_widget)
 
@@ -187,6 +203,12 @@ class SimulationSection(QWidget):
         self.sweep_widget_layout.addWidget(self.start_sweep_line_edit)
         self.sweep_widget_layout.addWidget(self.end_sweep_line_edit)
         self.sweep_widget_layout.addWidget(self.step_sweep_line_edit)
+        self.sweep_widget_layout.addSpacing(20)
+
+        self.meridional_combo = QComboBox()
+        self.meridional_combo.addItems(["XZ", "YZ"])
+        self.sweep_widget_layout.addWidget(QLabel("Meridional plane"))
+        self.sweep_widget_layout.addWidget(self.meridional_combo)
         self.sweep_widget_layout.addStretch()
         
 
@@ -256,6 +278,10 @@ class SimulationSection(QWidget):
         self.sweep_button_w.setIcon(QIcon(resource_path("icons/blue_arrow.png")))  # Change icon if needed
         self.sweep_button_w.setIconSize(QSize(24, 24))
 
+        self.meridional_button = QPushButton("XZ / YZ Plane")
+        self.meridional_button.setIcon(QIcon(resource_path("icons/game.png")))
+        self.meridional_button.setIconSize(QSize(24, 24))
+
         self.go_filtering_button = QPushButton("Run 4f Simulation")
         self.go_filtering_button.setIcon(QIcon(resource_path("icons/arrows.png")))
         self.go_filtering_button.setIconSize(QSize(24, 24))
@@ -277,19 +303,23 @@ class SimulationSection(QWidget):
         self.go_button.setStyleSheet(button_style.format(color="green", hover="#eaffea"))
         self.sweep_button.setStyleSheet(button_style.format(color="red", hover="#ffeaea"))
         self.sweep_button_w.setStyleSheet(button_style.format(color="blue", hover="#b9dbfe"))
+        self.meridional_button.setStyleSheet(button_style.format(color="red", hover="#ffeaea"))
         self.go_filtering_button.setStyleSheet(button_style.format(color="green", hover="#eaffea"))
 
         self.sweep_button.hide()
         self.sweep_button_w.hide()
+        self.meridional_button.hide()
         # Fix the button size (optional)
         self.go_button.setFixedWidth(200)  # or whatever width looks good
         self.sweep_button.setFixedWidth(200)  # or whatever width looks good
         self.sweep_button_w.setFixedWidth(200)
+        self.meridional_button.setFixedWidth(200)
         self.go_filtering_button.setFixedWidth(200)
         # Right-align the button using a layout
         right_layout = QHBoxLayout()
         right_layout.addWidget(self.go_button)
         right_layout.addWidget(self.sweep_button)  
+        right_layout.addWidget(self.meridional_button)
         right_layout.addWidget(self.sweep_button_w)
         right_layout.addWidget(self.go_filtering_button)
         right_layout.addWidget(self.progress)
@@ -336,7 +366,15 @@ class SimulationSection(QWidget):
     def update_diffraction(self, source, aperture, wavelength, z, dx, eod = False, message_callback = None):
 
         assert source.shape == aperture.shape, f"Unmatched array shape. Source {source.shape}, Aperture {aperture.shape}."
-        U0 = source * aperture
+        if isinstance(source, ThinLensField):
+            # focusing source : the lens is handled analytically, on the grid of the aperture
+            U0 = transmit(source.amplitude(), aperture)
+            result, sampling = lens_propagation(U0, wavelength, source.focal_length, z, dx)
+            M = 1 - z / source.focal_length
+            algo = "Thin lens, focal plane" if abs(M) < 1e-9 else f"Thin lens, effective Fresnel distance = {z / M:.2f}, magnification = {M:.3f}"
+            return result, sampling, algo
+
+        U0 = transmit(source, aperture)
         N = max(U0.shape)
         z_limit = N * dx**2 / wavelength
         fraunhofer_limit = (N * dx)**2 / wavelength
@@ -377,7 +415,7 @@ class SimulationSection(QWidget):
 
     def start_update_sweep(self, source, aperture, wavelength, dx):
         assert source.shape == aperture.shape, f"Unmatched array shape. Source {source.shape}, Aperture {aperture.shape}."
-        U0 = source * aperture
+        U0 = transmit(source, aperture)
         z_start = float(self.start_sweep)
         z_step = float(self.step_sweep)
         z_end = float(self.end_sweep)
@@ -389,10 +427,12 @@ class SimulationSection(QWidget):
             dx,
             z_start,
             z_end,
-            z_step
+            z_step,
+            partial_kwarg="partial"
         )
 
         self.sim_thread.progress_changed.connect(self.progress.setValue)
+        self.sim_thread.partial_result.connect(self.on_sweep_partial)
         self.sim_thread.finished_with_result.connect(self.on_sweep_done)
 
         self.progress.show()
@@ -401,33 +441,128 @@ class SimulationSection(QWidget):
         # Start thread
         self.sim_thread.start()
 
-    def update_sweep(self, U0, wavelength, dx, z_start, z_end, z_step, callback = None):
+    def update_sweep(self, U0, wavelength, dx, z_start, z_end, z_step, callback = None, partial = None):
         try:
-            volume, samplings, distances = sweep(U0, wavelength, dx, z_start,z_end, z_step, callback)
+            out = self.sweep_store(len(np.arange(z_start, z_end, z_step)), U0)
+            levels = []
+            plane_done = self.stream_planes(out, levels, "distance", partial)
+            volume, samplings, distances = sweep(U0, wavelength, dx, z_start,z_end, z_step, callback, out, plane_done)
         except Exception as e:
             print(f"Update sweep error : {e}")
-        return volume, samplings, distances, "distance"
+            return None
+        return volume, samplings, distances, "distance", levels
 
 
 
+    def stream_planes(self, out, levels, kind, partial = None):
+        """
+        plane_callback of sweep / sweep_w : computes the levels of each plane in the sweep thread and, when
+        partial is given, emits (out, index, sampling, distance or wavelength, levels, kind) for on_sweep_partial.
+        """
+        def plane_done(i, sampling, value):
+            levels.append(field_levels(out[i]))  # in the sweep thread, not at display
+            if partial:
+                partial((out, i, sampling, value, levels[i], kind))
+        return plane_done
+
+    def on_sweep_partial(self, result):
+        # one more plane : shown while the sweep thread computes the next one
+        store, index, sampling, value, levels, kind = result
+        if index == 0:
+            self.stream_volume = GrowingVolume(store)
+            self.stream_levels = []
+            self.graph_widget.samplings, values = [], []
+            self.graph_widget.distances = values if kind == "distance" else None
+            self.graph_widget.wavelengths = None if kind == "distance" else values
+        elif self.stream_volume is None or self.stream_volume.store is not store:
+            return  # plane of a sweep already replaced by a new one
+        self.graph_widget.samplings.append(sampling)
+        (self.graph_widget.distances if kind == "distance" else self.graph_widget.wavelengths).append(value)
+        self.stream_levels.append(levels)
+        self.stream_volume.grow(index + 1)
+        self.volume = self.stream_volume
+        if index == 0:
+            self.graph_widget.update_data(self.volume, levels=self.stream_levels)
+        else:
+            self.graph_widget.extend_volume(self.volume, self.stream_levels)
+        if index == 1:
+            self.graph_widget.on_time_changed()  # sampling and distance / wavelength of the slice shown
+
     def on_sweep_done(self, result):
         if result is None:
             return 
         if result[3] == "distance":
-            self.volume, self.graph_widget.samplings, self.graph_widget.distances, _ = result
+            volume, self.graph_widget.samplings, self.graph_widget.distances, _, levels = result
             self.graph_widget.wavelengths = None
         else:
-            self.volume, self.graph_widget.samplings, self.graph_widget.wavelengths, _ = result
+            volume, self.graph_widget.samplings, self.graph_widget.wavelengths, _, levels = result
             self.graph_widget.distances = None
-        self.graph_widget.update_data(self.volume)
+        if self.stream_volume is not None and self.stream_volume.store is volume:
+            # already on screen plane by plane : the slice being inspected stays
+            self.volume = self.stream_volume
+            self.graph_widget.extend_volume(self.volume, levels)
+        else:
+            self.volume = volume
+            self.graph_widget.update_data(self.volume, levels=levels)
+        self.stream_volume = None
         self.graph_widget.update_cross_section()
         self.graph_widget.update_cursor_labels()
         self.graph_widget.on_time_changed()
         self.progress.hide()
 
+    def start_meridional_plane(self, source, aperture, wavelength, dx):
+        assert source.shape == aperture.shape, f"Unmatched array shape. Source {source.shape}, Aperture {aperture.shape}."
+        U0 = transmit(source, aperture)
+        z_start = float(self.start_sweep)
+        z_step = float(self.step_sweep)
+        z_end = float(self.end_sweep)
+        axis = "x" if self.meridional_combo.currentText() == "XZ" else "y"
+
+        self.sim_thread = GenericThread(
+            self.update_meridional_plane,
+            U0,
+            wavelength,
+            dx,
+            z_start,
+            z_end,
+            z_step,
+            axis
+        )
+
+        self.sim_thread.progress_changed.connect(self.progress.setValue)
+        self.sim_thread.finished_with_result.connect(self.on_meridional_done)
+
+        self.progress.show()
+        self.progress.setValue(0)
+
+        # Start thread
+        self.sim_thread.start()
+
+    def update_meridional_plane(self, U0, wavelength, dx, z_start, z_end, z_step, axis, callback = None):
+        try:
+            intensity, distances = meridional_plane(U0, wavelength, dx, z_start, z_end, z_step, axis, callback=callback)
+        except Exception as e:
+            print(f"Meridional plane error : {e}")
+            return None
+        return intensity, distances, dx, axis
+
+    def on_meridional_done(self, result):
+        self.progress.hide()
+        if result is None:
+            return
+        intensity, distances, dx, axis = result
+        n = intensity.shape[1]
+        step = distances[1] - distances[0] if len(distances) > 1 else 1.0
+        # image axis 0 (z) along the horizontal axis of the plot, pixels centered on their coordinates
+        self.meridional_item.setImage(intensity, levels=estimate_levels(intensity, (0, 99.95)))
+        self.meridional_item.setRect(QRectF(distances[0] - step / 2, (-(n // 2) - 0.5) * dx, step * len(distances), n * dx))
+        self.meridional_plot.setLabel('left', axis, units=self.unit_distance)
+        self.meridional_plot.show()
+        self.meridional_plot.autoRange()
+
     def start_update_sweep_w(self, source, aperture, z, dx):
         assert source.shape == aperture.shape, f"Unmatched array shape. Source {source.shape}, Aperture {aperture.shape}."
-        U0 = source * aperture
+        U0 = transmit(source, aperture)
         w_start = float(self.start_sweep_w)
         w_step = float(self.step_sweep_w)
         w_end = float(self.end_sweep_w)
@@ -439,10 +574,12 @@ class SimulationSection(QWidget):
             dx,
             w_start,
             w_end,
-            w_step
+            w_step,
+            partial_kwarg="partial"
         )
 
         self.sim_thread.progress_changed.connect(self.progress.setValue)
+        self.sim_thread.partial_result.connect(self.on_sweep_partial)
         self.sim_thread.finished_with_result.connect(self.on_sweep_done)
 
         self.progress.show()
@@ -451,12 +588,27 @@ class SimulationSection(QWidget):
         # Start thread
         self.sim_thread.start()
 
-    def update_sweep_w(self, U0, z, dx, w_start, w_end, w_step, callback = None):
+    def sweep_store(self, n_planes, U0):
+        """
+        Volume the planes of a sweep are written to : in memory up to max_sweep_bytes, else a complex64
+        temporary file on disk, browsed slice by slice by the viewer. Allocated before the sweep, so that
+        the planes can be shown while the next ones are computed.
+        """
+        shape = (n_planes, *U0.shape[-2:])
+        if np.prod(shape) * np.dtype(np.complex128).itemsize <= self.max_sweep_bytes:
+            return np.zeros(shape, dtype=np.complex128)
+        return MemmapVolume.temporary(shape, np.complex64)
+
+    def update_sweep_w(self, U0, z, dx, w_start, w_end, w_step, callback = None, partial = None):
         try:
-            volume, samplings, wavelengths = sweep_w(U0, z, dx, w_start, w_end, w_step, callback)
+            out = self.sweep_store(len(np.arange(w_start, w_end, w_step)), U0)
+            levels = []
+            plane_done = self.stream_planes(out, levels, "wavelengths", partial)
+            volume, samplings, wavelengths = sweep_w(U0, z, dx, w_start, w_end, w_step, callback, out, plane_done)
         except Exception as e:
             print(f"Update sweep error : {e}")
-        return volume, samplings, wavelengths, "wavelengths"
+            return None
+        return volume, samplings, wavelengths, "wavelengths", levels
 
     
     def pixout(self, source, wavelength, z, dx):
@@ -471,6 +623,7 @@ class SimulationSection(QWidget):
     def update_sweep_visibility(self, checked):
         self.sweep_widget.setVisible(checked)
         self.sweep_button.setVisible(checked)
+        self.meridional_button.setVisible(checked)
 
     def update_sweep_w_visibility(self, checked):
         self.sweep_widget_w.setVisible(checked)
@@ -558,12 +711,15 @@ class SimulationSection(QWidget):
 
 
     def update_intermediate_graph(self, source, aperture):
-        self.intermediate_volume = ft_1(source*aperture)
+        self.intermediate_volume = ft_1(transmit(source, aperture))
         
     def update_fourier_filtering_graph(self):
         intermediate_volume = self.intermediate_volume
         filter = self.filter
-        U0 = intermediate_volume * filter
+        if isinstance(filter, SeparableField):
+            U0 = filter.multiply(intermediate_volume)  # lazy filter, applied by rows and columns when separable
+        else:
+            U0 = intermediate_volume * filter
         self.volume = ft_2(U0)
         self.graph_widget.sampling = float(self.sampling)
         self.graph_widget.update_data(self.volume)
@@ -6,7 +6,7 @@ import pyqtgraph as pg
 import sys
 
 from DiffractionSection import RealTimeCrossSectionViewer
-from sources import gaussian_beam, plane_wave_rectangular, converging_spherical_wave
+from sources import gaussian_beam, plane_wave_rectangular, converging_spherical_wave, zernike_source
 
 class SourceSection(QWidget):
     def __init__(self):
@@ -19,11 +19,12 @@ class SourceSection(QWidget):
         self.sampling = "1.0" #µm 
         self.array_shape = ("512","512")
         self.focal_length = "1e3"
+        self.zernike_coefficients = "0, 0, 0, 0.5"    # waves, Noll order
+        self.pupil_radius = "250"
 
-        self.light_source = plane_wave_rectangular(shape=tuple(map(int,self.array_shape)))
-        self.light_source = np.repeat(self.light_source[np.newaxis, :, :], 1, axis=0)
-        self.graph_widget = RealTimeCrossSectionViewer(self.light_source)
-        self.graph_widget.update_data(self.light_source)
+        self.light_source = plane_wave_rectangular(shape=tuple(map(int,self.array_shape))).expand_dims()
+        self.graph_widget = RealTimeCrossSectionViewer(np.asarray(self.light_source))
+        self.graph_widget.update_data(np.asarray(self.light_source))
         self.graph_widget.slice_view.setLevels(0,1)
 
         #hide histogram and roiPlot
@@ -48,6 +49,7 @@ class SourceSection(QWidget):
         self.setup_spec_widget()
         self.setup_beam_widget()
         self.setup_focal_length_widget()
+        self.setup_zernike_widget()
         self.setup_beam_shape()
 
 
@@ -97,6 +99,7 @@ class SourceSection(QWidget):
         self.option1 = QRadioButton("Plane wave")
         self.option2 = QRadioButton("Gaussian beam")
         self.option3 = QRadioButton("Converging spherical wave")
+        self.option4 = QRadioButton("Aberrated Gaussian beam")
 
         self.option1.setChecked(True)  
 
@@ -105,6 +108,7 @@ class SourceSection(QWidget):
         self.beam_label_widget_layout.addWidget(self.option1)
         self.beam_label_widget_layout.addWidget(self.option2)
         self.beam_label_widget_layout.addWidget(self.option3)
+        self.beam_label_widget_layout.addWidget(self.option4)
         self.beam_label_widget_layout.addStretch()
 
 
@@ -129,35 +133,47 @@ class SourceSection(QWidget):
         self.option1.toggled.connect(self.update_beam_widgets)
         self.option2.toggled.connect(self.update_beam_widgets)
         self.option3.toggled.connect(self.update_beam_widgets)
+        self.option4.toggled.connect(self.update_beam_widgets)
 
         # Connect signals for live attribute updating
         self.option1.toggled.connect(self.update_attributes)
         self.option2.toggled.connect(self.update_attributes)
         self.option3.toggled.connect(self.update_attributes)
+        self.option4.toggled.connect(self.update_attributes)
         self.unit_combo.currentIndexChanged.connect(self.update_attributes)
         self.wavelength_line_edit.textChanged.connect(self.update_attributes)
         self.beam_waist_line_edit.textChanged.connect(self.update_attributes)
         self.focal_length_line_edit.textChanged.connect(self.update_attributes)
+        self.zernike_line_edit.textChanged.connect(self.update_attributes)
+        self.pupil_radius_line_edit.textChanged.connect(self.update_attributes)
 
         self.option1.toggled.connect(self.update_graph)
         self.option2.toggled.connect(self.update_graph)
         self.option3.toggled.connect(self.update_graph)
+        self.option4.toggled.connect(self.update_graph)
         self.unit_combo.currentIndexChanged.connect(self.update_graph)
         self.wavelength_line_edit.textChanged.connect(self.update_graph)
 
         self.beam_waist_line_edit.textChanged.connect(self.update_graph)
         self.focal_length_line_edit.textChanged.connect(self.update_graph)
+        self.zernike_line_edit.textChanged.connect(self.update_graph)
+        self.pupil_radius_line_edit.textChanged.connect(self.update_graph)
 
         self.wavelength_line_edit.editingFinished.connect(self.update_color)
         self.update_color()
 
     def update_beam_widgets(self):
+        self.zernike_widget.hide()
         if self.option1.isChecked():
             self.gaussian_widget.hide()
             self.focal_length_widget.hide()
         elif self.option2.isChecked():
             self.gaussian_widget.show()
             self.focal_length_widget.hide()
+        elif self.option4.isChecked():
+            self.gaussian_widget.show()
+            self.focal_length_widget.hide()
+            self.zernike_widget.show()
         else:
             self.gaussian_widget.hide()
             self.focal_length_widget.show()
@@ -168,11 +184,15 @@ class SourceSection(QWidget):
             self.source_type = "Plane Wave"
         elif self.option2.isChecked():
             self.source_type = "Gaussian beam"
+        elif self.option4.isChecked():
+            self.source_type = "Aberrated Gaussian beam"
         else:
             self.source_type = "Converging spherical wave"
         self.distance_unit = self.unit_combo.currentText()
         self.wavelength = self.wavelength_line_edit.text()
         self.focal_length = self.focal_length_line_edit.text()
+        self.zernike_coefficients = self.zernike_line_edit.text()
+        self.pupil_radius = self.pupil_radius_line_edit.text()
         if self.source_type == "Plane Wave":
             self.waist = None
         else:
@@ -188,7 +208,9 @@ class SourceSection(QWidget):
             "unit": self.distance_unit,
             "wavelength": self.wavelength,
             "beam waist" : self.waist,
-            "focal_length" : self.focal_length
+            "focal_length" : self.focal_length,
+            "zernike_coefficients" : self.zernike_coefficients,
+            "pupil_radius" : self.pupil_radius
         }
     def update_graph(self):
         inputs = self.get_inputs()
@@ -200,7 +222,7 @@ class SourceSection(QWidget):
             new_source = plane_wave_rectangular(shape=shape)
 
             # Add batch dimension for compatibility
-            new_source = np.expand_dims(new_source, axis=0)
+            new_source = new_source.expand_dims()
 
         elif inputs["source_type"] == "Gaussian beam":
             # Gaussian beam generation with waist
@@ -211,7 +233,20 @@ class SourceSection(QWidget):
                 return
 
             base_source = gaussian_beam(w0=waist)
-            new_source = np.expand_dims(base_source, axis=0)
+            new_source = base_source.expand_dims()
+
+        elif inputs["source_type"] == "Aberrated Gaussian beam":
+            try:
+                shape = tuple(map(int, self.array_shape))
+                waist = float(inputs["beam waist"])
+                coefficients = [float(c) for c in inputs["zernike_coefficients"].replace(",", " ").split()]
+                pupil_radius = float(inputs["pupil_radius"])
+                base_source = zernike_source(coefficients, shape=shape, dx=dx, pupil_radius=pupil_radius,
+                                             amplitude=gaussian_beam(shape=shape, w0=waist, dx=dx))
+                new_source = base_source[np.newaxis, :, :]
+            except Exception as e:
+                print("Invalid params for the aberrated beam :", e)
+                return
 
         else: 
             try:
@@ -220,14 +255,14 @@ class SourceSection(QWidget):
                 focal_length = float(inputs['focal_length'])
                 wavelength = float(inputs['wavelength'])
                 base_source = converging_spherical_wave(shape=shape, wavelength=wavelength, focal_length=focal_length, dx = float(self.sampling))
-                new_source = np.expand_dims(base_source, axis=0)
+                new_source = base_source.expand_dims()
             except Exception as e:
                 print("Invalid params for converging parameters :", e)
                 return
     
-        # Update graph widget with new source data
+        # Update graph widget with new source data : the source stays lazy, only the display is materialized
         self.light_source = new_source
-        self.graph_widget.update_data(new_source)
+        self.graph_widget.update_data(np.asarray(new_source))
         self.graph_widget.slice_view.setLevels(0,1)
 
 
@@ -247,6 +282,27 @@ class SourceSection(QWidget):
         self.page_layout.addWidget(self.focal_length_widget)
 
 
+    def setup_zernike_widget(self):
+        self.zernike_widget = QWidget()
+        self.zernike_widget_layout = QHBoxLayout(self.zernike_widget)
+
+        self.zernike_widget_layout.addWidget(QLabel("Zernike coefficients (waves, Noll order)"))
+        self.zernike_widget_layout.addSpacing(20)
+        self.zernike_line_edit = QLineEdit()
+        self.zernike_line_edit.setText(self.zernike_coefficients)
+        self.zernike_line_edit.setFixedWidth(200)
+        self.zernike_widget_layout.addWidget(self.zernike_line_edit)
+
+        self.zernike_widget_layout.addSpacing(20)
+        self.zernike_widget_layout.addWidget(QLabel("Pupil radius"))
+        self.pupil_radius_line_edit = QLineEdit()
+        self.pupil_radius_line_edit.setText(self.pupil_radius)
+        self.pupil_radius_line_edit.setFixedWidth(100)
+        self.zernike_widget_layout.addWidget(self.pupil_radius_line_edit)
+        self.zernike_widget_layout.addStretch()
+
+        self.page_layout.addWidget(self.zernike_widget)
+
     def wavelength_to_rgb(self,wavelength):
         """
         Convert a wavelength in nm (380 to 750) to an RGB color.
@@ -0,0 +1,283 @@
+import numpy as np
+
+from binary_mask import BinaryMask
+
+
+class ApertureNode:
+    """
+    Node of a declarative aperture expression (constructive solid geometry).
+
+    Primitives (Ellipse, Rectangle) are combined with | (union), & (intersection) and - (difference),
+    placed with translate / rotate and repeated with grid. Coordinates are physical (e.g. microns),
+    x along the columns, y along the rows, origin at the pixel (h//2, w//2) of the rendered image by default.
+
+    Every node knows its bounding box, so that render() evaluates the whole tree in one pass over
+    tiles and skips, at every level of the tree, the tiles that a sub-expression cannot cover.
+    """
+
+    def bbox(self):
+        """(xmin, xmax, ymin, ymax) of the region the node can cover."""
+        raise NotImplementedError
+
+    def contains(self, x, y):
+        """
+        Boolean mask of the points inside the aperture.
+
+        Args:
+            x (np.array), y (np.array): Coordinates, broadcastable against each other.
+
+        Returns:
+            np.array: bool, broadcast shape of x and y.
+        """
+        raise NotImplementedError
+
+    def evaluate(self, x, y, box):
+        """
+        contains() on a tile, or None when the tile is outside the node's bounding box (all False).
+
+        Args:
+            x (np.array): (1, tw) column coordinates of the tile.
+            y (np.array): (th, 1) row coordinates of the tile.
+            box (tuple): (xmin, xmax, ymin, ymax) of the tile.
+        """
+        if not _overlap(self.bbox(), box):
+            return None
+        return np.broadcast_to(self.contains(x, y), (y.shape[0], x.shape[1]))
+
+    def __or__(self, other):
+        return Union(self, other)
+
+    def __and__(self, other):
+        return Intersection(self, other)
+
+    def __sub__(self, other):
+        return Difference(self, other)
+
+    def translate(self, x=0.0, y=0.0):
+        return Translate(self, x, y)
+
+    def rotate(self, angle):
+        """Rotation by angle (radians) around the origin."""
+        return Rotate(self, angle)
+
+    def grid(self, pitch, counts):
+        """Regular (rows, cols) repetition of the node, centered on the origin, see Grid."""
+        return Grid(self, pitch, counts)
+
+    def __repr__(self):
+        # the whole expression, e.g. Difference(Grid(Rectangle(2, 100), 10, 10, 5, 1), Rectangle(20, 20)) :
+        # also used as cache key
+        return f"{type(self).__name__}({', '.join(map(repr, vars(self).values()))})"
+
+
+def _overlap(a, b):
+    return a[0] <= b[1] and b[0] <= a[1] and a[2] <= b[3] and b[2] <= a[3]
+
+
+class Ellipse(ApertureNode):
+    """Centered ellipse of diameters (height, width)."""
+
+    def __init__(self, height, width):
+        self.height, self.width = height, width
+
+    def bbox(self):
+        return (-self.width / 2, self.width / 2, -self.height / 2, self.height / 2)
+
+    def contains(self, x, y):
+        return (x / (self.width / 2)) ** 2 + (y / (self.height / 2)) ** 2 <= 1
+
+
+class Rectangle(ApertureNode):
+    """Centered rectangle of size (height, width)."""
+
+    def __init__(self, height, width):
+        self.height, self.width = height, width
+
+    def bbox(self):
+        return (-self.width / 2, self.width / 2, -self.height / 2, self.height / 2)
+
+    def contains(self, x, y):
+        return (np.abs(x) <= self.width / 2) & (np.abs(y) <= self.height / 2)
+
+
+class Translate(ApertureNode):
+    def __init__(self, node, x, y):
+        self.node, self.x, self.y = node, x, y
+
+    def bbox(self):
+        xmin, xmax, ymin, ymax = self.node.bbox()
+        return (xmin + self.x, xmax + self.x, ymin + self.y, ymax + self.y)
+
+    def contains(self, x, y):
+        return self.node.contains(x - self.x, y - self.y)
+
+    def evaluate(self, x, y, box):
+        return self.node.evaluate(x - self.x, y - self.y,
+                                  (box[0] - self.x, box[1] - self.x, box[2] - self.y, box[3] - self.y))
+
+
+class Rotate(ApertureNode):
+    def __init__(self, node, angle):
+        self.node, self.angle = node, angle
+
+    def bbox(self):
+        # box of the rotated corners of the node's box
+        xmin, xmax, ymin, ymax = self.node.bbox()
+        c, s = np.cos(self.angle), np.sin(self.angle)
+        corners_x = np.array([xmin, xmax, xmin, xmax])
+        corners_y = np.array([ymin, ymin, ymax, ymax])
+        rx, ry = c * corners_x - s * corners_y, s * corners_x + c * corners_y
+        return (rx.min(), rx.max(), ry.min(), ry.max())
+
+    def contains(self, x, y):
+        c, s = np.cos(self.angle), np.sin(self.angle)
+        return self.node.contains(c * x + s * y, -s * x + c * y)
+
+
+class Grid(ApertureNode):
+    """
+    Regular repetition of a node, centered on the origin.
+
+    Each point is tested against its nearest grid element only (index = rounded coordinate / pitch),
+    so the cost does not depend on the number of elements. The elements must not overlap: the node
+    has to fit in one (pitch_y, pitch_x) cell around its origin.
+    """
+
+    def __init__(self, node, pitch, counts):
+        self.node = node
+        self.pitch_y, self.pitch_x = pitch
+        self.rows, self.cols = counts
+
+    def bbox(self):
+        xmin, xmax, ymin, ymax = self.node.bbox()
+        half_x = (self.cols - 1) / 2 * self.pitch_x
+        half_y = (self.rows - 1) / 2 * self.pitch_y
+        return (xmin - half_x, xmax + half_x, ymin - half_y, ymax + half_y)
+
+    def _local(self, u, pitch, count):
+        index = np.clip(np.round(u / pitch + (count - 1) / 2), 0, count - 1)
+        return u - (index - (count - 1) / 2) * pitch
+
+    def contains(self, x, y):
+        return self.node.contains(self._local(x, self.pitch_x, self.cols), self._local(y, self.pitch_y, self.rows))
+
+
+class Union(ApertureNode):
+    def __init__(self, *nodes):
+        self.nodes = nodes
+
+    def bbox(self):
+        boxes = np.array([node.bbox() for node in self.nodes])
+        return (boxes[:, 0].min(), boxes[:, 1].max(), boxes[:, 2].min(), boxes[:, 3].max())
+
+    def contains(self, x, y):
+        return np.logical_or.reduce([node.contains(x, y) for node in self.nodes])
+
+    def evaluate(self, x, y, box):
+        masks = [mask for mask in (node.evaluate(x, y, box) for node in self.nodes) if mask is not None]
+        return np.logical_or.reduce(masks) if masks else None
+
+
+class Intersection(ApertureNode):
+    def __init__(self, *nodes):
+        self.nodes = nodes
+
+    def bbox(self):
+        boxes = np.array([node.bbox() for node in self.nodes])
+        return (boxes[:, 0].max(), boxes[:, 1].min(), boxes[:, 2].max(), boxes[:, 3].min())
+
+    def contains(self, x, y):
+        return np.logical_and.reduce([node.contains(x, y) for node in self.nodes])
+
+    def evaluate(self, x, y, box):
+        mask = None
+        for node in self.nodes:
+            child = node.evaluate(x, y, box)
+            if child is None:
+                return None
+            mask = child if mask is None else mask & child
+        return mask
+
+
+class Difference(ApertureNode):
+    """Points of a that are not in b."""
+
+    def __init__(self, a, b):
+        self.a, self.b = a, b
+
+    def bbox(self):
+        return self.a.bbox()
+
+    def contains(self, x, y):
+        return self.a.contains(x, y) & ~self.b.contains(x, y)
+
+    def evaluate(self, x, y, box):
+        a = self.a.evaluate(x, y, box)
+        if a is None:
+            return None
+        b = self.b.evaluate(x, y, box)
+        return a if b is None else a & ~b
+
+
+def pixel_grid(node, first, pitch, counts):
+    """
+    Grid of a node in pixel coordinates, to be rendered with dx=1.0 and origin=(0, 0) (x = column, y = row).
+
+    Used with the pixel layouts of the stamping generators (apertures.slit_layout, square_array_layout,
+    elliptical_array_layout), so that the rendered mask is the generator's one: a Rectangle of n pixels
+    centered on a pixel centre (odd n) or between two (even n) covers exactly n pixels.
+
+    Args:
+        node (ApertureNode): Element, centered on the origin, sizes in pixels.
+        first (tuple): (row, col) of the (fractional) centre of the first element.
+        pitch (tuple): (rows, cols) distance between two elements, in pixels.
+        counts (tuple): Number of elements (rows, cols).
+
+    Returns:
+        ApertureNode
+    """
+    return node.grid(pitch, counts).translate(x=first[1] + (counts[1] - 1) / 2 * pitch[1],
+                                              y=first[0] + (counts[0] - 1) / 2 * pitch[0])
+
+
+def render(node, shape=(512, 512), dx=1.0, tile=256, origin=None):
+    """
+    Rasterize an aperture expression, sampled at the pixel centres, in one pass over tiles.
+
+    The image is processed by bands of tile rows, each band by (tile x tile) tiles, and only the tiles
+    overlapping the tree's bounding box are evaluated (the nodes prune deeper tiles themselves). Each
+    band is packed as soon as it is complete: the full image never exists unpacked.
+
+    Args:
+        node (ApertureNode): Aperture expression.
+        shape (tuple): Output image size (height, width) in pixels.
+        dx (float): Sampling rate (physical size per pixel).
+        tile (int): Tile size in pixels.
+        origin (tuple): (row, col) pixel of the coordinate origin, (h//2, w//2) if None.
+
+    Returns:
+        BinaryMask: (height, width) mask.
+    """
+    h, w = shape
+    row_origin, col_origin = (h // 2, w // 2) if origin is None else origin
+    x = (np.arange(w) - col_origin) * dx
+    y = (np.arange(h) - row_origin) * dx
+    xmin, xmax, ymin, ymax = node.bbox()
+    mask = BinaryMask.zeros((h, w))
+
+    # only the rows / cols of the bounding box (with one pixel of margin)
+    row0, row1 = np.searchsorted(y, [ymin - dx, ymax + dx])
+    col0, col1 = np.searchsorted(x, [xmin - dx, xmax + dx])
+
+    for r in range(row0, row1, tile):
+        band = np.zeros((min(tile, row1 - r), w), dtype=bool)
+        ty = y[r:r + band.shape[0], np.newaxis]
+        for c in range(col0, col1, tile):
+            tx = x[np.newaxis, c:min(c + tile, col1)]
+            box = (tx[0, 0], tx[0, -1], ty[0, 0], ty[-1, 0])
+            tile_mask = node.evaluate(tx, ty, box)
+            if tile_mask is not None:
+                band[:, c:c + tx.shape[1]] = tile_mask
+        packed = np.packbits(band, axis=-1)
+        mask.packed[r:r + band.shape[0], :packed.shape[-1]] = packed
+    return mask
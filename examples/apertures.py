@@ -1,12 +1,15 @@
 import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from functools import lru_cache
 import sys
 from PyQt5.QtWidgets import QApplication
 from DiffractionSection import RealTimeCrossSectionViewer 
 from PIL import Image
+from aperture_model import Ellipse, Rectangle, pixel_grid
 
 
 
-def elliptical_aperture(shape=(512,512), size = (300,300), dx = 1.0):
+def elliptical_aperture(shape=(512,512), size = (300,300), dx = 1.0, antialias=False):
     """
     Create a centered elliptical aperture.
     
@@ -14,12 +17,18 @@ def elliptical_aperture(shape=(512,512), size = (300,300), dx = 1.0):
         shape (tuple): Output image size (height, width) in pixels.
         size (tuple): Ellipse diameters (big_diameter, small_diameter) in physical units (e.g., microns).
         dx (float): Sampling rate (physical size per pixel).
+        antialias (bool): Fractional coverage of the edge pixels instead of a hard mask (see coverage_stamp).
         
     Returns:
         2D np.array: Binary image with 1s inside the ellipse, 0s outside.
     """
     h, w = shape
     big_diameter, small_diameter = size
+
+    if antialias:
+        # big diameter along the rows, like the mask below
+        aperture = np.zeros((h, w), dtype=np.float64)
+        return add_coverage(aperture, "ellipse", (big_diameter, small_diameter), dx, [h//2], [w//2])
     
     # Create coordinate grids centered at zero, scaled by dx
     x = (np.arange(w) - w//2) * dx
@@ -35,33 +44,33 @@ def elliptical_aperture(shape=(512,512), size = (300,300), dx = 1.0):
     return aperture.astype(np.float64)
 
 
-def rectangular_aperture(shape=(512,512), size = (300,300), dx = 1.0):
+def rectangular_aperture(shape=(512,512), size = (300,300), dx = 1.0, antialias=False):
     """
     Create a centered rectangular aperture.
 
     Args:
         shape (tuple): Output image size (height, width).
         size (tuple): Rectangle size (height, width).
+        antialias (bool): Exact fractional coverage of the edge pixels instead of a hard mask.
 
     Returns:
         2D np.array: Binary image with 1s inside the rectangle, 0s outside.
     """
-    # Create a SQUARE aperture (instead of circular)
-    eps = 1e-9
     h, w = shape
     hr, wr = size
-    print(hr, wr, dx, h, hr/dx)
     assert hr / dx <= h, "Sampling value is too low"
     assert wr / dx <= w, "Sampling value is too low"
+    if antialias:
+        # same centre as the mask below : pixel (-(-h//2), -(-w//2))
+        return np.outer(interval_coverage(h, [-(-h//2)], hr / dx), interval_coverage(w, [-(-w//2)], wr / dx))
     x = np.arange(-w//2, w//2) * dx
     y = np.arange(-h//2, h//2) * dx
-    X, Y = np.meshgrid(x, y)
-    aperture = ((np.abs(X) <= wr/2) & (np.abs(Y) <= hr/2)).astype(np.float64)  # Square mask
-    print(np.max(aperture))
+    # The rectangle is separable: outer product of the row and column masks
+    aperture = np.outer(np.abs(y) <= hr/2, np.abs(x) <= wr/2).astype(np.float64)
     return aperture
 
 
-def slit_aperture(shape=(1024, 1024), size=(700, 1024), W=100, d=500, dx=1.0):
+def slit_aperture(shape=(1024, 1024), size=(700, 1024), W=100, d=500, dx=1.0, antialias=False):
     """
     Create a horizontal multi-slit aperture pattern where the midpoint between
     the first and last slits lies on the center row of the image. All slits fit
@@ -73,6 +82,8 @@ def slit_aperture(shape=(1024, 1024), size=(700, 1024), W=100, d=500, dx=1.0):
         W (float): height of each slit (um)
         d (float): spacing between slit centers (um)
         dx (float): microns per pixel
+        antialias (bool): Exact fractional coverage of the slit edges, with the physical (unrounded)
+            slit height, spacing and width.
 
     Returns:
         np.ndarray: binary aperture image (1s = slits)
@@ -100,29 +111,77 @@ def slit_aperture(shape=(1024, 1024), size=(700, 1024), W=100, d=500, dx=1.0):
     cy = img_h // 2
     cx = img_w // 2
 
-    # Total vertical span of the slit centers
-    slit_span = (num_slits - 1) * d_px
+    if antialias:
+        # The slits are separable : (sum of the slit rows) x (aperture width)
+        # centred half a pixel above/left of (cy, cx), like the pixel-rounded slits below
+        centers = cy - 0.5 + (np.arange(num_slits) - (num_slits - 1) / 2) * (d / dx)
+        return np.outer(interval_coverage(img_h, centers, W / dx), interval_coverage(img_w, [cx - 0.5], size[1] / dx))
 
-    # First slit center y-position so that midpoint of slit array is centered
-    first_center_y = cy - slit_span // 2
+    # Rows of every slit at once (all slits have the same height)
+    (first_row, first_col), n_slits, (slit_h, slit_w), pitch = slit_layout(shape, size, W, d, dx)
+    rows = (first_row + pitch * np.arange(n_slits)[:, np.newaxis] + np.arange(slit_h)).ravel()
+    aperture[rows, first_col:first_col + slit_w] = 1.0
 
-    # Horizontal bounds (centered)
-    x_start = cx - ap_w_px // 2
-    x_end = cx + ap_w_px // 2
+    return aperture
 
-    # Draw each slit
-    for i in range(num_slits):
-        center_y = first_center_y + i * d_px
-        y_start = center_y - W_px // 2
-        y_end = center_y + W_px // 2
 
-        if 0 <= y_start < img_h and y_end <= img_h:
-            aperture[y_start:y_end, x_start:x_end] = 1.0
+def slit_layout(shape, size, W, d, dx=1.0):
+    """
+    Pixel layout of the slits of slit_aperture (without antialias), shared with the aperture expressions.
+
+    The sizes are truncated to whole pixels, the slits have 2 * (W_px // 2) rows and 2 * (ap_w_px // 2)
+    columns, d_px rows apart, the middle of the span of their centres on the row h // 2. Only the slits
+    entirely inside the image are kept, the width is clipped to the image.
+
+    Args:
+        shape, size, W, d, dx: See slit_aperture.
+
+    Returns:
+        tuple: (row, col) of the top-left pixel of the first slit kept, number of slits kept,
+            (height, width) of a slit and distance between two slits, in pixels.
+    """
+    assert W > 0 and d > 0
+    assert W < d
+    assert W / dx >= 1, "Slit height too small for resolution"
+    assert d / dx >= 1, "Slit spacing too small for resolution"
+
+    img_h, img_w = shape
+    ap_h_px, ap_w_px, W_px, d_px = int(size[0] / dx), int(size[1] / dx), int(W / dx), int(d / dx)
+    num_slits = max(int((ap_h_px + d_px - 1) // d_px), 0)  # max that fit with spacing
+    cy, cx = img_h // 2, img_w // 2
+    slit_h = 2 * (W_px // 2)
+
+    # first slit center so that the midpoint of the slit array is centered
+    y_starts = cy - (num_slits - 1) * d_px // 2 + np.arange(num_slits) * d_px - W_px // 2
+    y_starts = y_starts[(y_starts >= 0) & (y_starts < img_h) & (y_starts + slit_h <= img_h)]
+
+    # horizontal bounds (centered), clipped to the image
+    x_start = max(cx - ap_w_px // 2, 0)
+    slit_w = max(min(cx + ap_w_px // 2, img_w) - x_start, 0)
+
+    first_row = int(y_starts[0]) if len(y_starts) else 0
+    return (first_row, x_start), len(y_starts), (slit_h, slit_w), d_px
 
-    return aperture
+
+def slit_model(shape, size, W, d, dx=1.0):
+    """
+    Aperture expression of slit_aperture (without antialias), in pixel coordinates: rendered with
+    aperture_model.render(model, shape, 1.0, origin=(0, 0)), it is the generator's mask.
+
+    Args:
+        shape, size, W, d, dx: See slit_aperture.
+
+    Returns:
+        ApertureNode, None when no slit is drawn.
+    """
+    (row, col), n_slits, (slit_h, slit_w), pitch = slit_layout(shape, size, W, d, dx)
+    if n_slits == 0 or slit_h == 0 or slit_w == 0:
+        return None
+    return pixel_grid(Rectangle(slit_h, slit_w), (row + (slit_h - 1) / 2, col + (slit_w - 1) / 2), (pitch, pitch),
+                      (n_slits, 1))
 
  
-def square_aperture_array(shape=(512, 512), square_size=1, spacing=5, grid_size=(5, 5), dx=1.0):
+def square_aperture_array(shape=(512, 512), square_size=1, spacing=5, grid_size=(5, 5), dx=1.0, antialias=False):
     """
     Create a 2D image with a grid of square apertures.
 
@@ -132,6 +191,7 @@ def square_aperture_array(shape=(512, 512), square_size=1, spacing=5, grid_size=
         spacing (float): Distance between square centers (in microns).
         grid_size (tuple): Number of squares (rows, columns).
         dx (float): Sampling rate (microns/pixel).
+        antialias (bool): Exact fractional coverage, with the physical (unrounded) size and spacing.
 
     Returns:
         2D np.array: Binary aperture image with 1 inside squares, 0 outside.
@@ -143,6 +203,38 @@ def square_aperture_array(shape=(512, 512), square_size=1, spacing=5, grid_size=
 
     h, w = shape
 
+    if antialias:
+        # The grid of squares is separable : (sum of the rows) x (sum of the columns)
+        assert (spacing * (grid_size[0] - 1) + square_size) / dx <= h and \
+            (spacing * (grid_size[1] - 1) + square_size) / dx <= w, "Grid size exceeds image size."
+        rows = (h - 1) / 2 + (np.arange(grid_size[0]) - (grid_size[0] - 1) / 2) * (spacing / dx)
+        cols = (w - 1) / 2 + (np.arange(grid_size[1]) - (grid_size[1] - 1) / 2) * (spacing / dx)
+        return np.outer(interval_coverage(h, rows, square_size / dx),
+                        interval_coverage(w, cols, square_size / dx)).astype(np.float32)
+
+    aperture = np.zeros((h, w), dtype=np.float32)
+
+    start, square_px, spacing_px = square_array_layout(shape, square_size, spacing, grid_size, dx)
+    stamp = np.ones((square_px, square_px), dtype=np.float32)
+    stamp_grid(aperture, stamp, start, grid_size, spacing_px)
+
+    return aperture
+
+
+def square_array_layout(shape, square_size, spacing, grid_size, dx=1.0):
+    """
+    Pixel layout of square_aperture_array (without antialias), shared with the aperture expressions.
+
+    The size and spacing are rounded to whole pixels, the grid is centered by (shape - grid) // 2.
+
+    Args:
+        shape, square_size, spacing, grid_size, dx: See square_aperture_array.
+
+    Returns:
+        tuple: (row, col) of the top-left pixel of the first square, square size and spacing in pixels.
+    """
+    h, w = shape
+
     # Convert physical sizes (microns) to pixel units
     square_px = int(round(square_size / dx))
     spacing_px = int(round(spacing / dx))
@@ -155,22 +247,21 @@ def square_aperture_array(shape=(512, 512), square_size=1, spacing=5, grid_size=
         f"Try increasing image shape or reducing spacing/grid size."
     )
 
-    aperture = np.zeros((h, w), dtype=np.float32)
-
     # Center the grid
-    start_y = (h - grid_h) // 2
-    start_x = (w - grid_w) // 2
+    return ((h - grid_h) // 2, (w - grid_w) // 2), square_px, spacing_px
 
-    for i in range(grid_size[0]):  # rows
-        for j in range(grid_size[1]):  # cols
-            y = start_y + i * spacing_px
-            x = start_x + j * spacing_px
-            aperture[y:y + square_px, x:x + square_px] = 1.0
 
-    return aperture
+def square_array_model(shape, square_size, spacing, grid_size, dx=1.0):
+    """
+    Aperture expression of square_aperture_array (without antialias), in pixel coordinates, see slit_model.
+    """
+    (row, col), square_px, spacing_px = square_array_layout(shape, square_size, spacing, grid_size, dx)
+    return pixel_grid(Rectangle(square_px, square_px), (row + (square_px - 1) / 2, col + (square_px - 1) / 2),
+                      (spacing_px, spacing_px), grid_size)
 
 
-def elliptical_aperture_array(shape=(512, 512), big_diameter=10, small_diameter=5, spacing=25, grid_size=(5, 5), dx=1.0):
+def elliptical_aperture_array(shape=(512, 512), big_diameter=10, small_diameter=5, spacing=25, grid_size=(5, 5), dx=1.0,
+                              antialias=False):
     """
     Create a 2D array with a grid of elliptical apertures.
 
@@ -181,6 +272,7 @@ def elliptical_aperture_array(shape=(512, 512), big_diameter=10, small_diameter=
         spacing (float): Center-to-center distance between ellipses (microns).
         grid_size (tuple): Number of ellipses (rows, cols).
         dx (float): Sampling resolution in microns/pixel.
+        antialias (bool): Fractional coverage, with the physical (unrounded) diameters and spacing.
 
     Returns:
         2D np.array: Binary aperture image with 1 inside ellipses, 0 outside.
@@ -193,14 +285,53 @@ def elliptical_aperture_array(shape=(512, 512), big_diameter=10, small_diameter=
     h, w = shape
     aperture = np.zeros((h, w), dtype=np.float32)
 
+    if antialias:
+        assert (spacing * (grid_size[0] - 1) + big_diameter) / dx <= h and \
+            (spacing * (grid_size[1] - 1) + big_diameter) / dx <= w, "Grid size exceeds image size."
+        # same orientation as the mask below : big diameter along the columns
+        rows = h / 2 + (np.arange(grid_size[0]) - (grid_size[0] - 1) / 2) * (spacing / dx)
+        cols = w / 2 + (np.arange(grid_size[1]) - (grid_size[1] - 1) / 2) * (spacing / dx)
+        return add_coverage(aperture, "ellipse", (small_diameter, big_diameter), dx, rows, cols)
+
+    (center_y, center_x), (small_px, big_px), spacing_px = elliptical_array_layout(shape, big_diameter, small_diameter,
+                                                                                   spacing, grid_size, dx)
+    a = big_px / 2.0  # Semi-major axis
+    b = small_px / 2.0  # Semi-minor axis
+
+    # All the centers have the same sub-pixel position: one stamp, computed around the first ellipse,
+    # is copied in the bounding box of every ellipse
+    y0, x0 = int(np.ceil(center_y - b)), int(np.ceil(center_x - a))
+    yy = np.arange(y0, int(np.floor(center_y + b)) + 1)[:, np.newaxis]
+    xx = np.arange(x0, int(np.floor(center_x + a)) + 1)[np.newaxis, :]
+
+    # Ellipse equation
+    stamp = ((((xx - center_x) / a) ** 2 + ((yy - center_y) / b) ** 2) <= 1).astype(np.float32)
+    stamp_grid(aperture, stamp, (y0, x0), grid_size, spacing_px)
+
+    return aperture
+
+
+def elliptical_array_layout(shape, big_diameter, small_diameter, spacing, grid_size, dx=1.0):
+    """
+    Pixel layout of elliptical_aperture_array (without antialias), shared with the aperture expressions.
+
+    The diameters and spacing are rounded to whole pixels, the big diameter is along the columns, and the
+    grid of spacing_px * (n - 1) + big_px pixels starts at (shape - grid) / 2 on both axes.
+
+    Args:
+        shape, big_diameter, small_diameter, spacing, grid_size, dx: See elliptical_aperture_array.
+
+    Returns:
+        tuple: (row, col) of the (fractional) centre of the first ellipse, (small, big) diameters and
+            spacing in pixels.
+    """
+    h, w = shape
+
     # Convert from microns to pixels
     big_px = int(round(big_diameter / dx))
     small_px = int(round(small_diameter / dx))
     spacing_px = int(round(spacing / dx))
 
-    a = big_px / 2.0  # Semi-major axis
-    b = small_px / 2.0  # Semi-minor axis
-
     # Total grid size in pixels
     grid_h = spacing_px * (grid_size[0] - 1) + big_px
     grid_w = spacing_px * (grid_size[1] - 1) + big_px
@@ -209,23 +340,355 @@ def elliptical_aperture_array(shape=(512, 512), big_diameter=10, small_diameter=
         f"Grid size ({grid_h}x{grid_w} px) exceeds image size ({h}x{w} px)."
     )
 
-    # Start positions to center the array
+    # Start positions to center the array, then center of the first ellipse
     start_y = (h - grid_h) / 2.0
     start_x = (w - grid_w) / 2.0
+    return (start_y + big_px / 2.0, start_x + big_px / 2.0), (small_px, big_px), spacing_px
 
-    yy, xx = np.meshgrid(np.arange(h), np.arange(w), indexing='ij')
 
-    for i in range(grid_size[0]):
-        for j in range(grid_size[1]):
-            center_y = start_y + i * spacing_px + a
-            center_x = start_x + j * spacing_px + a
+def elliptical_array_model(shape, big_diameter, small_diameter, spacing, grid_size, dx=1.0):
+    """
+    Aperture expression of elliptical_aperture_array (without antialias), in pixel coordinates, see slit_model.
+    """
+    first, size_px, spacing_px = elliptical_array_layout(shape, big_diameter, small_diameter, spacing, grid_size, dx)
+    return pixel_grid(Ellipse(*size_px), first, (spacing_px, spacing_px), grid_size)
+
+
+def stamp_grid(aperture, stamp, origin, grid_size, spacing_px):
+    """
+    Write a stamp in the bounding box of every element of a regular grid, in place.
 
-            # Ellipse equation
-            mask = (((xx - center_x) / a) ** 2 + ((yy - center_y) / b) ** 2) <= 1
-            aperture[mask] = 1.0
+    The boxes must not overlap (spacing_px >= stamp size). All the boxes are written at once,
+    through a strided view (or their row and column indices when the grid is clipped), so the
+    cost is O(G * k^2) for G elements of k x k pixels, whatever the image size.
 
+    Args:
+        aperture (2D np.array): Image to write into.
+        stamp (2D np.array): Pre-rendered element, (kh, kw) pixels.
+        origin (tuple): (row, col) of the top-left pixel of the first element's box.
+        grid_size (tuple): Number of elements (rows, cols).
+        spacing_px (int): Distance between two elements, in pixels.
+
+    Returns:
+        2D np.array: aperture, with the stamps written.
+    """
+    kh, kw = stamp.shape
+    gh, gw = grid_size
+    y0, x0 = origin
+
+    if y0 >= 0 and x0 >= 0 and y0 + spacing_px * (gh - 1) + kh <= aperture.shape[0] \
+            and x0 + spacing_px * (gw - 1) + kw <= aperture.shape[1]:
+        # Every box is inside: (gh, kh, gw, kw) strided view on the boxes, one broadcast assignment
+        sy, sx = aperture.strides
+        boxes = as_strided(aperture[y0:, x0:], shape=(gh, kh, gw, kw),
+                           strides=(spacing_px * sy, sy, spacing_px * sx, sx))
+        boxes[...] = stamp[np.newaxis, :, np.newaxis, :]
+        return aperture
+
+    rows = (origin[0] + spacing_px * np.arange(grid_size[0])[:, np.newaxis] + np.arange(kh)).ravel()
+    cols = (origin[1] + spacing_px * np.arange(grid_size[1])[:, np.newaxis] + np.arange(kw)).ravel()
+
+    # Clip to the image, like slicing would
+    keep_rows = (rows >= 0) & (rows < aperture.shape[0])
+    keep_cols = (cols >= 0) & (cols < aperture.shape[1])
+    tiles = np.tile(stamp, grid_size)[np.ix_(keep_rows, keep_cols)]
+    aperture[np.ix_(rows[keep_rows], cols[keep_cols])] = tiles
     return aperture
 
+def element_stamp(size, dx=1.0, element="ellipse", antialias=False):
+    """
+    Render one aperture element, centered on the pixel (kh//2, kw//2) of an odd-sized stamp.
+
+    Args:
+        size (tuple): Element size (height, width) in physical units (diameters for an ellipse).
+        dx (float): Sampling rate (physical size per pixel).
+        element (str): "ellipse" or "rectangle".
+        antialias (bool): Fractional coverage of the edge pixels (see coverage_stamp).
+
+    Returns:
+        2D np.array: float32 stamp with 1s inside the element, 0s outside.
+    """
+    height, width = size
+    if antialias:
+        # centred coverage stamp, without its last (empty) row and column
+        stamp = coverage_stamp(element, (height, width), dx, (0.0, 0.0))
+        return stamp[:-1, :-1].astype(np.float32)
+    ry, rx = int(height / 2 / dx), int(width / 2 / dx)
+    y = (np.arange(-ry, ry + 1) * dx)[:, np.newaxis]
+    x = (np.arange(-rx, rx + 1) * dx)[np.newaxis, :]
+
+    if element == "ellipse":
+        stamp = (x / (width / 2)) ** 2 + (y / (height / 2)) ** 2 <= 1
+    elif element == "rectangle":
+        stamp = (np.abs(x) <= width / 2) & (np.abs(y) <= height / 2)
+    else:
+        raise ValueError(f"Unknown element : {element}")
+    return stamp.astype(np.float32)
+
+
+def point_list_aperture(shape, centers, stamp, dx=1.0, method="auto"):
+    """
+    Create an aperture made of identical elements at arbitrary positions.
+
+    The centres are rounded to the nearest pixel. "scatter" adds every non-zero stamp pixel of every
+    element with one bincount, O(N * k^2). "fft" scatters one delta per element and convolves the delta
+    image with the stamp by FFT, O(h * w * log(h * w)), whatever the number of elements. "auto" takes
+    the cheapest one. Overlapping elements are merged (values are clipped to 1).
+
+    Args:
+        shape (tuple): Output image size (height, width) in pixels.
+        centers (np.array): (N, 2) array of element centres (x, y) in physical units, origin at the
+            image centre (pixel (h//2, w//2)), y along the rows.
+        stamp (2D np.array): One element, centered on its pixel (kh//2, kw//2), see element_stamp.
+        dx (float): Sampling rate (physical size per pixel).
+        method (str): "auto", "scatter" or "fft".
+
+    Returns:
+        2D np.array: float32 aperture image.
+    """
+    h, w = shape
+    kh, kw = stamp.shape
+    ry, rx = kh // 2, kw // 2
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    cols = np.round(centers[:, 0] / dx).astype(np.int64) + w // 2
+    rows = np.round(centers[:, 1] / dx).astype(np.int64) + h // 2
+
+    stamp_rows, stamp_cols = np.nonzero(stamp)
+    if method == "auto":
+        # bincount of N * k^2 entries against ~3 real FFTs of the padded image
+        padded = (h + 2 * ry) * (w + 2 * rx)
+        method = "scatter" if len(rows) * len(stamp_rows) < 3 * padded * np.log2(padded) else "fft"
+
+    if method == "scatter":
+        r = (rows[:, np.newaxis] + (stamp_rows - ry)).ravel()
+        c = (cols[:, np.newaxis] + (stamp_cols - rx)).ravel()
+        values = np.broadcast_to(stamp[stamp_rows, stamp_cols], (len(rows), len(stamp_rows))).ravel()
+        inside = (r >= 0) & (r < h) & (c >= 0) & (c < w)
+        aperture = np.bincount(r[inside] * w + c[inside], weights=values[inside], minlength=h * w)
+        aperture = aperture.reshape(h, w)
+
+    elif method == "fft":
+        # Canvas padded by the stamp radius: elements across the borders are kept, and the circular
+        # wrap-around of the convolution only reaches the padding
+        H, W = h + 2 * ry, w + 2 * rx
+        r, c = rows + ry, cols + rx
+        inside = (r >= 0) & (r < H) & (c >= 0) & (c < W)
+        deltas = np.bincount(r[inside] * W + c[inside], minlength=H * W).reshape(H, W)
+        kernel = np.zeros((H, W))
+        kernel[:kh, :kw] = stamp
+        kernel = np.roll(kernel, (-ry, -rx), axis=(0, 1))   # stamp centre at the origin
+        aperture = np.fft.irfft2(np.fft.rfft2(deltas) * np.fft.rfft2(kernel), s=(H, W))
+        aperture = aperture[ry:ry + h, rx:rx + w]
+        if np.all((stamp == 0) | (stamp == 1)):
+            aperture = np.round(aperture)                   # FFT round-off
+
+    else:
+        raise ValueError(f"Unknown method : {method}")
+
+    return np.clip(aperture, 0, 1).astype(np.float32)
+
+
+def hexagonal_centers(extent, pitch):
+    """
+    Centres of a hexagonal lattice filling a rectangle.
+
+    Args:
+        extent (tuple): Size (height, width) of the rectangle, centered on the origin, in physical units.
+        pitch (float): Distance between neighbouring centres.
+
+    Returns:
+        np.array: (N, 2) array of centres (x, y).
+    """
+    height, width = extent
+    row_pitch = pitch * np.sqrt(3) / 2
+    j = np.arange(-int(height / 2 / row_pitch), int(height / 2 / row_pitch) + 1)
+    i = np.arange(-int(width / 2 / pitch) - 1, int(width / 2 / pitch) + 1)
+    J, I = np.meshgrid(j, i, indexing="ij")
+    x = (I + (J % 2) / 2) * pitch          # every other row is shifted by half a pitch
+    y = J * row_pitch
+    inside = np.abs(x) <= width / 2
+    return np.column_stack([x[inside], y[inside]])
+
+
+def random_centers(n, extent, min_distance=0.0, seed=0, max_batches=50):
+    """
+    Random centres in a rectangle, optionally with a minimum distance (Poisson-disc / dart throwing).
+
+    With min_distance, candidates are thrown by batches and checked against the accepted centres
+    through a background grid of cells of side min_distance/sqrt(2) (at most one centre per cell,
+    neighbours within 2 cells). Fewer than n centres are returned if the rectangle is full.
+
+    Args:
+        n (int): Number of centres.
+        extent (tuple): Size (height, width) of the rectangle, centered on the origin, in physical units.
+        min_distance (float): Minimum distance between two centres, 0 for a uniform distribution.
+        seed (int): Seed of the random generator.
+        max_batches (int): Number of batches of candidates before giving up.
+
+    Returns:
+        np.array: (N, 2) array of centres (x, y), N <= n.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = extent
+
+    def draw(m):
+        return np.column_stack([rng.uniform(-width / 2, width / 2, m), rng.uniform(-height / 2, height / 2, m)])
+
+    if min_distance <= 0:
+        return draw(n)
+
+    cell = min_distance / np.sqrt(2)
+    grid = np.full((int(np.ceil(height / cell)) + 4, int(np.ceil(width / cell)) + 4), -1)  # 2 cells of margin
+    offsets = np.arange(-2, 3)
+    points = np.empty((0, 2))
+
+    def neighbours(table, candidates, cy, cx):
+        # indices found in the 5x5 cells around each candidate, and their squared distance
+        index = table[cy[:, None, None] + offsets[:, None], cx[:, None, None] + offsets[None, :]].reshape(len(cy), 25)
+        reference = points if table is grid else candidates
+        if len(reference) == 0:
+            return index, np.full(index.shape, np.inf)
+        d2 = np.sum((reference[np.maximum(index, 0)] - candidates[:, np.newaxis, :]) ** 2, axis=-1)
+        return index, d2
+
+    for _ in range(max_batches):
+        missing = n - len(points)
+        if missing <= 0:
+            break
+        candidates = draw(max(2 * missing, 1000))
+        cy = ((candidates[:, 1] + height / 2) // cell).astype(int) + 2
+        cx = ((candidates[:, 0] + width / 2) // cell).astype(int) + 2
+
+        # against the accepted centres
+        index, d2 = neighbours(grid, candidates, cy, cx)
+        keep = ~np.any((index >= 0) & (d2 < min_distance ** 2), axis=1)
+        candidates, cy, cx = candidates[keep], cy[keep], cx[keep]
+
+        # between candidates of the batch : one per cell, then the first one wins
+        _, first = np.unique(cy * grid.shape[1] + cx, return_index=True)
+        first = np.sort(first)
+        candidates, cy, cx = candidates[first], cy[first], cx[first]
+        table = np.full(grid.shape, -1)
+        table[cy, cx] = np.arange(len(cy))
+        index, d2 = neighbours(table, candidates, cy, cx)
+        keep = ~np.any((index >= 0) & (index < np.arange(len(cy))[:, np.newaxis]) & (d2 < min_distance ** 2), axis=1)
+        candidates, cy, cx = candidates[keep][:missing], cy[keep][:missing], cx[keep][:missing]
+
+        grid[cy, cx] = len(points) + np.arange(len(cy))
+        points = np.vstack([points, candidates])
+
+    return points
+
+
+
+# Sub-pixel positions of the anti-aliased elements are rounded to 1/SUBPIXEL_PHASES pixel, so that
+# the coverage stamps can be cached (at most SUBPIXEL_PHASES^2 stamps per element shape)
+SUBPIXEL_PHASES = 16
+
+
+def interval_coverage(n, centers, length):
+    """
+    Exact fraction of each pixel of a line covered by a set of intervals.
+
+    Pixel i covers [i - 0.5, i + 0.5]. Overlapping intervals are merged (values clipped to 1).
+
+    Args:
+        n (int): Number of pixels.
+        centers (list): Interval centres, in (fractional) pixels.
+        length (float): Interval length, in pixels.
+
+    Returns:
+        1D np.array: Coverage in [0, 1] of each pixel.
+    """
+    i = np.arange(n)[np.newaxis, :]
+    centers = np.asarray(centers, dtype=np.float64)[:, np.newaxis]
+    overlap = np.minimum(i + 0.5, centers + length / 2) - np.maximum(i - 0.5, centers - length / 2)
+    return np.clip(np.sum(np.clip(overlap, 0, 1), axis=0), 0, 1)
+
+
+@lru_cache(maxsize=256)
+def coverage_stamp(element, size, dx, phase, supersample=8):
+    """
+    Fraction of each pixel covered by one element (anti-aliased stamp), cached.
+
+    The element is centered on (r + phase) in both directions, r = ceil(radius in pixels): the stamp has
+    2r + 2 pixels along each axis. A rectangle is covered exactly (separable interval overlaps). An ellipse
+    is supersampled on supersample^2 points, only on the pixels its edge can cross: the normalized radius
+    sqrt((x/a)^2 + (y/b)^2) changes by at most d / min(a, b) over a distance d, so the pixels whose centre
+    is further than a half diagonal from the edge are fully inside or outside.
+
+    Args:
+        element (str): "ellipse" or "rectangle".
+        size (tuple): Element size (height, width) in physical units (diameters for an ellipse).
+        dx (float): Sampling rate (physical size per pixel).
+        phase (tuple): Sub-pixel position (row, col) of the centre, in [0, 1).
+        supersample (int): Samples per pixel and per axis on the edge of an ellipse.
+
+    Returns:
+        2D np.array: Read-only float64 coverage stamp, in [0, 1].
+    """
+    ry, rx = size[0] / 2 / dx, size[1] / 2 / dx     # radii in pixels
+    ky, kx = int(np.ceil(ry)), int(np.ceil(rx))
+    cy, cx = ky + phase[0], kx + phase[1]
+
+    if element == "rectangle":
+        stamp = np.outer(interval_coverage(2 * ky + 2, [cy], 2 * ry), interval_coverage(2 * kx + 2, [cx], 2 * rx))
+
+    elif element == "ellipse":
+        y = (np.arange(2 * ky + 2) - cy)[:, np.newaxis]
+        x = (np.arange(2 * kx + 2) - cx)[np.newaxis, :]
+        radius = np.sqrt((x / rx) ** 2 + (y / ry) ** 2)
+        stamp = (radius <= 1).astype(np.float64)
+
+        edge_rows, edge_cols = np.nonzero(np.abs(radius - 1) <= np.sqrt(0.5) / min(ry, rx))
+        offsets = (np.arange(supersample) + 0.5) / supersample - 0.5
+        sy = (edge_rows - cy)[:, np.newaxis, np.newaxis] + offsets[:, np.newaxis]
+        sx = (edge_cols - cx)[:, np.newaxis, np.newaxis] + offsets[np.newaxis, :]
+        stamp[edge_rows, edge_cols] = np.mean((sx / rx) ** 2 + (sy / ry) ** 2 <= 1, axis=(1, 2))
+
+    else:
+        raise ValueError(f"Unknown element : {element}")
+
+    stamp.setflags(write=False)     # shared by the cache
+    return stamp
+
+
+def add_coverage(aperture, element, size, dx, rows, cols):
+    """
+    Add anti-aliased elements on a grid of (fractional) pixel centres, in place.
+
+    Every centre is split in an integer pixel and a sub-pixel phase rounded to 1/SUBPIXEL_PHASES,
+    the cached coverage stamp of that phase is added in the element's bounding box (clipped to the
+    image). Overlapping elements are merged (values clipped to 1).
+
+    Args:
+        aperture (2D np.array): Image to add into.
+        element (str): "ellipse" or "rectangle".
+        size (tuple): Element size (height, width) in physical units.
+        dx (float): Sampling rate (physical size per pixel).
+        rows (list): Row of the centre of each grid row, in (fractional) pixels.
+        cols (list): Column of the centre of each grid column, in (fractional) pixels.
+
+    Returns:
+        2D np.array: aperture, with the elements added.
+    """
+    def split(centers):
+        steps = np.round(np.asarray(centers, dtype=np.float64) * SUBPIXEL_PHASES).astype(np.int64)
+        return steps // SUBPIXEL_PHASES, (steps % SUBPIXEL_PHASES) / SUBPIXEL_PHASES
+
+    h, w = aperture.shape
+    ky, kx = int(np.ceil(size[0] / 2 / dx)), int(np.ceil(size[1] / 2 / dx))
+    for row, phase_y in zip(*split(rows)):
+        for col, phase_x in zip(*split(cols)):
+            stamp = coverage_stamp(element, tuple(size), dx, (phase_y, phase_x))
+            y0, x0 = row - ky, col - kx
+            top, left = max(y0, 0), max(x0, 0)
+            bottom, right = min(y0 + stamp.shape[0], h), min(x0 + stamp.shape[1], w)
+            if top < bottom and left < right:
+                aperture[top:bottom, left:right] += stamp[top - y0:bottom - y0, left - x0:right - x0]
+    return np.clip(aperture, 0, 1, out=aperture)
+
+
 def zero_pad(U0, new_shape):
     """
     Pads a 2D array U0 with zeros to match new_shape.
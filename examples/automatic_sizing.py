@@ -1,4 +1,6 @@
 import numpy as np
+from binary_mask import BinaryMask
+from fields import SeparableField
 
 
 def zero_pad(U0, new_shape):
@@ -12,6 +14,8 @@ def zero_pad(U0, new_shape):
     Returns:
         3D np.array: Zero-padded array with U0[0] centered, shape (1, new_H, new_W).
     """
+    if isinstance(U0, (BinaryMask, SeparableField)):
+        return U0.zero_pad(new_shape)     # stays packed / lazy
     assert U0.ndim == 3 and U0.shape[0] == 1, "Input must have shape (1, H, W)"
     
     old_h, old_w = U0.shape[1:]
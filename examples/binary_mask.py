@@ -0,0 +1,195 @@
+import numpy as np
+
+from fields import SeparableField
+
+
+class BinaryMask:
+    """
+    Binary aperture stored with one bit per pixel.
+
+    The pixels of each row (last axis) are packed with np.packbits, and every row is padded with zeros
+    to a whole number of 64-bit words, so that the boolean composition (|, &, -, ^, ~) runs on uint64
+    words: a 16384 x 16384 mask takes 32 MB instead of 2 GB in float64.
+
+    The mask is only unpacked where values are needed: np.asarray(mask, dtype) for the display,
+    transmit(source, mask) at the propagator boundary (the complex field is the product, no complex
+    copy of the mask is made).
+    """
+
+    def __init__(self, packed, shape):
+        """
+        Args:
+            packed (np.array): uint8 array of shape (*shape[:-1], n_words * 8), bits of each row
+                               (big endian, np.packbits order), padding bits at 0.
+            shape (tuple): Shape of the unpacked mask.
+        """
+        self.packed = packed
+        self.shape = tuple(shape)
+
+    @classmethod
+    def from_array(cls, array):
+        """
+        Pack an array, every non-zero pixel is inside the aperture.
+
+        Args:
+            array (np.array): Aperture (any dtype, any number of dimensions).
+
+        Returns:
+            BinaryMask
+        """
+        array = np.asarray(array)
+        width = array.shape[-1]
+        packed = np.packbits(array != 0, axis=-1)
+        return cls(cls._pad_words(packed, width), array.shape)
+
+    @classmethod
+    def zeros(cls, shape):
+        """Empty (opaque) mask."""
+        return cls(np.zeros((*shape[:-1], cls._row_bytes(shape[-1])), dtype=np.uint8), shape)
+
+    @staticmethod
+    def is_binary(array):
+        """True if the array only holds 0s and 1s, i.e. can be packed without loss."""
+        array = np.asarray(array)
+        return not np.iscomplexobj(array) and bool(np.all((array == 0) | (array == 1)))
+
+    @staticmethod
+    def _row_bytes(width):
+        return 8 * ((width + 63) // 64)
+
+    @classmethod
+    def _pad_words(cls, packed, width):
+        pad = cls._row_bytes(width) - packed.shape[-1]
+        if pad:
+            packed = np.concatenate([packed, np.zeros((*packed.shape[:-1], pad), dtype=np.uint8)], axis=-1)
+        return np.ascontiguousarray(packed)
+
+    @property
+    def words(self):
+        """uint64 view of the packed rows."""
+        return self.packed.view(np.uint64)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        return self.packed.nbytes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def unpack(self, dtype=bool):
+        """
+        Unpacked mask.
+
+        Args:
+            dtype (np.dtype): Output type, bool is the cheapest (one byte per pixel).
+
+        Returns:
+            np.array: Mask of shape self.shape, 1 (True) inside the aperture.
+        """
+        mask = np.unpackbits(self.packed, axis=-1, count=self.shape[-1]).view(bool)
+        return mask if dtype == bool else mask.astype(dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.unpack(np.float64 if dtype is None else dtype)
+
+    def count(self):
+        """Number of pixels inside the aperture."""
+        return int(np.unpackbits(self.packed).sum(dtype=np.int64)) if self.packed.size else 0
+
+    def _other_words(self, other):
+        assert isinstance(other, BinaryMask), "Masks can only be composed with masks"
+        assert self.shape == other.shape, f"Unmatched mask shape. {self.shape}, {other.shape}."
+        return other.words
+
+    def __or__(self, other):
+        """Union."""
+        return BinaryMask((self.words | self._other_words(other)).view(np.uint8), self.shape)
+
+    def __and__(self, other):
+        """Intersection."""
+        return BinaryMask((self.words & self._other_words(other)).view(np.uint8), self.shape)
+
+    def __sub__(self, other):
+        """Subtraction : pixels of self that are not in other."""
+        return BinaryMask((self.words & ~self._other_words(other)).view(np.uint8), self.shape)
+
+    def __xor__(self, other):
+        """Symmetric difference."""
+        return BinaryMask((self.words ^ self._other_words(other)).view(np.uint8), self.shape)
+
+    def __invert__(self):
+        """Complement (the padding bits stay at 0)."""
+        row = np.zeros(self.packed.shape[-1], dtype=np.uint8)
+        row[:] = np.packbits(np.arange(row.size * 8) < self.shape[-1])
+        return BinaryMask((~self.words & row.view(np.uint64)).view(np.uint8), self.shape)
+
+    def __eq__(self, other):
+        if not isinstance(other, BinaryMask):
+            return NotImplemented
+        return self.shape == other.shape and np.array_equal(self.packed, other.packed)
+
+    def zero_pad(self, new_shape, block_rows=1024):
+        """
+        Pad the last two axes with zeros, the mask centered (same placement as automatic_sizing.zero_pad).
+
+        The rows are shifted by whole bytes when possible, else unpacked and re-packed by blocks of
+        block_rows rows, so that no full-size unpacked array is allocated.
+
+        Args:
+            new_shape (tuple): New (height, width).
+            block_rows (int): Rows unpacked at once when the shift is not a multiple of 8 pixels.
+
+        Returns:
+            BinaryMask
+        """
+        old_h, old_w = self.shape[-2:]
+        new_h, new_w = new_shape
+        start_y = (new_h - old_h) // 2
+        start_x = (new_w - old_w) // 2
+        out = BinaryMask.zeros((*self.shape[:-2], new_h, new_w))
+
+        if start_x % 8 == 0:
+            n_bytes = (old_w + 7) // 8
+            out.packed[..., start_y:start_y + old_h, start_x // 8:start_x // 8 + n_bytes] = self.packed[..., :n_bytes]
+            return out
+
+        for y in range(0, old_h, block_rows):
+            rows = np.unpackbits(self.packed[..., y:y + block_rows, :], axis=-1, count=old_w)
+            padded = np.zeros((*rows.shape[:-1], new_w), dtype=np.uint8)
+            padded[..., start_x:start_x + old_w] = rows
+            packed = np.packbits(padded, axis=-1)
+            out.packed[..., start_y + y:start_y + y + rows.shape[-2], :packed.shape[-1]] = packed
+        return out
+
+    def __repr__(self):
+        return f"BinaryMask(shape={self.shape}, nbytes={self.nbytes})"
+
+
+def transmit(source, aperture):
+    """
+    Field right after the aperture : source * aperture.
+
+    A BinaryMask is unpacked as bool here (one byte per pixel), at the propagator boundary, instead of
+    being stored as a float or complex array. A lazy source is applied to the aperture in the output
+    buffer (SeparableField.multiply), without a full-size copy of the source.
+
+    Args:
+        source (np.array or SeparableField): Incident field.
+        aperture (np.array or BinaryMask): Transmittance of the aperture.
+
+    Returns:
+        np.array: Transmitted field.
+    """
+    if isinstance(source, SeparableField):
+        return source.multiply(aperture.unpack() if isinstance(aperture, BinaryMask) else aperture)
+    if isinstance(aperture, BinaryMask):
+        return np.where(aperture.unpack(), source, 0)
+    return source * aperture
@@ -0,0 +1,2 @@
+# 4f_test.py is a script (it reads an image from the working directory), not a test module
+collect_ignore = ["4f_test.py"]
@@ -110,7 +110,90 @@ def angular_spectrum(U0, wavelength, z, dx):
 
     return Uz
 
-def sweep(U0, wavelength, dx, z_start, z_end, step, callback = None):
+def fresnel(U0, wavelength, z, dx):
+    """
+    Fresnel propagation over z (z may be negative), with the cheapest valid sampling.
+
+    Near field (|z| <= N dx^2 / wavelength) : angular spectrum, same grid. Far field : single FFT Fresnel
+    transform, output pixel wavelength |z| / (N dx).
+
+    Args:
+        U0: Input complex field, (..., N, N) numpy array.
+        wavelength: Light wavelength (µm).
+        z: Propagation distance (µm).
+        dx: Input pixel size (µm).
+
+    Returns:
+        Uz: Field at z, centered on the pixel N//2.
+        dx_out: Signed output pixel size, negative when the coordinates decrease along the axes.
+    """
+    N = max(U0.shape[-2:])
+    if abs(z) <= N * dx**2 / wavelength:
+        return angular_spectrum(U0, wavelength, z, dx), dx
+
+    k = 2 * np.pi / wavelength
+    dx_out = wavelength * z / (N * dx)
+    x = (np.arange(N) - N//2) * dx
+    u = (np.arange(N) - N//2) * dx_out
+    q_in = np.exp(1j * k * x**2 / (2 * z))
+    q_out = np.exp(1j * k * u**2 / (2 * z))
+
+    # sum of U0(x) exp(ik x^2 / 2z) exp(-2i pi x u / (wavelength z)) dx^2, u = dx_out * (n - N//2)
+    U1 = np.complex128(U0) * q_in[:, np.newaxis] * q_in[np.newaxis, :]
+    spectrum = np.fft.fftshift(np.fft.fft2(np.fft.ifftshift(U1, axes=(-2, -1))), axes=(-2, -1))
+    Uz = np.exp(1j * k * z) / (1j * wavelength * z) * dx**2 * spectrum * q_out[:, np.newaxis] * q_out[np.newaxis, :]
+    return Uz, dx_out
+
+def lens_propagation(U0, wavelength, focal_length, z, dx):
+    """
+    Field at distance z after a thin lens of focal length f, the lens being handled analytically.
+
+    The quadratic phase of the lens is never sampled. Lens + propagation over z is a Fresnel propagation
+    of the field without lens over the effective distance z_eff = z / M, M = 1 - z / f, magnified by M :
+
+        U(x) = 1/M exp(ik(z - z_eff)) exp(-ik x^2 / (2 f M)) U_eff(x / M)
+
+    and a scaled Fourier transform in the focal plane (M = 0), with pixel wavelength f / (N dx). The grid
+    only has to sample the field in front of the lens (the aperture), whatever the focal length.
+
+    Args:
+        U0: Complex field right before the lens, (..., N, N) numpy array.
+        wavelength: Light wavelength (µm).
+        focal_length: Focal length (µm), negative for a diverging lens.
+        z: Propagation distance after the lens (µm).
+        dx: Input pixel size (µm).
+
+    Returns:
+        Uz: Field at z, centered on the pixel N//2.
+        dx_out: Output pixel size (µm).
+    """
+    N = max(U0.shape[-2:])
+    k = 2 * np.pi / wavelength
+    M = 1 - z / focal_length
+
+    if abs(M) < 1e-9:
+        # focal plane : U(x) = exp(ikf) / (i wavelength f) exp(ik x^2 / 2f) FT[U0](x / (wavelength f))
+        dx_signed = wavelength * z / (N * dx)
+        u = (np.arange(N) - N//2) * dx_signed
+        q_out = np.exp(1j * k * u**2 / (2 * z))
+        spectrum = np.fft.fftshift(np.fft.fft2(np.fft.ifftshift(np.complex128(U0), axes=(-2, -1))), axes=(-2, -1))
+        Uz = np.exp(1j * k * z) / (1j * wavelength * z) * dx**2 * spectrum * q_out[:, np.newaxis] * q_out[np.newaxis, :]
+    else:
+        z_eff = z / M
+        U_eff, dx_eff = fresnel(U0, wavelength, z_eff, dx)
+        u = (np.arange(N) - N//2) * dx_eff
+        q_out = np.exp(-1j * k * M * u**2 / (2 * focal_length))
+        Uz = np.exp(1j * k * (z - z_eff)) / M * U_eff * q_out[:, np.newaxis] * q_out[np.newaxis, :]
+        dx_signed = M * dx_eff
+
+    if dx_signed < 0:
+        # coordinates decreasing along the axes (image inverted) : back to increasing, centered on N//2
+        Uz = np.flip(Uz, axis=(-2, -1))
+        if N % 2 == 0:
+            Uz = np.roll(Uz, 1, axis=(-2, -1))
+    return Uz, abs(dx_signed)
+
+def sweep(U0, wavelength, dx, z_start, z_end, step, callback = None, out = None, plane_callback = None):
     N = max(U0.shape)
     z_limit = N * dx**2 / wavelength
     Z = np.arange(z_start, z_end, step)
@@ -121,7 +204,9 @@ def sweep(U0, wavelength, dx, z_start, z_end, step, callback = None):
     assert l < 101, "Step too small, please increase it"
 
     shape = (l,h,w)
-    diffraction_patterns = np.zeros(shape, dtype=np.complex128)
+    # out : preallocated (l, h, w) volume, e.g. a volume_providers.MemmapVolume for sweeps larger than the RAM
+    # plane_callback(i, sampling, z) : plane i has been written to out (streaming to the viewer)
+    diffraction_patterns = np.zeros(shape, dtype=np.complex128) if out is None else out
     samplings = np.zeros((l))
 
     base_dx = 1.0 if Z[0] < z_limit else wavelength * abs(Z[0]) / (N * dx)
@@ -136,12 +221,14 @@ def sweep(U0, wavelength, dx, z_start, z_end, step, callback = None):
             diffraction_pattern = smart_resample_and_crop(diffraction_pattern, samplings[i], base_dx, (h,w))
             samplings[i] = base_dx
             diffraction_patterns[i] = diffraction_pattern
+        if plane_callback:
+            plane_callback(i, samplings[i], z)
         if callback:
             callback((int(i+1)/l*100))
 
     return diffraction_patterns, samplings, Z
 
-def sweep_w(U0, z, dx, w_start, w_end, step, callback = None):
+def sweep_w(U0, z, dx, w_start, w_end, step, callback = None, out = None, plane_callback = None):
     N = max(U0.shape)
     W = np.arange(w_start, w_end, step)
 
@@ -149,7 +236,9 @@ def sweep_w(U0, z, dx, w_start, w_end, step, callback = None):
     l = len(W)
 
     shape = (l,h,w)
-    diffraction_patterns = np.zeros(shape, dtype=np.complex128)
+    # out : preallocated (l, h, w) volume, e.g. a volume_providers.MemmapVolume for sweeps larger than the RAM
+    # plane_callback(i, sampling, wavelength) : plane i has been written to out (streaming to the viewer)
+    diffraction_patterns = np.zeros(shape, dtype=np.complex128) if out is None else out
     samplings = np.zeros((l))
 
 
@@ -167,12 +256,115 @@ def sweep_w(U0, z, dx, w_start, w_end, step, callback = None):
             diffraction_pattern = smart_resample_and_crop(diffraction_pattern, samplings[i], base_dx, (h,w))
             samplings[i] = base_dx
             diffraction_patterns[i] = diffraction_pattern
+        if plane_callback:
+            plane_callback(i, samplings[i], wavelength)
         if callback:
             callback(int((i+1)/l*100))
 
     return diffraction_patterns, samplings, W
 
+def meridional_plane(U0, wavelength, dx, z_start, z_end, step, axis = "x", index = None, callback = None):
+    """
+    Intensity in the meridional plane (xz or yz) of a field, without computing the transverse planes.
+
+    The field on one output row is, with the angular spectrum A and transfer function H of angular_spectrum :
+
+        U(y0, x, z) = IFFT_x[ sum_fy A(fx, fy) H(fx, fy, z) exp(2i pi fy y0) ]
+
+    A is computed once and weighted by exp(2i pi fy y0), then each plane is a sum over fy and a 1D inverse
+    FFT : O(N^2) per distance instead of the O(N^2 log N) 2D inverse FFT of a sweep, and only the (l, N)
+    intensity is stored. Same grid as the input (angular spectrum), the field has to stay inside the window.
+
+    Args:
+        U0: Input complex field, (N, N) or (1, N, N) numpy array.
+        wavelength: Light wavelength (µm).
+        dx: Input pixel size (µm).
+        z_start, z_end, step: Propagation distances, np.arange(z_start, z_end, step) (µm).
+        axis: "x" for the xz plane (one row), "y" for the yz plane (one column).
+        index: Row (column for "y") of the plane, the center N//2 if None.
+        callback: Progress callback, percentage.
+
+    Returns:
+        intensity: (l, N) intensity, one line per distance.
+        Z: Distances.
+    """
+    U0 = np.complex128(U0).reshape(U0.shape[-2:])
+    if axis == "y":
+        U0 = U0.T
+    h, w = U0.shape
+    index = h // 2 if index is None else index
+    Z = np.arange(z_start, z_end, step)
+
+    fy = np.fft.fftfreq(h, d=dx)[:, np.newaxis]
+    fx = np.fft.fftfreq(w, d=dx)[np.newaxis, :]
+    kz = 2 * np.pi * np.sqrt(np.maximum(0, 1 / wavelength**2 - fx**2 - fy**2))
+    # row selection and 1 / h of the inverse FFT along y, applied once to the spectrum
+    spectrum = np.fft.fft2(U0) * (np.exp(2j * np.pi * fy * index * dx) / h)
+
+    # the distances are regular : H(z + step) = H(z) exp(i kz step), one complex product per plane instead
+    # of a complex exponential, re-seeded exactly every reseed planes to bound the rounding drift
+    reseed = 64
+    rotation = np.exp(1j * kz * step)
+    intensity = np.empty((len(Z), w))
+    for i in range(len(Z)):
+        if i % reseed == 0:
+            propagated = spectrum * np.exp(1j * kz * Z[i])
+        else:
+            propagated *= rotation
+        line = np.fft.ifft(propagated.sum(axis=0))
+        intensity[i] = line.real**2 + line.imag**2
+        if callback:
+            callback(int((i+1)/len(Z)*100))
+
+    return intensity, Z
+
+def hermitian_fft2(U0, shift=False):
+    """
+    2D FFT of a real field, computed on half of the spectrum.
+
+    The spectrum of a real field is hermitian, F(-k) = conj(F(k)): only the
+    columns 0 .. w//2 are computed with rfft2, the others are filled by symmetry
+    in place, from reversed views of the half spectrum (no temporary copy).
+    With shift, the blocks are written at their fftshift position, so that no
+    shifted copy of the full spectrum is made either.
+
+    Args:
+        U0: Real input field, (..., h, w) numpy array.
+        shift: Return the spectrum shifted (np.fft.fftshift on the last two axes).
+
+    Returns:
+        Spectrum, identical to np.fft.fft2(U0) (np.fft.fftshift of it with shift).
+    """
+    h, w = U0.shape[-2:]
+    half = np.fft.rfft2(U0)
+    spectrum = np.empty(U0.shape, dtype=half.dtype)
+    sy, sx = (h//2, w//2) if shift else (0, 0)
+
+    def put(block, row, col, conjugate=False):
+        # block of the unshifted spectrum at (row, col), split where the shift wraps it around
+        bh, bw = block.shape[-2:]
+        r0, c0 = (row + sy) % h, (col + sx) % w
+        for rs, re in ((0, min(bh, h - r0)), (min(bh, h - r0), bh)):
+            for cs, ce in ((0, min(bw, w - c0)), (min(bw, w - c0), bw)):
+                if rs < re and cs < ce:
+                    r, c = (r0 + rs) % h, (c0 + cs) % w
+                    out = spectrum[..., r:r + re - rs, c:c + ce - cs]
+                    if conjugate:
+                        np.conjugate(block[..., rs:re, cs:ce], out=out)
+                    else:
+                        out[...] = block[..., rs:re, cs:ce]
+
+    put(half, 0, 0)
+    # column c > w//2 is the mirror of column w - c, row r of row -r mod h (row 0 stays row 0)
+    mirror = slice((w - 1)//2, 0, -1)
+    put(half[..., :1, mirror], 0, w//2 + 1, conjugate=True)
+    put(half[..., :0:-1, mirror], 1, w//2 + 1, conjugate=True)
+    return spectrum
+
 def fraunhofer(source):
+    if np.isrealobj(source):
+        # binary DOEs (+-1) and amplitude masks : half spectrum, written shifted
+        return hermitian_fft2(source, shift=True)
     return np.fft.fftshift(np.fft.fft2(source))
 
 def ft_1(source):
@@ -0,0 +1,428 @@
+import threading
+from collections import OrderedDict
+from math import gcd
+
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from volume_providers import VolumeProvider
+
+
+DISPLAY_MODES = ["Intensity", "Amplitude", "Log-Amplitude", "Phase"]
+
+
+def display_transform(data, mode):
+    """
+    Real image shown for a (complex) field.
+
+    Args:
+        data (np.array): Field, any shape.
+        mode (str): One of DISPLAY_MODES, amplitude for any other value.
+
+    Returns:
+        np.array: float32 image, same shape as data.
+    """
+    if mode == "Phase":
+        return np.angle(data).astype(np.float32, copy=False)
+    image = np.abs(data).astype(np.float32, copy=False)
+    if mode == "Intensity":
+        np.square(image, out=image)
+    elif mode == "Log-Amplitude":
+        np.log1p(image, out=image)  # log(1 + amplitude)
+    return image
+
+
+def volume_slice(volume, index):
+    """
+    Slice index of a (l, h, w) volume : np.array, VolumeProvider (read or computed on demand), or lazy
+    field with a leading axis of size 1.
+    """
+    if isinstance(volume, (np.ndarray, VolumeProvider)):
+        return volume[index]
+    return np.asarray(volume)[index]
+
+
+def subsample(array, max_samples=2**15):
+    """
+    Regular subsample of at most max_samples pixels of an array, as a 1D view when possible.
+
+    The step along the flattened array is chosen prime with the row length, so that the samples do not
+    fall on the same few columns of every row.
+
+    Args:
+        array (np.array): Any shape.
+        max_samples (int): Maximum number of samples.
+
+    Returns:
+        np.array: 1D samples.
+    """
+    flat = np.asarray(array).reshape(-1)
+    if flat.size <= max_samples:
+        return flat
+    step = -(-flat.size // max_samples)
+    width = array.shape[-1]
+    while gcd(step, width) != 1:
+        step += 1
+    return flat[step // 2::step]
+
+
+def estimate_levels(image, percentiles=(1, 99.98), max_samples=2**15):
+    """
+    Percentiles of an image estimated on a regular subsample (see subsample).
+
+    np.percentile partially sorts the whole image, which takes seconds on a large sweep; on the subsample
+    the cost stays below a millisecond whatever the matrix size, which is enough for display levels.
+
+    Args:
+        image (np.array): Real image, any shape.
+        percentiles (tuple): Percentiles, in [0, 100].
+        max_samples (int): Size of the subsample.
+
+    Returns:
+        tuple: One float per percentile.
+    """
+    return tuple(float(v) for v in np.percentile(subsample(image, max_samples), percentiles))
+
+
+def field_levels(field, percentiles=(1, 99.98), max_samples=2**15):
+    """
+    Display levels of a field for every display mode, from one subsample of the field.
+
+    The display transforms are pointwise, so these are the levels estimate_levels finds on the display
+    image of each mode: computed while the planes of a sweep are produced, they are known before the
+    slices are displayed.
+
+    Args:
+        field (np.array): (h, w) field.
+        percentiles (tuple): Percentiles, in [0, 100].
+        max_samples (int): Size of the subsample.
+
+    Returns:
+        dict: mode -> levels.
+    """
+    samples = subsample(field, max_samples)
+    return {mode: estimate_levels(display_transform(samples, mode), percentiles, max_samples) for mode in DISPLAY_MODES}
+
+
+def build_pyramid(image, reduction="max", min_size=512):
+    """
+    Level-of-detail pyramid of an image : each level is the previous one pooled by 2 x 2 blocks.
+
+    Level k has pixels of 2**k x 2**k image pixels (odd sizes are padded with the edge values), the last
+    level is the first one whose largest side is at most min_size. Max pooling keeps narrow bright
+    features (diffraction orders, focal spots) visible when zoomed out, mean pooling suits smooth maps
+    (phase).
+
+    Args:
+        image (np.array): (h, w) image.
+        reduction (str): "max" or "mean".
+        min_size (int): Largest side of the last level.
+
+    Returns:
+        list: Levels, level 0 is image itself.
+    """
+    pyramid = [image]
+    while max(pyramid[-1].shape) > min_size:
+        level = pyramid[-1]
+        h, w = level.shape
+        if h % 2 or w % 2:
+            level = np.pad(level, ((0, h % 2), (0, w % 2)), mode="edge")
+        # the 4 pixels of every block as strided views : elementwise ufuncs, much faster than a reduction
+        # over the axes of a (h/2, 2, w/2, 2) reshape
+        a, b, c, d = level[0::2, 0::2], level[0::2, 1::2], level[1::2, 0::2], level[1::2, 1::2]
+        if reduction == "max":
+            pooled = np.maximum(a, b)
+            np.maximum(pooled, np.maximum(c, d), out=pooled)
+        else:
+            pooled = a + b
+            pooled += c
+            pooled += d
+            pooled *= 0.25
+        pyramid.append(pooled)
+    return pyramid
+
+
+def compact_buffer(image, value_range):
+    """
+    Smallest display buffer holding an image without visible loss.
+
+    uint8 when the values are integers in [0, 255] (binary apertures and masks, exact), float16 when they
+    fit in its range (3 significant digits, more than a 8-bit screen shows, in the same unit as the image
+    so that levels and histograms are unchanged), float32 otherwise.
+
+    Args:
+        image (np.array): float32 image.
+        value_range (tuple): (min, max) of the image.
+
+    Returns:
+        np.array: Buffer, same shape as image.
+    """
+    low, high = value_range
+    if low >= 0 and high <= 255:
+        # integer test on a subsample first : most fields are not, and the full test takes two passes
+        samples = subsample(image)
+        if np.array_equal(samples.astype(np.uint8), samples):
+            buffer = image.astype(np.uint8)
+            if np.array_equal(buffer, image):
+                return buffer
+    if max(abs(low), abs(high)) < float(np.finfo(np.float16).max):
+        return image.astype(np.float16)
+    return image
+
+
+def bilinear_weights(shape, rows, cols):
+    """
+    Neighbours and weights of a bilinear interpolation at fractional positions.
+
+    Args:
+        shape (tuple): (h, w) of the image.
+        rows (np.array), cols (np.array): (n,) positions, inside [0, h - 1] x [0, w - 1].
+
+    Returns:
+        tuple: (4, n) neighbour rows, (4, n) neighbour columns, (4, n) weights.
+    """
+    h, w = shape
+    row0 = np.clip(np.floor(rows).astype(np.intp), 0, h - 1)
+    col0 = np.clip(np.floor(cols).astype(np.intp), 0, w - 1)
+    row1 = np.minimum(row0 + 1, h - 1)
+    col1 = np.minimum(col0 + 1, w - 1)
+    fr = rows - row0
+    fc = cols - col0
+    neighbour_rows = np.stack([row0, row0, row1, row1])
+    neighbour_cols = np.stack([col0, col1, col0, col1])
+    weights = np.stack([(1 - fr) * (1 - fc), (1 - fr) * fc, fr * (1 - fc), fr * fc])
+    return neighbour_rows, neighbour_cols, weights
+
+
+def sample_bilinear(image, rows, cols):
+    """
+    Bilinear interpolation of an image at fractional positions, like map_coordinates(order=1) but for any
+    dtype (float16 buffers) and computed on the 4 neighbours of the samples only.
+
+    Args:
+        image (np.array): (h, w) image.
+        rows (np.array), cols (np.array): (n,) positions, inside [0, h - 1] x [0, w - 1].
+
+    Returns:
+        np.array: float64 samples.
+    """
+    neighbour_rows, neighbour_cols, weights = bilinear_weights(image.shape, rows, cols)
+    return (image[neighbour_rows, neighbour_cols] * weights).sum(axis=0)
+
+
+def profile_stack(volume, rows, cols, mode):
+    """
+    Display values of every slice of a volume along the same samples (kymograph of a line profile).
+
+    Only the 4 neighbours of the samples are read in each slice (VolumeProvider.gather, so that a volume on
+    disk is not read slice by slice), and the display transform and the interpolation run once on the
+    (l, 4, n) stack instead of once per slice.
+
+    Args:
+        volume (np.array or VolumeProvider): (l, h, w) field.
+        rows (np.array), cols (np.array): (n,) positions, see sample_bilinear.
+        mode (str): Display mode, see display_transform.
+
+    Returns:
+        np.array: (l, n) profiles.
+    """
+    neighbour_rows, neighbour_cols, weights = bilinear_weights(volume.shape[-2:], rows, cols)
+    if isinstance(volume, np.ndarray):
+        neighbours = volume[:, neighbour_rows, neighbour_cols]
+    elif isinstance(volume, VolumeProvider):
+        neighbours = volume.gather(neighbour_rows, neighbour_cols)
+    else:
+        neighbours = np.stack([np.asarray(volume_slice(volume, index))[neighbour_rows, neighbour_cols]
+                               for index in range(len(volume))])
+    return (display_transform(neighbours, mode) * weights).sum(axis=1)
+
+
+class DisplaySlice:
+    """Display image of one slice, with its pyramid and its auto levels."""
+
+    def __init__(self, image, levels, value_range, pyramid=None):
+        """
+        Args:
+            image (np.array): (h, w) display buffer (compact_buffer).
+            levels (tuple): (low, high) percentile levels (1%, 99.98%).
+            value_range (tuple): (min, max) of the image.
+            pyramid (list): Levels of detail (build_pyramid), [image] if None.
+        """
+        self.image = image
+        self.levels = levels
+        self.value_range = value_range
+        self.pyramid = pyramid if pyramid is not None else [image]
+
+    @property
+    def nbytes(self):
+        return sum(level.nbytes for level in self.pyramid)
+
+
+def compute_display_slice(volume, index, mode, levels=None):
+    """
+    Display image, pyramid and levels of one slice of a volume.
+
+    The levels are computed on the float32 image, then every level of the pyramid is converted once to a
+    compact buffer: the full precision field stays in the volume, the display only holds 8 or 16 bits.
+
+    Args:
+        volume (np.array or VolumeProvider): (l, h, w) field.
+        index (int): Slice index.
+        mode (str): Display mode, see display_transform.
+        levels (dict): Precomputed levels of the slice (field_levels), estimated if None.
+
+    Returns:
+        DisplaySlice
+    """
+    image = display_transform(volume_slice(volume, index), mode)
+    levels = levels[mode] if levels is not None else estimate_levels(image)
+    value_range = (float(np.nanmin(image)), float(np.nanmax(image)))
+    pyramid = [compact_buffer(level, value_range) for level in build_pyramid(image, "mean" if mode == "Phase" else "max")]
+    return DisplaySlice(pyramid[0], levels, value_range, pyramid)
+
+
+class SliceCache:
+    """
+    Bounded LRU cache of display slices, keyed by (slice index, mode).
+
+    The cache is shared by the GUI thread and the display worker. reset() is called when the displayed
+    volume changes: it empties the cache and increments the generation, so that the slices of the previous
+    volume still being computed by the worker are dropped instead of stored.
+    """
+
+    def __init__(self, max_bytes=512 * 2**20):
+        """
+        Args:
+            max_bytes (int): Memory budget. The most recent slice is always kept, even if larger.
+        """
+        self.max_bytes = max_bytes
+        self.generation = 0
+        self._slices = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached slice, or None."""
+        with self._lock:
+            value = self._slices.get(key)
+            if value is not None:
+                self._slices.move_to_end(key)
+            return value
+
+    def put(self, key, value, generation=None):
+        """
+        Store a slice, evicting the least recently used ones above the memory budget.
+
+        Args:
+            key (tuple): (slice index, mode).
+            value (DisplaySlice): Slice.
+            generation (int): Generation the slice was computed for, ignored if outdated. None for current.
+        """
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            old = self._slices.pop(key, None)
+            if old is not None:
+                self._nbytes -= old.nbytes
+            self._slices[key] = value
+            self._nbytes += value.nbytes
+            while self._nbytes > self.max_bytes and len(self._slices) > 1:
+                _, evicted = self._slices.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+
+    def reset(self):
+        """Empty the cache for a new volume."""
+        with self._lock:
+            self._slices.clear()
+            self._nbytes = 0
+            self.generation += 1
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def __len__(self):
+        return len(self._slices)
+
+    def __contains__(self, key):
+        return key in self._slices
+
+
+class DisplayWorker(QObject):
+    """
+    Background thread computing display slices (compute_display_slice) into a SliceCache.
+
+    Requests are served most recent first and only the last max_pending ones are kept, so that scrubbing
+    through a sweep computes the slice under the cursor, not every slice passed on the way. Prefetch
+    requests (the neighbours of the visible slice) are only served when no slice is waiting to be shown,
+    in the order they were made. slice_ready is emitted from the worker thread: connected to a widget
+    slot, it is delivered in the GUI thread. The thread is a daemon started on the first request.
+    """
+
+    slice_ready = pyqtSignal(int, int, str)  # generation, slice index, mode
+
+    max_pending = 4
+    max_prefetch = 16  # at least the playback look-ahead of the viewers
+
+    def __init__(self, cache):
+        """
+        Args:
+            cache (SliceCache): Cache the slices are stored in.
+        """
+        super().__init__()
+        self.cache = cache
+        self._pending = OrderedDict()
+        self._prefetch = OrderedDict()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def request(self, volume, index, mode, levels=None, prefetch=False):
+        """
+        Compute a slice of volume for the current generation of the cache (no-op if already pending).
+
+        Args:
+            volume (np.array or VolumeProvider): (l, h, w) field.
+            index (int): Slice index.
+            mode (str): Display mode.
+            levels (dict): Precomputed levels of the slice, see compute_display_slice.
+            prefetch (bool): Low priority request, for a slice that may be shown next.
+        """
+        key = (self.cache.generation, index, mode)
+        with self._condition:
+            if prefetch:
+                if key in self._pending or key in self._prefetch:
+                    return
+                queue, max_size = self._prefetch, self.max_prefetch
+            else:
+                self._prefetch.pop(key, None)
+                queue, max_size = self._pending, self.max_pending
+            queue[key] = (volume, levels)
+            queue.move_to_end(key)
+            while len(queue) > max_size:
+                queue.popitem(last=False)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._prefetch:
+                    self._condition.wait()
+                prefetch = not self._pending
+                queue = self._prefetch if prefetch else self._pending
+                (generation, index, mode), (volume, levels) = queue.popitem(last=not prefetch)
+            if generation != self.cache.generation:
+                continue
+            if (index, mode) in self.cache:
+                if prefetch:
+                    continue
+            else:
+                try:
+                    display_slice = compute_display_slice(volume, index, mode, levels)
+                except Exception as e:
+                    print(f"Display error: {str(e)}")
+                    continue
+                self.cache.put((index, mode), display_slice, generation)
+            self.slice_ready.emit(generation, index, mode)
@@ -0,0 +1,178 @@
+import numpy as np
+
+
+class SeparableField:
+    """
+    Lazy 2D field defined on a grid by two 1D vectors : value[i, j] = combine(col[i], row[j]).
+
+    With the default combine (np.multiply) the field is separable (gaussian beam, spherical wave,
+    plane wave). Any other broadcasting function works the same way, e.g. an elliptic mask
+    combine(y, x) = (x / a)**2 + (y / b)**2 <= 1 : no meshgrid is ever built, only the 1D vectors are
+    stored, and the values are computed when the field is materialized (np.asarray(field), materialize(out))
+    or multiplied by another array (multiply), directly in the output buffer for separable fields.
+
+    The field may have leading axes of size 1 (see expand_dims), like the (1, H, W) volumes of the sections.
+    """
+
+    def __init__(self, col, row, combine=np.multiply, fill=0, dtype=None, lead=()):
+        """
+        Args:
+            col (1D np.array): Factor / coordinate along the rows (y).
+            row (1D np.array): Factor / coordinate along the columns (x).
+            combine (callable): Broadcasting function of (col[:, None], row[None, :]).
+            fill (float): Value of col and row outside the field (zero_pad), combine(fill, .) must be 0.
+            dtype (np.dtype): Type of the values, deduced from combine if None.
+            lead (tuple): Leading axes.
+        """
+        self.col = np.asarray(col)
+        self.row = np.asarray(row)
+        self.combine = combine
+        self.fill = fill
+        self.lead = tuple(lead)
+        if dtype is None:
+            dtype = np.asarray(combine(self.col[:1, np.newaxis], self.row[np.newaxis, :1])).dtype
+        self.dtype = np.dtype(dtype)
+
+    def _like(self, col, row, lead=None):
+        return SeparableField(col, row, self.combine, self.fill, self.dtype, self.lead if lead is None else lead)
+
+    @property
+    def shape(self):
+        return (*self.lead, self.col.size, self.row.size)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def separable(self):
+        return self.combine is np.multiply
+
+    def expand_dims(self):
+        """Same field with a leading axis of size 1."""
+        return self._like(self.col, self.row, (1, *self.lead))
+
+    def __getitem__(self, key):
+        """Window of the field : key = (row slice, column slice), on the last two axes."""
+        rows, cols = key
+        return self._like(self.col[rows], self.row[cols])
+
+    def materialize(self, out=None):
+        """
+        Values of the field.
+
+        Args:
+            out (np.array): Preallocated output of shape self.shape, allocated if None.
+
+        Returns:
+            np.array: out.
+        """
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        out[...] = self.combine(self.col[:, np.newaxis], self.row[np.newaxis, :])
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.materialize()
+        return values if dtype is None else values.astype(dtype, copy=False)
+
+    def multiply(self, other, out=None):
+        """
+        other * field, without materializing the field for separable fields : the column and the row
+        factors are applied one after the other, in the output buffer.
+
+        Args:
+            other (np.array): Array broadcastable against the field (aperture, filter, ...).
+            out (np.array): Preallocated output, allocated if None.
+
+        Returns:
+            np.array: out.
+        """
+        if not self.separable:
+            return np.multiply(other, self.materialize(), out=out)
+        out = np.multiply(other, self.col[:, np.newaxis], out=out)
+        return np.multiply(out, self.row, out=out)
+
+    def zero_pad(self, new_shape):
+        """
+        Field on a larger grid, centered (same placement as automatic_sizing.zero_pad), 0 outside.
+
+        Args:
+            new_shape (tuple): New (height, width).
+
+        Returns:
+            SeparableField
+        """
+        return self.place(new_shape)
+
+    def place(self, new_shape, offset=(0, 0)):
+        """
+        Field on another grid, centered then moved by offset pixels, 0 outside and cropped at the borders
+        (same placement as the insert_with_offset of the dialogs).
+
+        Args:
+            new_shape (tuple): New (height, width).
+            offset (tuple): (row, col) shift from the centered position.
+
+        Returns:
+            SeparableField
+        """
+        def place_vector(vector, n, shift):
+            start = (n - vector.size) // 2 + shift
+            out = np.full(n, self.fill, dtype=vector.dtype)
+            first, last = max(start, 0), min(start + vector.size, n)
+            if first < last:
+                out[first:last] = vector[first - start:last - start]
+            return out
+        return self._like(place_vector(self.col, new_shape[0], offset[0]), place_vector(self.row, new_shape[1], offset[1]))
+
+    def __repr__(self):
+        return f"SeparableField(shape={self.shape}, dtype={self.dtype})"
+
+
+class ThinLensField(SeparableField):
+    """
+    Amplitude field through a thin lens : amplitude(y) amplitude(x) exp(-i pi (x^2 + y^2) / (wavelength f)).
+
+    The sampled quadratic phase (col and row) is only used by the generic paths (display, sweeps). The
+    propagators that know the lens (diffraction_propagation.lens_propagation) take amplitude() and the focal
+    length instead, so that short focal lengths do not require grids fine enough to sample the phase.
+    """
+
+    def __init__(self, amplitude_col, amplitude_row, focal_length, wavelength, dx, lead=()):
+        """
+        Args:
+            amplitude_col (1D np.array), amplitude_row (1D np.array): Separable amplitude before the lens.
+            focal_length (float): Focal length, same unit as dx.
+            wavelength (float): Wavelength, same unit as dx.
+            dx (float): Sampling rate.
+            lead (tuple): Leading axes.
+        """
+        self.amplitude_col = np.asarray(amplitude_col)
+        self.amplitude_row = np.asarray(amplitude_row)
+        self.focal_length, self.wavelength, self.dx = focal_length, wavelength, dx
+        k = np.pi / (focal_length * wavelength)
+        col = self.amplitude_col * np.exp(-1j * k * grid_coordinates(self.amplitude_col.size, dx)**2)
+        row = self.amplitude_row * np.exp(-1j * k * grid_coordinates(self.amplitude_row.size, dx)**2)
+        super().__init__(col, row, lead=lead)
+
+    def expand_dims(self):
+        return ThinLensField(self.amplitude_col, self.amplitude_row, self.focal_length, self.wavelength,
+                             self.dx, (1, *self.lead))
+
+    def zero_pad(self, new_shape):
+        # the amplitude is padded, the lens stays centered on the grid
+        amplitude = self.amplitude().zero_pad(new_shape)
+        return ThinLensField(amplitude.col, amplitude.row, self.focal_length, self.wavelength, self.dx, self.lead)
+
+    def amplitude(self):
+        """Field right before the lens, as a SeparableField."""
+        return SeparableField(self.amplitude_col, self.amplitude_row, lead=self.lead)
+
+
+def grid_coordinates(n, dx=1.0):
+    """Coordinates of n pixels, origin at the pixel n//2, like the sources and the apertures."""
+    return (np.arange(n) - n // 2) * dx
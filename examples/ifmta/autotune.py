@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Jul  2 09:40:11 2025 under Python 3.11.7
+
+@author: Bao Chau Tran
+"""
+
+# 8<--------------------------- Import modules ---------------------------
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+try:
+    from ifmta.ifta import IftaImproved
+    from ifmta.performance_criterias import ComputeEfficiency, ComputeUniformity
+except:
+    from ifta import IftaImproved
+    from performance_criterias import ComputeEfficiency, ComputeUniformity
+
+# 8<--------------------------- Functions definitions ---------------------------
+
+def SampleConfigurations(n_candidates, rng, *, quantized=True, rfact_range=(1.0, 1.6), ph1_ratio_range=(0.2, 0.8),
+                         delta_power_range=(0.5, 3.)):
+    """
+    SampleConfigurations : draw random IftaImproved hyperparameters
+
+    Author : Bao Chau Tran
+    Status : in progress
+    Last update : 2025.07.02
+    Comments : delta_power is drawn log-uniformly, the other parameters uniformly. Without quantization
+               (n_levels = 0) there is no second loop : only rfact is drawn
+
+    Inputs : MANDATORY : n_candidates {int}
+                         rng {np.random.Generator}
+             OPTIONAL : quantized {bool} : draw the parameters of the second loop - default value = True
+                        rfact_range, ph1_ratio_range, delta_power_range {tupple (1x2)} : bounds of each parameter
+
+    Outputs : configurations {list of dict} : rfact, ph1_ratio (part of the iterations in the first loop), delta_power
+                                              (rfact only if not quantized)
+    """
+
+    rfacts = rng.uniform(*rfact_range, n_candidates)
+    if not quantized:
+        return [{"rfact": float(rfact)} for rfact in rfacts]
+    ph1_ratios = rng.uniform(*ph1_ratio_range, n_candidates)
+    delta_powers = np.exp(rng.uniform(np.log(delta_power_range[0]), np.log(delta_power_range[1]), n_candidates))
+
+    return [{"rfact": float(rfact), "ph1_ratio": float(ratio), "delta_power": float(power)}
+            for rfact, ratio, power in zip(rfacts, ph1_ratios, delta_powers)]
+
+
+def IftaAutotune(target, *, image_size=None, n_levels=0, n_candidates=27, eta=3, min_iter=10, max_iter=90,
+                 uniformity_weight=1., max_time=None, max_workers=None, seed=0, callback=None):
+    """
+    IftaAutotune : choose rfact, n_iter_ph1, n_iter_ph2 and the delta_phases schedule of IftaImproved
+                   by successive halving
+
+    Author : Bao Chau Tran
+    Status : in progress
+    Last update : 2025.07.02
+    Comments : n_candidates random configurations are run with a budget of min_iter iterations (both loops).
+               Only the best 1/eta of them are run again with eta times more iterations, until max_iter is
+               reached or one candidate is left. The runs of a rung are done in parallel threads (numpy FFTs
+               release the GIL), they all start from the same random phase so that they are compared fairly.
+               The score is efficiency - uniformity_weight * uniformity of the last phase.
+               Without quantization (n_levels = 0), every run spends its whole budget in the first loop and
+               only rfact is tuned.
+               With max_time [s], the runs of the current rung that start after the time is over are skipped
+               (the first run of a rung always runs, the runs already started finish), and no new rung is started.
+
+    Inputs : MANDATORY : target {2D float np.array}[Irradiance] : image we want to get at infinity
+
+              OPTIONAL :  image_size {tupple (1x2)}[pixel] : size of the image plane, is equal to holo_size
+                          n_levels : number of levels of the DOE - default value = 0 : no Discretization
+                          n_candidates {int} : number of configurations of the first rung - default value = 27
+                          eta {int} : reduction factor between rungs - default value = 3
+                          min_iter, max_iter {int} : iteration budget of the first and of the last rung
+                          uniformity_weight {float} : weight of the uniformity in the score - default value = 1
+                          max_time {float}[s] : time limit - default value = None (no limit)
+                          max_workers {int} : number of threads - default value = None (ThreadPoolExecutor default)
+                          seed {int} : seed of the random configurations and of the initial phase
+                          callback : called with the progress in percent after each run
+
+    Outputs : best {dict} : configuration of the best run, with n_iter_ph1, n_iter_ph2, efficiency, uniformity, score
+              best_phase {2D np.array} : last phase of the best run
+              results {list of dict} : every run, with its rung and budget
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+
+    if len(target.shape) == 3:
+        target = target.squeeze()
+    target_size = target.shape
+    if image_size == None:
+        image_size = target_size
+    image = np.zeros(image_size)                             # target in the image plane, for the criteria
+    image[image_size[0]//2-target_size[0]//2:image_size[0]//2-target_size[0]//2+target_size[0],
+          image_size[1]//2-target_size[1]//2:image_size[1]//2-target_size[1]//2+target_size[1]] = target
+
+    initial_phase = 2*np.pi*rng.random(image_size)           # same random phase for every run
+    candidates = SampleConfigurations(n_candidates, rng, quantized=n_levels != 0)
+    keys = tuple(candidates[0])                               # tuned parameters
+
+    budgets = [min_iter]
+    while budgets[-1] < max_iter and n_candidates//eta**len(budgets) >= 1:
+        budgets.append(min(budgets[-1]*eta, max_iter))
+    n_runs = sum(max(1, n_candidates//eta**rung) for rung in range(len(budgets)))
+    done = 0
+
+    def Run(configuration, budget, required):
+        if not required and max_time is not None and time.perf_counter() - start > max_time:
+            return None, None                                # time over : skipped
+        if n_levels == 0:                                    # no second loop : the whole budget in the first one
+            n_iter_ph1, n_iter_ph2 = budget, 0
+        else:
+            n_iter_ph1 = max(1, int(round(budget*configuration["ph1_ratio"])))
+            n_iter_ph2 = max(1, budget - n_iter_ph1)
+        phase = IftaImproved(target, image_size=image_size, n_iter_ph1=n_iter_ph1, n_iter_ph2=n_iter_ph2,
+                             rfact=configuration["rfact"], n_levels=n_levels, seed=initial_phase.copy(),
+                             delta_power=configuration.get("delta_power", 1.), keep_history=False)[-1]
+        efficiency = ComputeEfficiency(phase, image, n_levels)
+        uniformity = ComputeUniformity(phase, image, n_levels)
+        return dict(configuration, n_iter_ph1=n_iter_ph1, n_iter_ph2=n_iter_ph2, efficiency=float(efficiency),
+                    uniformity=float(uniformity), score=float(efficiency - uniformity_weight*uniformity)), phase
+
+    results = []
+    best, best_phase = None, None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for rung, budget in enumerate(budgets):
+            futures = [executor.submit(Run, configuration, budget, index == 0)
+                       for index, configuration in enumerate(candidates)]
+            rung_results = []
+            for future in futures:
+                result, phase = future.result()
+                if result is None:
+                    continue
+                result.update(rung=rung, budget=budget)
+                rung_results.append((result, phase))
+                done += 1
+                if callback:
+                    callback(int(min(done, n_runs)/n_runs*100))
+
+            rung_results.sort(key=lambda run: run[0]["score"], reverse=True)
+            results += [result for result, _ in rung_results]
+            best, best_phase = rung_results[0]                # the best run of the largest budget so far
+
+            if max_time is not None and time.perf_counter() - start > max_time:
+                break
+            candidates = [{key: result[key] for key in keys}
+                          for result, _ in rung_results[:max(1, len(rung_results)//eta)]]
+
+    if callback:
+        callback(100)
+
+    return best, best_phase, results
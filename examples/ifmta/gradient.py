@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Jul  1 10:12:05 2025 under Python 3.11.7
+
+@author: Bao Chau Tran
+"""
+
+# 8<--------------------------- Import modules ---------------------------
+
+import numpy as np
+from scipy.optimize import minimize
+try:
+    from ifmta.tools import Discretization, PreviewThrottle
+except:
+    from tools import Discretization, PreviewThrottle
+
+# 8<--------------------------- Functions definitions ---------------------------
+
+class _TargetReached(Exception):
+    # raised from the objective to stop scipy.optimize.minimize early
+    pass
+
+
+class _BudgetUsed(Exception):
+    # raised from the objective when the n_iter evaluations are done (L-BFGS-B may exceed maxfun)
+    pass
+
+
+def ImageField(phase, kernel=None):
+    """
+    ImageField : image of a phase DOE, normalized so that sum(|image_field|^2) = N (number of pixels)
+
+    Author : Bao Chau Tran
+    Status : in progress
+    Last update : 2025.07.01
+
+    Inputs : MANDATORY : phase {2D float np.array}[rad] : DOE phase
+             OPTIONAL : kernel : propagation kernel (see tools.PropagationKernel), target at finite distance
+                                 default value = None : image at infinity (centered Fourier transform)
+
+    Outputs : u = exp(1j*phase), image_field {2D complex np.array}
+    """
+
+    u = np.exp(1j*phase)
+    if kernel is None:
+        image_field = np.fft.fftshift(np.fft.fft2(u))/np.sqrt(phase.size)  # unitary centered TF
+    else:
+        image_field = np.fft.ifft2(np.fft.fft2(u)*kernel)                   # propagation at distance z
+
+    return u, image_field
+
+
+def PhaseLoss(phase, target, *, weight_efficiency=1., weight_uniformity=1., weight_zero_order=0., kernel=None):
+    """
+    PhaseLoss : loss of a phase DOE and its exact gradient with respect to the phase
+
+    Author : Bao Chau Tran
+    Status : in progress
+    Last update : 2025.07.01
+    Comments : p = |E|^2 / N is the normalized image irradiance (sum = 1), E the image of exp(1j*phase)
+               (centered Fourier transform, or propagation with kernel). With t the normalized target,
+               eta = sum(p[ROI]) and p0 the zero order :
+                   loss = w_e*(1-eta) + w_u*(sum(p^2/t)[ROI]/eta^2 - 1) + w_0*p0
+               the uniformity term is 0 when p is proportional to t in the ROI (Cauchy-Schwarz).
+               With g = dloss/dp, the gradient is 2/N * Im(conj(u) * A^H(g*E)), A^H being the adjoint
+               propagation : one forward and one adjoint FFT.
+
+    Inputs : MANDATORY : phase {2D float np.array}[rad] : DOE phase
+                         target {2D float np.array}[Irradiance] : target image, same shape as phase, centered
+             OPTIONAL : weight_efficiency, weight_uniformity, weight_zero_order {float} : weights of the loss terms
+                        kernel : propagation kernel (see tools.PropagationKernel), target at finite distance
+
+    Outputs : loss {float}, gradient {2D float np.array}, p {2D float np.array} : normalized image irradiance
+    """
+
+    n_pixels = phase.size
+    roi = target != 0
+    t = target/np.sum(target)                                         # normalized target
+
+    u, image_field = ImageField(phase, kernel)
+    p = np.abs(image_field)**2/n_pixels
+
+    eta = np.sum(p[roi])
+    s = np.sum(p[roi]**2/t[roi])
+    zero_order = (p.shape[0]//2, p.shape[1]//2) if kernel is None else None
+
+    loss = weight_efficiency*(1-eta) + weight_uniformity*(s/eta**2 - 1)
+    g = np.zeros(p.shape)                                              # dloss/dp
+    g[roi] = -weight_efficiency + weight_uniformity*(2*p[roi]/t[roi]/eta**2 - 2*s/eta**3)
+    if zero_order is not None and weight_zero_order:
+        loss += weight_zero_order*p[zero_order]
+        g[zero_order] += weight_zero_order
+
+    if kernel is None:
+        back = np.fft.ifft2(np.fft.ifftshift(g*image_field))*np.sqrt(n_pixels)   # adjoint of the unitary TF
+    else:
+        back = np.fft.ifft2(np.fft.fft2(g*image_field)*np.conj(kernel))          # adjoint propagation
+    gradient = 2/n_pixels*np.imag(np.conj(u)*back)
+
+    return loss, gradient, p
+
+
+def SoftQuantization(phase, n_levels, beta):
+    """
+    SoftQuantization : differentiable staircase, from the identity (beta = 0) to Discretization (beta -> inf)
+
+    Author : Bao Chau Tran
+    Status : in progress
+    Last update : 2025.07.01
+    Comments : each step of height 2pi/n_levels is a tanh of sharpness beta, continuous between steps
+
+    Inputs : MANDATORY : phase {np.array}[rad] : free phase
+                         n_levels {int} : number of levels, 0 for no quantization
+                         beta {float} : sharpness of the steps
+
+    Outputs : quantized phase {np.array}, derivative with respect to phase {np.array}
+    """
+
+    if n_levels == 0 or beta == 0:
+        return phase, np.ones(phase.shape)
+
+    step = 2*np.pi/n_levels
+    x = phase/step
+    frac = x - np.floor(x) - 0.5                                       # position inside the step, -0.5 .. 0.5
+    th = np.tanh(beta*frac)
+    norm = np.tanh(beta/2)
+    quantized = step*(np.floor(x) + 0.5 + 0.5*th/norm)
+    derivative = 0.5*beta*(1 - th**2)/norm
+
+    return quantized, derivative
+
+
+def GradientDesign(target, *, image_size=None, n_iter=200, n_levels=0, optimizer="lbfgs", learning_rate=0.5,
+                   weight_efficiency=1., weight_uniformity=1., weight_zero_order=0., quantization_ratio=0.5,
+                   beta_max=40., n_stages=6, target_uniformity=None, kernel=None, history_step=None,
+                   compute_efficiency=0, compute_uniformity=0, seed=0, preview=None, preview_every=10,
+                   preview_interval=0.5, callback=None):
+    """
+    GradientDesign : DOE design by gradient descent on the phase, alternative to IftaImproved
+
+    Author : Bao Chau Tran
+    Status : in progress
+    Last update : 2025.07.01
+    Comments : the loss and its exact gradient come from PhaseLoss (2 FFTs per evaluation). With n_levels != 0,
+               the last quantization_ratio of the iterations optimizes SoftQuantization(phase) while beta grows
+               geometrically from 1 to beta_max (continuously for adam, in n_stages stages for lbfgs).
+               The returned phase is always discretized with tools.Discretization.
+               With target_uniformity, the optimization stops as soon as the uniformity of the image (at the
+               final beta, after discretization) is below target_uniformity.
+               The number of loss evaluations never exceeds n_iter: when the budget is used, the phase with the
+               lowest loss at the current beta is kept.
+
+    Inputs : MANDATORY : target {2D float np.array}[Irradiance] : image we want to get at infinity under plane wave illumination
+
+              OPTIONAL :  image_size {tupple (1x2)}[pixel] : size of the image plane, is equal to holo_size
+                          n_iter {int} : number of loss evaluations - default value = 200
+                          n_levels : number of levels over which the phase will be discretized
+                                    default value = 0 : no Discretization
+                          optimizer {str} : "lbfgs" (scipy L-BFGS-B) or "adam" - default value = "lbfgs"
+                          learning_rate {float}[rad] : adam step - default value = 0.5
+                          weight_efficiency, weight_uniformity, weight_zero_order {float} : see PhaseLoss
+                          quantization_ratio {float} : part of n_iter used for the quantization - default value = 0.5
+                          beta_max {float} : final sharpness of SoftQuantization - default value = 40
+                          n_stages {int} : number of quantization stages of lbfgs - default value = 6
+                          target_uniformity {float} : early stopping criterion - default value = None
+                          kernel : propagation kernel (see tools.PropagationKernel), target at finite distance
+                          history_step {int} : a phase is saved every history_step evaluations
+                                               default value = n_iter // 25
+                          compute_efficiency {bool} : If 1, efficiency is computed and returned along the loop
+                          compute_uniformity {bool} : If 1, uniformity is computed and returned along the loop
+                          seed : int (random initial phase) or initial DOE phase {2D np.array}
+                          preview, preview_every, preview_interval : live preview, see ifta.IftaImproved
+                          callback : called with the progress in percent after each evaluation
+
+    Outputs : holo_phase_fields {3D np.array} : saved DOE phases, the last one being discretized,
+              followed by efficiency and / or uniformity when asked, as IftaImproved
+    """
+    if len(target.shape) == 3:
+        target = target.squeeze()
+
+    target_size = target.shape
+    if image_size == None:
+        image_size = target_size
+    image = np.zeros(image_size)                              # target irradiance in the image plane
+    image[image_size[0]//2-target_size[0]//2:image_size[0]//2-target_size[0]//2+target_size[0],
+          image_size[1]//2-target_size[1]//2:image_size[1]//2-target_size[1]//2+target_size[1]] = np.asarray(target, float)
+    roi = image != 0
+
+    if type(seed) == int:
+        phase = 2*np.pi*np.random.rand(image_size[0], image_size[1]) # Random DOE phase
+    else:
+        phase = np.array(seed, float)
+
+    if history_step is None:
+        history_step = max(1, n_iter//25)
+
+    n_free = n_iter if n_levels == 0 else int(round(n_iter*(1 - quantization_ratio)))
+    efficiency = []
+    uniformity = []
+    holo_phase_fields = [phase.copy()]
+    state = {"evaluations": 0, "beta": None, "best_loss": np.inf, "best_phase": phase.copy()}
+    throttle = PreviewThrottle(preview, n_iter, preview_every, preview_interval) if preview else None
+
+    def Beta(evaluation):
+        # sharpness of the quantization, 0 during the continuous part
+        if n_levels == 0 or evaluation < n_free:
+            return 0.
+        return beta_max**((evaluation - n_free + 1)/max(1, n_iter - n_free))
+
+    def Uniformity(p):
+        ratio = p[roi]/image[roi]
+        return (np.max(ratio) - np.min(ratio))/(np.max(ratio) + np.min(ratio))
+
+    def Objective(phase, beta):
+        if state["evaluations"] >= n_iter:
+            raise _BudgetUsed
+        quantized, derivative = SoftQuantization(phase, n_levels, beta)
+        loss, gradient, p = PhaseLoss(quantized, image, weight_efficiency=weight_efficiency,
+                                      weight_uniformity=weight_uniformity, weight_zero_order=weight_zero_order,
+                                      kernel=kernel)
+        state["evaluations"] += 1
+        evaluation = state["evaluations"]
+        if beta != state["beta"] or loss < state["best_loss"]:  # losses are comparable at the same beta only
+            state["beta"], state["best_loss"], state["best_phase"] = beta, loss, phase.copy()
+
+        current_uniformity = Uniformity(p)
+        if compute_efficiency:
+            efficiency.append(np.sum(p[roi]))
+        if compute_uniformity:
+            uniformity.append(current_uniformity)
+        if evaluation % history_step == 0:
+            holo_phase_fields.append(quantized)
+        if throttle:
+            throttle(evaluation, quantized, p)                 # live preview
+        if callback:
+            callback(int(min(evaluation, n_iter)/n_iter*100))
+
+        if target_uniformity is not None and (n_levels == 0 or beta >= beta_max):
+            if n_levels != 0:                                  # the returned DOE is the discretized one
+                hard = Discretization(np.remainder(quantized, 2*np.pi), n_levels)
+                current_uniformity = Uniformity(np.abs(ImageField(hard, kernel)[1])**2)
+            if current_uniformity <= target_uniformity:
+                state["phase"] = phase.copy()
+                raise _TargetReached
+        return loss, gradient*derivative
+
+    try:
+        if optimizer == "adam":
+            m = np.zeros(phase.shape)
+            v = np.zeros(phase.shape)
+            beta1, beta2, eps = 0.9, 0.999, 1e-8
+            for k in range(n_iter):
+                loss, gradient = Objective(phase, Beta(k))
+                m = beta1*m + (1-beta1)*gradient
+                v = beta2*v + (1-beta2)*gradient**2
+                phase = phase - learning_rate*(m/(1-beta1**(k+1)))/(np.sqrt(v/(1-beta2**(k+1))) + eps)
+
+        elif optimizer == "lbfgs":
+            if n_levels == 0:
+                stages = [(0., n_iter)]
+            else:
+                stage_iter = max(1, (n_iter - n_free)//n_stages)
+                stages = [(0., n_free)] + [(beta_max**((s+1)/n_stages), stage_iter) for s in range(n_stages)]
+            for beta, maxfun in stages:
+                if maxfun <= 0:
+                    continue
+                result = minimize(lambda x: Objective(x.reshape(image_size), beta), phase.ravel(), jac=True,
+                                  method="L-BFGS-B", options={"maxfun": maxfun, "maxiter": maxfun, "ftol": 0, "gtol": 0})
+                phase = result.x.reshape(image_size)
+
+        else:
+            raise ValueError(f"Unknown optimizer : {optimizer}")
+
+    except _TargetReached:
+        phase = state["phase"]
+
+    except _BudgetUsed:
+        phase = state["best_phase"]
+
+    if n_levels != 0:
+        phase, _ = SoftQuantization(phase, n_levels, beta_max)
+    holo_phase_fields.append(Discretization(np.remainder(phase, 2*np.pi), n_levels))
+    holo_phase_fields = np.array(holo_phase_fields)
+
+    if compute_efficiency and not(compute_uniformity):
+        return holo_phase_fields, np.array(efficiency)
+
+    if compute_uniformity and not(compute_efficiency):
+        return holo_phase_fields, np.array(uniformity)
+
+    if compute_efficiency and compute_uniformity:
+        return holo_phase_fields, np.array(efficiency), np.array(uniformity)
+
+    return holo_phase_fields
@@ -7,12 +7,14 @@ Created on Fri Mar  1 09:58:42 2024 under Python 3.11.7
 
 # 8<--------------------------- Import modules ---------------------------
 
+import os
+import time
 import numpy as np
 try:
-    from ifmta.tools import Discretization, SoftDiscretization
+    from ifmta.tools import Discretization, SoftDiscretization, HalfSpectrum, HermitianAmplitude, PropagationKernel, PreviewThrottle
     from ifmta.performance_criterias import ComputeEfficiency, ComputeUniformity
 except: 
-    from tools import Discretization, SoftDiscretization
+    from tools import Discretization, SoftDiscretization, HalfSpectrum, HermitianAmplitude, PropagationKernel, PreviewThrottle
     from performance_criterias import ComputeEfficiency, ComputeUniformity
 
 import matplotlib.pyplot as plt
@@ -298,7 +300,9 @@ def IftaOverCompensation(target, image_size, *, n_iter = 25, compute_efficiency
 
 
 
-def IftaImproved(target, *, image_size=None, n_iter_ph1=25, n_iter_ph2 = 25, rfact=1.2, n_levels=0, compute_efficiency=0, compute_uniformity=0, seed=0, callback = None):
+def IftaImproved(target, *, image_size=None, n_iter_ph1=25, n_iter_ph2 = 25, rfact=1.2, n_levels=0, compute_efficiency=0, compute_uniformity=0, seed=0, 
+                 delta_power=1., real_fft=False, keep_history=True, checkpoint_path=None, checkpoint_every=10, 
+                 resume_state=None, preview=None, preview_every=10, preview_interval=0.5, callback = None):
 
     """
     Ifta : Iterative Fourier Transform Algorithm
@@ -322,12 +326,37 @@ def IftaImproved(target, *, image_size=None, n_iter_ph1=25, n_iter_ph2 = 25, rfa
                                                       default value = 0
                           compute_uniformity {bool} : If 1, uniformity is computed and returned along the loop
                                                       default value = 0
+                          delta_power {float} : shape of the soft discretization schedule of the second loop,
+                                                delta_phase = pi/n_levels * (k/(n_iter_ph2-1))**delta_power
+                                                default value = 1 : linear
+                          real_fft {bool} : with n_levels = 2, second loop on real FFTs (see Comments)
+                                            default value = 0
+                          keep_history {bool} : If 0, only the last phase is kept (holo_phase_fields has one element)
+                                                default value = 1
+                          checkpoint_path {str} : the state of the loops is saved in this .npz file every 
+                                                  checkpoint_every iterations and at the end of each loop, 
+                                                  see IftaResume - default value = None : no checkpoint
+                          resume_state {dict} : state loaded by LoadCheckpoint, the run continues from it
+                                                (use IftaResume)
+                          preview : function receiving a downsampled preview of the phase and of the image
+                                    every preview_every iterations or preview_interval seconds, see 
+                                    tools.PreviewThrottle - default value = None
                         
+    Comments : with n_levels = 2 (binary DOE) and real_fft = 1, the hologram of the second loop is real (+-1).
+               Its spectrum is hermitian, so the second loop only computes half of it with real FFTs (rfft2 /
+               irfft2), at half the FFT cost, and the phase is projected directly on {0, pi}. The target
+               irradiance is symmetrized, as a binary DOE always forms a point symmetric image. The hologram is
+               binary from the first iteration of the second loop, so there is no soft quantization schedule :
+               delta_power must be 1. On point symmetric targets both loops reach the same efficiency, on the
+               other ones the efficiency of the real FFT loop is about 5 % lower and its uniformity better.
+
     Outputs : a binary cross
     """
     if len(target.shape) == 3:
         target = target.squeeze()
 
+    if n_levels == 2 and real_fft and delta_power != 1.:
+        raise ValueError("The real FFT binary loop has no quantization schedule, use real_fft=0 to set delta_power")
     
     if compute_efficiency and n_levels == 0:  # memory allocation
         efficiency = np.zeros(n_iter_ph1)   
@@ -357,33 +386,65 @@ def IftaImproved(target, *, image_size=None, n_iter_ph1=25, n_iter_ph2 = 25, rfa
                   target_size[1]//2+target_size[1]] = target_amp   # Amplitude = target image in window
     
     
-    if type(seed) == int:
-        image_phase = 2*np.pi*np.random.rand(image_size[0], image_size[1]) # Random image phase
+    if resume_state is not None:                      # continue a checkpointed run
+        k_ph1, k_ph2 = int(resume_state["k_ph1"]), int(resume_state["k_ph2"])  # iterations already done
+        image_field = resume_state["image_field"]
+        image_phase = resume_state["holo_phase"]      # first element of the history : last saved phase
+        image_amp[image_size[0]//2-target_size[0]//2:image_size[0]//2-target_size[0]//2+target_size[0], 
+                  image_size[1]//2-target_size[1]//2:image_size[1]//2-
+                  target_size[1]//2+target_size[1]] = rfact*target_amp   # ROI amplitude of the loops
+        for metric, name in ((efficiency, "efficiency"), (uniformity, "uniformity")):
+            n = min(len(metric), len(resume_state[name]))
+            metric[:n] = resume_state[name][:n]       # metrics of the iterations already done
+        np.random.set_state(("MT19937", resume_state["rng_keys"], int(resume_state["rng_pos"]),
+                             int(resume_state["rng_has_gauss"]), float(resume_state["rng_gauss"])))
     else:
-        image_phase = seed
+        k_ph1, k_ph2 = 0, 0
+        if type(seed) == int:
+            image_phase = 2*np.pi*np.random.rand(image_size[0], image_size[1]) # Random image phase
+        else:
+            image_phase = seed
 
     cont = 0
+    done = k_ph1 + k_ph2                # iterations done before a resume
     h,w = image_phase.shape
-    if n_levels != 0:
-        shape = (n_iter_ph1 + n_iter_ph2 + 1, h, w)
+    if not keep_history:
+        shape = (1, h, w)
+    elif n_levels != 0:
+        shape = (n_iter_ph1 - k_ph1 + max(0, n_iter_ph2 - k_ph2) + 1, h, w)
     else:
-        shape = (n_iter_ph1 + 1, h, w)
+        shape = (n_iter_ph1 - k_ph1 + 1, h, w)
     holo_phase_fields = np.zeros(shape)
     holo_phase_fields[cont] = image_phase   
 
     total = n_iter_ph1 + n_iter_ph2     # Number of operations
 
-    image_field = image_amp*np.exp(1j * image_phase)      # Initiate input field
+    if resume_state is None:
+        image_field = image_amp*np.exp(1j * image_phase)      # Initiate input field
+
+    throttle = PreviewThrottle(preview, total, preview_every, preview_interval) if preview else None
+
+    def Checkpoint(k_ph1, k_ph2, t):
+        # loop state after k_ph1 + k_ph2 iterations, t being the position in the delta_phases schedule
+        _, rng_keys, rng_pos, rng_has_gauss, rng_gauss = np.random.get_state()
+        SaveCheckpoint(checkpoint_path, target=target, image_size=image_size, n_iter_ph1=n_iter_ph1, 
+                       n_iter_ph2=n_iter_ph2, rfact=rfact, n_levels=n_levels, delta_power=delta_power, real_fft=real_fft, 
+                       compute_efficiency=compute_efficiency, compute_uniformity=compute_uniformity, 
+                       k_ph1=k_ph1, k_ph2=k_ph2, t=t, image_field=image_field, holo_phase=holo_phase, 
+                       efficiency=efficiency, uniformity=uniformity, rng_keys=rng_keys, rng_pos=rng_pos, 
+                       rng_has_gauss=rng_has_gauss, rng_gauss=rng_gauss)
     
     # First loop - continous phase screen computation
-    for k in range(n_iter_ph1):
+    for k in range(k_ph1, n_iter_ph1):
         cont+=1
         holo_field = np.fft.ifft2(np.fft.ifftshift(image_field))  # field ifta = TF-1 field image
         holo_amp = AmpDiscretization(holo_field, k+1)               # amplitude discretization
         holo_phase = np.angle(holo_field)                         # save ifta phase
-        holo_phase_fields[cont] = holo_phase                      # save holo phase from each iteration
+        holo_phase_fields[cont*keep_history] = holo_phase         # save holo phase from each iteration
         holo_field = holo_amp*np.exp(holo_phase * 1j)                      # force the module of holo_field to 1 (no losses)
         image_field = np.fft.fftshift(np.fft.fft2(holo_field))    # field image = TF field ifta
+        if throttle:
+            throttle(done+cont, holo_phase, image_field)          # live preview
         image_phase = np.angle(image_field)                       # save image phase
         image_amp[image_size[0]//2-target_size[0]//2:image_size[0]//2-target_size[0]//2+target_size[0], 
                   image_size[1]//2-target_size[1]//2:
@@ -401,21 +462,62 @@ def IftaImproved(target, *, image_size=None, n_iter_ph1=25, n_iter_ph2 = 25, rfa
             uniformity[k] = ComputeUniformity(holo_phase, image_amp)
         
         if callback:
-            callback(int((cont)/total*100))
+            callback(int((done+cont)/total*100))
+
+        if checkpoint_path and ((k+1) % checkpoint_every == 0 or k+1 == n_iter_ph1):
+            Checkpoint(k+1, 0, 0.)
 
 
     # Second loop - discretized phase screen
 
-    if n_levels != 0:
-        delta_phases = np.linspace(0, np.pi/n_levels, n_iter_ph2)
-        for k in range(n_iter_ph2):
+    if n_levels == 2 and real_fft:
+        image_amp[image_size[0]//2-target_size[0]//2:
+                  image_size[0]//2-target_size[0]//2+target_size[0], 
+                  image_size[1]//2-target_size[1]//2:image_size[1]//2-target_size[1]//2+
+                  target_size[1]] = rfact*target_amp                   # force the amplitude inside the ROI
+        image_amp_half = HalfSpectrum(HermitianAmplitude(np.fft.ifftshift(image_amp)))  # reachable amplitude, half plane
+        if k_ph2 == 0:                                                # a resumed second loop is already halved
+            image_field = HalfSpectrum(np.fft.ifftshift(image_field)) # non redundant half of the image field
+
+        for k in range(k_ph2, n_iter_ph2):
+            cont += 1
+            holo_field = np.fft.irfft2(image_field, s=image_size)     # real field ifta = TF-1 field image
+            holo_phase = np.where(holo_field < 0, np.pi, 0.)          # binary phase, 0 or pi
+            holo_phase_fields[cont*keep_history] = holo_phase         # save holo phase from each iteration
+            holo_field = np.where(holo_field < 0, -1., 1.)            # exp(1j*holo_phase) = +-1 (no losses)
+            image_field = np.fft.rfft2(holo_field)                    # half image = TF du ifta
+            if throttle:
+                throttle(done+cont, holo_phase)                       # live preview
+            image_phase = np.angle(image_field)                       # save image phase
+            image_field = image_amp_half*np.exp(image_phase * 1j)     # new image field computation
+            
+            if compute_efficiency:
+                efficiency[k] = ComputeEfficiency(holo_phase, image_amp, n_levels)
+                
+            if compute_uniformity:
+                uniformity[k] = ComputeUniformity(holo_phase, image_amp, n_levels)
+        
+            if callback:
+                callback(int((done+cont)/total*100))
+
+            if checkpoint_path and ((k+1) % checkpoint_every == 0 or k+1 == n_iter_ph2):
+                Checkpoint(n_iter_ph1, k+1, 1.)
+
+    elif n_levels != 0:
+        positions = np.linspace(0, 1, n_iter_ph2)               # position in the schedule, 0 .. 1
+        if 0 < k_ph2 < n_iter_ph2:                              # resumed : remaining iterations from the last position
+            positions[k_ph2:] = np.linspace(float(resume_state["t"]), 1, n_iter_ph2 - k_ph2 + 1)[1:]
+        delta_phases = np.pi/n_levels*positions**delta_power
+        for k in range(k_ph2, n_iter_ph2):
             cont += 1
             holo_field = np.fft.ifft2(np.fft.ifftshift(image_field))  # field ifta = TF-1 field image
             holo_amp = AmpDiscretization(holo_field, 100)             # amplitude discretization
             holo_phase = PhaDiscretization(holo_field, n_levels, delta_phases[k])      # phase Discretization
-            holo_phase_fields[cont] = holo_phase                      # save holo phase from each iteration
+            holo_phase_fields[cont*keep_history] = holo_phase         # save holo phase from each iteration
             holo_field = holo_amp*np.exp(holo_phase * 1j)                      # force the amplitude of the ifta to 1 (no losses)
             image_field = np.fft.fftshift(np.fft.fft2(holo_field))    # image = TF du ifta
+            if throttle:
+                throttle(done+cont, holo_phase, image_field)          # live preview
             image_phase = np.angle(image_field)                       # save image phase
             image_amp[image_size[0]//2-target_size[0]//2:
                       image_size[0]//2-target_size[0]//2+target_size[0], 
@@ -430,6 +532,157 @@ def IftaImproved(target, *, image_size=None, n_iter_ph1=25, n_iter_ph2 = 25, rfa
             if compute_uniformity:
                 uniformity[k] = ComputeUniformity(holo_phase, image_amp)
         
+            if callback:
+                callback(int((done+cont)/total*100))
+
+            if checkpoint_path and ((k+1) % checkpoint_every == 0 or k+1 == n_iter_ph2):
+                Checkpoint(n_iter_ph1, k+1, positions[k])
+
+    if compute_efficiency and not(compute_uniformity):
+        return holo_phase_fields, efficiency
+    
+    if compute_uniformity and not(compute_efficiency):
+        return holo_phase_fields, uniformity
+    
+    if compute_efficiency and compute_uniformity:
+        return holo_phase_fields, efficiency, uniformity
+
+    return holo_phase_fields
+
+
+def IftaFresnel(target, *, wavelength, distance, dx, image_size=None, method="fresnel", n_iter_ph1=25, n_iter_ph2=25, 
+                rfact=1.2, n_levels=0, compute_efficiency=0, compute_uniformity=0, seed=0, keep_history=True,
+                preview=None, preview_every=10, preview_interval=0.5, callback=None):
+
+    """
+    IftaFresnel : Gerchberg-Saxton loop between the DOE and a target plane at finite distance
+    
+    Author : Bao Chau Tran
+    Status : in progress
+    Last update : 2025.07.01
+    Comments : same two loops as IftaImproved, the Fourier transforms being replaced by free space propagation 
+               over distance (forward kernel) and back (conjugated kernel). The target is given in the 
+               spatial image plane, sampled like the DOE (dx). Both kernels are computed once per run.
+    
+    Inputs : MANDATORY : target {2D float np.array}[Irradiance] : image we want to get at distance under plane wave illumination  
+                         wavelength {float} : same unit as dx
+                         distance {float} : DOE - target plane distance, same unit as dx
+                         dx {float} : pixel size of the DOE and of the target plane
+    
+              OPTIONAL :  image_size {tupple (1x2)}[pixel] : size of the image plane, is equal to holo_size
+                                                             default value = target.shape
+                          method {str} : "fresnel" or "angular_spectrum", see tools.PropagationKernel
+                          n_iter_ph1, n_iter_ph2 : number of iterations of each loop of the algorithm {int} - default value = 25
+                          r_fact : reinforcment factor. Forces the energy to stay in the ROI - default value = 1.2
+                          n_levels : number of levels over which the phase will be discretized 
+                                    default value = 0 : no Discretization
+                          compute_efficiency {bool} : If 1, efficiency is computed and returned along the loop
+                                                      default value = 0
+                          compute_uniformity {bool} : If 1, uniformity is computed and returned along the loop
+                                                      default value = 0
+                          seed : int (random initial phase) or initial image phase {2D np.array}
+                          keep_history, preview, preview_every, preview_interval : see IftaImproved
+                          callback : called with the progress in percent after each iteration
+
+    Outputs : holo_phase_fields {3D np.array} : DOE phase of each iteration, 
+              followed by efficiency and / or uniformity when asked, as IftaImproved
+    """
+    if len(target.shape) == 3:
+        target = target.squeeze()
+
+    if compute_efficiency and n_levels == 0:  # memory allocation
+        efficiency = np.zeros(n_iter_ph1)   
+    else: 
+        efficiency = np.zeros(n_iter_ph2)   
+
+    if compute_uniformity and n_levels == 0:  # memory allocation
+        uniformity = np.zeros(n_iter_ph1) 
+    else:
+        uniformity = np.zeros(n_iter_ph2) 
+    
+    target_size = target.shape
+    
+    target_amp = np.asarray(target, float)       # conversion target to float
+    target_amp = np.sqrt(target_amp)             # get target amplitude
+    
+    if image_size == None:
+        image_size = target_size
+    image_amp = np.zeros(image_size)             # Amplitude output field = 0
+    roi = (slice(image_size[0]//2-target_size[0]//2, image_size[0]//2-target_size[0]//2+target_size[0]),
+           slice(image_size[1]//2-target_size[1]//2, image_size[1]//2-target_size[1]//2+target_size[1]))
+    image_amp[roi] = target_amp                  # Amplitude = target image in window
+    
+    kernel = PropagationKernel(image_size, wavelength, distance, dx, method) # DOE -> target plane
+    kernel_back = np.conj(kernel)                                            # target plane -> DOE
+
+    if type(seed) == int:
+        image_phase = 2*np.pi*np.random.rand(image_size[0], image_size[1]) # Random image phase
+    else:
+        image_phase = seed
+
+    cont = 0
+    h,w = image_phase.shape
+    if not keep_history:
+        shape = (1, h, w)
+    elif n_levels != 0:
+        shape = (n_iter_ph1 + n_iter_ph2 + 1, h, w)
+    else:
+        shape = (n_iter_ph1 + 1, h, w)
+    holo_phase_fields = np.zeros(shape)
+    holo_phase_fields[cont] = image_phase   
+
+    total = n_iter_ph1 + n_iter_ph2     # Number of operations
+
+    image_field = image_amp*np.exp(1j * image_phase)      # Initiate input field
+    image_amp[roi] = rfact*target_amp                     # force the energy to stay in the ROI
+
+    throttle = PreviewThrottle(preview, total, preview_every, preview_interval, kernel=kernel) if preview else None
+    
+    # First loop - continous phase screen computation
+    for k in range(n_iter_ph1):
+        cont+=1
+        holo_field = np.fft.ifft2(np.fft.fft2(image_field)*kernel_back)  # back propagation to the DOE
+        holo_amp = AmpDiscretization(holo_field, k+1)               # amplitude discretization
+        holo_phase = np.angle(holo_field)                         # save ifta phase
+        holo_phase_fields[cont*keep_history] = holo_phase         # save holo phase from each iteration
+        holo_field = holo_amp*np.exp(holo_phase * 1j)             # force the module of holo_field to 1 (no losses)
+        image_field = np.fft.ifft2(np.fft.fft2(holo_field)*kernel)  # propagation to the target plane
+        if throttle:
+            throttle(cont, holo_phase, image_field)               # live preview
+        image_phase = np.angle(image_field)                       # save image phase
+        image_field = image_amp*np.exp(image_phase * 1j)          # new image field, amplitude free outside the ROI
+        
+        if n_levels ==0 and compute_efficiency:
+            efficiency[k] = ComputeEfficiency(holo_phase, image_amp, kernel=kernel)
+            
+        if n_levels ==0 and compute_uniformity:
+            uniformity[k] = ComputeUniformity(holo_phase, image_amp, kernel=kernel)
+        
+        if callback:
+            callback(int((cont)/total*100))
+
+    # Second loop - discretized phase screen
+    if n_levels != 0:
+        delta_phases = np.linspace(0, np.pi/n_levels, n_iter_ph2)
+        for k in range(n_iter_ph2):
+            cont += 1
+            holo_field = np.fft.ifft2(np.fft.fft2(image_field)*kernel_back)  # back propagation to the DOE
+            holo_amp = AmpDiscretization(holo_field, 100)             # amplitude discretization
+            holo_phase = PhaDiscretization(holo_field, n_levels, delta_phases[k])      # phase Discretization
+            holo_phase_fields[cont*keep_history] = holo_phase         # save holo phase from each iteration
+            holo_field = holo_amp*np.exp(holo_phase * 1j)             # force the amplitude of the ifta to 1 (no losses)
+            image_field = np.fft.ifft2(np.fft.fft2(holo_field)*kernel)  # propagation to the target plane
+            if throttle:
+                throttle(cont, holo_phase, image_field)               # live preview
+            image_phase = np.angle(image_field)                       # save image phase
+            image_field = image_amp*np.exp(image_phase * 1j)          # new image field computation
+            
+            if compute_efficiency:
+                efficiency[k] = ComputeEfficiency(holo_phase, image_amp, kernel=kernel)
+                
+            if compute_uniformity:
+                uniformity[k] = ComputeUniformity(holo_phase, image_amp, kernel=kernel)
+        
             if callback:
                 callback(int((cont)/total*100))
 
@@ -445,6 +698,225 @@ def IftaImproved(target, *, image_size=None, n_iter_ph1=25, n_iter_ph2 = 25, rfa
     return holo_phase_fields
 
 
+def IftaMultiPlane(targets, planes, *, dx, image_size=None, method="fresnel", weights=None, n_iter_ph1=25, n_iter_ph2=25, 
+                   rfact=1.2, n_levels=0, compute_efficiency=0, compute_uniformity=0, seed=0, planes_per_iter=None, 
+                   max_time=None, callback=None):
+
+    """
+    IftaMultiPlane : Gerchberg-Saxton loop with several target planes (distances and / or wavelengths)
+    
+    Author : Bao Chau Tran
+    Status : in progress
+    Last update : 2025.07.01
+    Comments : every iteration propagates the DOE to all the (selected) planes as one batched FFT, with one 
+               propagation kernel per plane computed once per run. Planes sharing a wavelength share the forward 
+               spectrum of the DOE, and their back propagations are summed in the Fourier domain before a single 
+               inverse FFT. The DOE phase is defined at the first wavelength, at wavelength l it is scaled by 
+               planes[0][0]/l (thin DOE, no dispersion). The estimates of each wavelength are combined weighted by 
+               their amplitude, the phase of wavelength l being the DOE phase of the iteration corrected by 
+               angle(field*exp(-1j*scale*phase))/scale : dividing the wrapped phase of the field by the scale would 
+               cut the DOE phase into steps at every wrap. The DOE amplitude is forced to 1 at each iteration : the sum of the estimates of
+               several planes already relaxes the constraint, the amplitude discretization of IftaImproved only 
+               slows the convergence down here.
+               By default every plane is used at each iteration, so the cost of an iteration grows linearly with the 
+               number of planes. With planes_per_iter, only a rotating subset of the planes is used at each iteration, 
+               so the cost of an iteration does not depend on the number of planes. With max_time [s], the loops stop when the time is
+               over. The last phase is then discretized over n_levels.
+    
+    Inputs : MANDATORY : targets {3D float np.array or list of 2D np.array}[Irradiance] : one image per plane
+                         planes {list of tupple (1x2)} : (wavelength, distance) of each plane, same unit as dx
+                         dx {float} : pixel size of the DOE and of the target planes
+    
+              OPTIONAL :  image_size {tupple (1x2)}[pixel] : size of the image planes, is equal to holo_size
+                                                             default value = targets[0].shape
+                          method {str} : "fresnel" or "angular_spectrum", see tools.PropagationKernel
+                          weights {list of float} : importance of each plane - default value = 1 for every plane
+                          n_iter_ph1, n_iter_ph2 : number of iterations of each loop of the algorithm {int} - default value = 25
+                          r_fact : reinforcment factor. Forces the energy to stay in the ROI - default value = 1.2
+                          n_levels : number of levels over which the phase will be discretized 
+                                    default value = 0 : no Discretization
+                          compute_efficiency {bool} : If 1, efficiency of each plane is computed and returned along the loop,
+                                                      from the fields of the iteration (nan for the planes outside the batch)
+                          compute_uniformity {bool} : If 1, uniformity of each plane is computed and returned along the loop,
+                                                      idem
+                          seed : int (random initial phases) or initial image phases {3D np.array}
+                          planes_per_iter {int} : number of planes used at each iteration - default value = all
+                          max_time {float}[s] : time limit of the computation - default value = None (no limit)
+                          callback : called with the progress in percent after each iteration
+
+    Outputs : holo_phase_fields {3D np.array} : DOE phase of each iteration, 
+              followed by efficiency and / or uniformity {2D np.array (n_iter, n_planes)} when asked
+    """
+    start = time.perf_counter()
+
+    targets = [np.asarray(target, float).squeeze() for target in targets]
+    n_planes = len(targets)
+    if len(planes) != n_planes:
+        raise ValueError("One (wavelength, distance) plane is needed per target")
+
+    if weights is None:
+        weights = np.ones(n_planes)
+    weights = np.asarray(weights, float)
+    
+    if planes_per_iter is None:
+        planes_per_iter = n_planes
+    planes_per_iter = min(planes_per_iter, n_planes)
+
+    n_iter = n_iter_ph1 + n_iter_ph2 if n_levels != 0 else n_iter_ph1
+    efficiency = np.full((n_iter, n_planes), np.nan)    # memory allocation, nan for the planes outside the batch
+    uniformity = np.full((n_iter, n_planes), np.nan)
+    
+    target_size = targets[0].shape
+    if image_size == None:
+        image_size = target_size
+
+    image_amps = np.zeros((n_planes,) + tuple(image_size))   # Amplitude output fields = 0
+    roi = (slice(image_size[0]//2-target_size[0]//2, image_size[0]//2-target_size[0]//2+target_size[0]),
+           slice(image_size[1]//2-target_size[1]//2, image_size[1]//2-target_size[1]//2+target_size[1]))
+    for p, target in enumerate(targets):
+        image_amps[p][roi] = rfact*np.sqrt(target)           # Amplitude = target image in window
+    
+    wavelengths = np.array([plane[0] for plane in planes], float)
+    scales = wavelengths[0]/wavelengths                       # phase scaling of the DOE for each wavelength
+    kernels = np.stack([PropagationKernel(image_size, wavelength, distance, dx, method) 
+                        for wavelength, distance in planes])  # DOE -> planes, computed once
+
+    if type(seed) == int:
+        image_phases = 2*np.pi*np.random.rand(n_planes, image_size[0], image_size[1]) # Random image phases
+    else:
+        image_phases = seed
+
+    def BackPropagation(image_fields, batch, reference=0.):
+        # DOE field estimated from the image fields of the batch, the planes are summed per wavelength.
+        # reference : DOE phase the fields were propagated from, the phase of each wavelength is unscaled around it
+        spectra = np.fft.fft2(image_fields)*np.conj(kernels[batch])*weights[batch, np.newaxis, np.newaxis]
+        holo_field = 0
+        for scale in np.unique(scales[batch]):
+            group = scales[batch] == scale
+            field = np.fft.ifft2(np.sum(spectra[group], axis=0))
+            phase = reference + np.angle(field*np.exp(-1j*scale*reference))/scale
+            holo_field = holo_field + np.abs(field)*np.exp(1j*phase)
+        return holo_field
+
+    def Propagation(holo_phase, batch):
+        # fields in the planes of the batch, one DOE spectrum per wavelength
+        spectra = np.empty((len(batch),) + tuple(image_size), complex)
+        for scale in np.unique(scales[batch]):
+            group = scales[batch] == scale
+            spectra[group] = np.fft.fft2(np.exp(1j*scale*holo_phase))
+        return np.fft.ifft2(spectra*kernels[batch])
+
+    cont = 0
+    shape = (n_iter + 1,) + tuple(image_size)
+    holo_phase_fields = np.zeros(shape)
+
+    all_planes = np.arange(n_planes)
+    holo_field = BackPropagation(image_amps*np.exp(1j*image_phases), all_planes)  # Initiate DOE field
+    holo_phase_fields[cont] = np.angle(holo_field)
+
+    if n_levels != 0:
+        delta_phases = np.linspace(0, np.pi/n_levels, n_iter_ph2)
+
+    for k in range(n_iter):
+        cont += 1
+        batch = (k*planes_per_iter + np.arange(planes_per_iter)) % n_planes     # rotating subset of planes
+
+        if k < n_iter_ph1:   # First loop - continous phase screen computation
+            holo_phase = np.angle(holo_field)
+        else:                # Second loop - discretized phase screen
+            holo_phase = PhaDiscretization(holo_field, n_levels, delta_phases[k-n_iter_ph1])
+        holo_phase_fields[cont] = holo_phase                                  # save holo phase from each iteration
+
+        image_fields = Propagation(holo_phase, batch)                         # propagation to the planes, no losses
+
+        if compute_efficiency or compute_uniformity:                         # images of the batch, no extra FFT
+            recoveries = np.absolute(image_fields)**2
+            for recovery, p in zip(recoveries, batch):
+                roi_recovery = recovery[image_amps[p] != 0]
+                if compute_efficiency:
+                    efficiency[k, p] = np.sum(roi_recovery)/np.sum(recovery)
+                if compute_uniformity:
+                    uniformity[k, p] = (np.max(roi_recovery)-np.min(roi_recovery))/(np.max(roi_recovery)+np.min(roi_recovery))
+
+        image_fields = image_amps[batch]*np.exp(1j*np.angle(image_fields))    # force the amplitude in the ROIs
+        holo_field = BackPropagation(image_fields, batch, holo_phase)         # back propagation to the DOE
+
+        if callback:
+            callback(int((cont)/n_iter*100))
+
+        if max_time is not None and time.perf_counter() - start > max_time:
+            holo_phase_fields[cont] = Discretization(holo_phase, n_levels)    # stop with a manufacturable DOE
+            break
+
+    holo_phase_fields = holo_phase_fields[:cont+1]
+    efficiency = efficiency[:cont]
+    uniformity = uniformity[:cont]
+
+    if compute_efficiency and not(compute_uniformity):
+        return holo_phase_fields, efficiency
+    
+    if compute_uniformity and not(compute_efficiency):
+        return holo_phase_fields, uniformity
+    
+    if compute_efficiency and compute_uniformity:
+        return holo_phase_fields, efficiency, uniformity
+
+    return holo_phase_fields
+
+
+def IftaResume(checkpoint_path, *, n_iter_ph1=None, n_iter_ph2=None, checkpoint_every=10, keep_history=True, 
+               preview=None, callback=None):
+    """
+    IftaResume : continue an IftaImproved run from its checkpoint file
+    
+    Author : Bao Chau Tran
+    Status : in progress
+    Last update : 2025.07.03
+    Comments : the run continues as if it had not been stopped, with the same target and parameters.
+               n_iter_ph1 and n_iter_ph2 can be changed, e.g. to add iterations to a finished run. If n_iter_ph2
+               changes during the second loop, the remaining iterations go from the last delta_phases position
+               to the end of the schedule. The checkpoint file keeps being updated.
+               The history only contains the phases computed after the resume, its first element being the last
+               phase of the checkpoint. The metric arrays contain the values of the whole run.
+    
+    Inputs : MANDATORY : checkpoint_path {str} : file written by IftaImproved(..., checkpoint_path=...)
+    
+              OPTIONAL :  n_iter_ph1, n_iter_ph2 {int} : new number of iterations of each loop
+                                                         default value = None : unchanged
+                          checkpoint_every, keep_history, preview, callback : see IftaImproved
+
+    Outputs : same as IftaImproved
+    """
+
+    state = LoadCheckpoint(checkpoint_path)
+
+    if n_iter_ph1 is None:
+        n_iter_ph1 = int(state["n_iter_ph1"])
+    if n_iter_ph2 is None:
+        n_iter_ph2 = int(state["n_iter_ph2"])
+    if n_iter_ph1 < int(state["k_ph1"]):
+        raise ValueError(f"The checkpoint already has {int(state['k_ph1'])} iterations in the first loop")
+
+    return IftaImproved(state["target"], image_size=tuple(int(n) for n in state["image_size"]), 
+                        n_iter_ph1=n_iter_ph1, n_iter_ph2=n_iter_ph2, rfact=float(state["rfact"]), 
+                        n_levels=int(state["n_levels"]), compute_efficiency=int(state["compute_efficiency"]), 
+                        compute_uniformity=int(state["compute_uniformity"]), delta_power=float(state["delta_power"]), 
+                        real_fft=bool(state.get("real_fft", True)), 
+                        keep_history=keep_history, checkpoint_path=checkpoint_path, checkpoint_every=checkpoint_every, 
+                        resume_state=state, preview=preview, callback=callback)
+
+
+def SaveCheckpoint(checkpoint_path, **state):
+    # atomic write : the previous checkpoint stays valid if the program stops while writing
+    temporary_path = checkpoint_path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        np.savez(file, **state)
+    os.replace(temporary_path, checkpoint_path)
+
+def LoadCheckpoint(checkpoint_path):
+    with np.load(checkpoint_path) as data:
+        return {key: data[key] for key in data.files}
+
 def AmpDiscretization(holo_field, iter_):
     holo_amp = np.abs(holo_field)
     top = holo_amp.max()/(1.2 + 12.0/iter_)
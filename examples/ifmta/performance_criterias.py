@@ -8,10 +8,14 @@ Created on Fri Mar 22 15:57:04 2024
 #%% 8<-------------------------------------- Import modules -----------------------------------
 
 import numpy as np
+try:
+    from ifmta.tools import HalfSpectrumCount
+except:
+    from tools import HalfSpectrumCount
 
 #%% 8<--------------------------------------- Functions definitions ------------------------------
 
-def ComputeEfficiency(phase_holo, target):
+def ComputeEfficiency(phase_holo, target, n_levels=0, kernel=None):
     """
     ComputeEfficiency : compute the efficiency of an hologram
     
@@ -23,17 +27,30 @@ def ComputeEfficiency(phase_holo, target):
       
     Inputs : MANDATORY : phase_holo : phase mask corresponding to the hologram to characterize
                          target : target image used during the IFTA process
+             OPTIONAL : n_levels : number of phase levels of phase_holo. With n_levels = 2 the hologram is real,
+                                   only half of its hermitian spectrum is computed (rfft2)
+                        kernel : propagation kernel (see tools.PropagationKernel) when the image is formed at
+                                 a finite distance. target is then given in the spatial image plane
              
     Outputs : efficiency, percentage of the light that end up in the illuminated zones planned by target
     """
     
-    
+    if kernel is not None:
+        recovery = np.absolute(np.fft.ifft2(np.fft.fft2(np.exp(1j*phase_holo))*kernel))**2 # Image at distance z
+        return np.sum(recovery[target!=0])/np.sum(recovery)
+
+    if n_levels == 2:
+        recovery = np.absolute(np.fft.rfft2(np.cos(phase_holo)))**2                  # Half of |TF field DOE|^2
+        count = HalfSpectrumCount(np.fft.ifftshift(target!=0))                         # ROI pixels k and -k
+        total = HalfSpectrumCount(np.ones(phase_holo.shape, dtype=bool))               # every pixel k and -k
+        return np.sum(recovery*count)/np.sum(recovery*total)
+
     recovery = np.absolute(np.fft.fftshift(np.fft.fft2(np.exp(1j*phase_holo))))**2 # Final image = |TF field DOE|^2
     efficiency = np.sum(recovery[target!=0])/np.sum(recovery)
     
     return efficiency
 
-def ComputeUniformity(phase_holo, target):
+def ComputeUniformity(phase_holo, target, n_levels=0, kernel=None):
     """
     ComputeUniformity : compute the uniformity of an hologram
     
@@ -45,11 +62,25 @@ def ComputeUniformity(phase_holo, target):
       
     Inputs : MANDATORY : phase_holo : phase mask corresponding to the hologram to characterize
                          target : target image used during the IFTA process
+             OPTIONAL : n_levels : number of phase levels of phase_holo. With n_levels = 2 the hologram is real,
+                                   only half of its hermitian spectrum is computed (rfft2)
+                        kernel : propagation kernel (see tools.PropagationKernel) when the image is formed at
+                                 a finite distance. target is then given in the spatial image plane
              
     Outputs : uniformity, (Irradiance_max - Irradiance_min) / (Irradiance_max + Irradiance_min)
               of the image formed by phase_holo
     """
     
+    if kernel is not None:
+        recovery = np.absolute(np.fft.ifft2(np.fft.fft2(np.exp(1j*phase_holo))*kernel))**2 # Image at distance z
+        recovery = recovery[target!=0]
+        return (np.max(recovery)-np.min(recovery))/(np.max(recovery)+np.min(recovery))
+
+    if n_levels == 2:
+        recovery = np.absolute(np.fft.rfft2(np.cos(phase_holo)))**2                  # Half of |TF field DOE|^2
+        recovery = recovery[HalfSpectrumCount(np.fft.ifftshift(target!=0)) > 0]       # I(-k) = I(k)
+        return (np.max(recovery)-np.min(recovery))/(np.max(recovery)+np.min(recovery))
+
     recovery = np.absolute(np.fft.fftshift(np.fft.fft2(np.exp(1j*phase_holo))))**2 # Final image = |TF field DOE|^2
     recovery = recovery[target!=0]
     uniformity = (np.max(recovery)-np.min(recovery))/(np.max(recovery)+np.min(recovery))
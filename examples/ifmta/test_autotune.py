@@ -0,0 +1,34 @@
+import numpy as np
+
+from autotune import IftaAutotune
+
+
+def Target():
+    target = np.zeros((32, 32))
+    target[10:22, 12:20] = 1
+    return target
+
+
+def test_rungs_shrink_by_eta():
+    best, best_phase, results = IftaAutotune(Target(), n_candidates=9, eta=3, min_iter=2, max_iter=18, max_workers=2)
+    rungs = [result["rung"] for result in results]
+    assert [rungs.count(rung) for rung in range(3)] == [9, 3, 1]
+    assert [results[rungs.index(rung)]["budget"] for rung in range(3)] == [2, 6, 18]
+    assert best["budget"] == 18
+    assert best_phase.shape == (32, 32)
+
+
+def test_max_time_limits_the_runs():
+    best, best_phase, results = IftaAutotune(Target(), n_candidates=9, eta=3, min_iter=2, max_iter=18, max_workers=2,
+                                             max_time=0)
+    assert len(results) == 1                  # the first run of the first rung only
+    assert best is results[0] and best_phase is not None
+
+
+def test_unquantized_runs_spend_the_whole_budget_in_the_first_loop():
+    best, best_phase, results = IftaAutotune(Target(), n_levels=0, n_candidates=9, eta=3, min_iter=2, max_iter=18,
+                                             max_workers=2)
+    for result in results:
+        assert (result["n_iter_ph1"], result["n_iter_ph2"]) == (result["budget"], 0)
+        assert "ph1_ratio" not in result and "delta_power" not in result
+    assert len({result["rfact"] for result in results if result["rung"] == 0}) == 9
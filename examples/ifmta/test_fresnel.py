@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from ifta import IftaFresnel
+from performance_criterias import ComputeEfficiency
+from tools import Discretization, PropagationKernel
+
+
+def Target(shape=(48, 48)):
+    target = np.zeros(shape)
+    target[14:20, 12:36] = 1
+    target[24:34, 20:26] = 1
+    return target
+
+
+@pytest.mark.parametrize("method", ["fresnel", "angular_spectrum"])
+def test_kernel_round_trip(method):
+    field = np.random.default_rng(0).standard_normal((16, 20)) + 0j
+    kernel = PropagationKernel(field.shape, 0.5, 300.0, 2.0, method)
+    # no evanescent waves at this sampling (1 / dx < 2 / wavelength) : the back propagation is exact
+    np.testing.assert_allclose(np.abs(kernel), 1)
+    np.testing.assert_allclose(np.fft.ifft2(np.fft.fft2(np.fft.ifft2(np.fft.fft2(field)*kernel))*np.conj(kernel)),
+                               field, atol=1e-12)
+
+
+def test_fresnel_kernel_is_paraxial_angular_spectrum():
+    shape, wavelength, z, dx = (64, 64), 0.5, 1e3, 10.0
+    fresnel = PropagationKernel(shape, wavelength, z, dx, "fresnel")
+    exact = PropagationKernel(shape, wavelength, z, dx, "angular_spectrum")
+    # the constant phase exp(ikz) is dropped by both : phase error k z (wavelength f)^4 / 8 < 3e-3 up to f = 1 / (2 dx)
+    np.testing.assert_allclose(fresnel, exact, atol=3e-3)
+
+
+@pytest.mark.parametrize("method", ["fresnel", "angular_spectrum"])
+def test_design_focuses_in_the_target(method):
+    wavelength, distance, dx = 0.5, 2e3, 4.0
+    phases, efficiency = IftaFresnel(Target(), wavelength=wavelength, distance=distance, dx=dx, method=method,
+                                     n_iter_ph1=15, n_iter_ph2=10, n_levels=4, compute_efficiency=1, seed=0)
+    kernel = PropagationKernel(Target().shape, wavelength, distance, dx, method)
+    np.testing.assert_allclose(np.exp(1j*phases[-1]), np.exp(1j*Discretization(phases[-1], 4)), atol=1e-12)
+    assert efficiency[-1] == pytest.approx(ComputeEfficiency(phases[-1], Target(), kernel=kernel))
+    assert efficiency[-1] > 0.7
@@ -0,0 +1,58 @@
+import numpy as np
+
+from gradient import GradientDesign, PhaseLoss, SoftQuantization
+from ifta import IftaImproved
+from tools import PropagationKernel
+
+
+def Target(shape=(64, 64)):
+    target = np.zeros(shape)
+    target[shape[0]*3//8:shape[0]*5//8, shape[1]*5//16:shape[1]*11//16] = 1
+    return target
+
+
+def FiniteDifference(phase, target, pixels, eps=1e-6, **kwargs):
+    gradient = []
+    for pixel in pixels:
+        plus, minus = phase.copy(), phase.copy()
+        plus[pixel] += eps
+        minus[pixel] -= eps
+        gradient.append((PhaseLoss(plus, target, **kwargs)[0] - PhaseLoss(minus, target, **kwargs)[0])/(2*eps))
+    return np.array(gradient)
+
+
+def test_phase_loss_gradient():
+    rng = np.random.default_rng(0)
+    phase = 2*np.pi*rng.random((16, 16))
+    target = Target((16, 16))*(1 + rng.random((16, 16)))
+    pixels = [tuple(pixel) for pixel in rng.integers(0, 16, (12, 2))] + [(8, 8)]
+    for kwargs in ({}, {"weight_zero_order": 2.}, {"kernel": PropagationKernel((16, 16), 0.5, 200., 2.)}):
+        _, gradient, _ = PhaseLoss(phase, target, **kwargs)
+        expected = FiniteDifference(phase, target, pixels, **kwargs)
+        np.testing.assert_allclose([gradient[pixel] for pixel in pixels], expected, rtol=1e-5, atol=1e-9)
+
+
+def test_soft_quantization_limits():
+    phase = np.linspace(0.1, 2*np.pi - 0.1, 50)
+    np.testing.assert_array_equal(SoftQuantization(phase, 4, 0.)[0], phase)
+    step = np.pi/2
+    levels = SoftQuantization(phase, 4, 1e3)[0]/step
+    np.testing.assert_allclose(levels, np.round(levels), atol=1e-9)
+
+
+def test_evaluations_capped_at_n_iter():
+    for n_levels in (0, 4):
+        np.random.seed(0)
+        _, uniformity = GradientDesign(Target(), n_iter=40, n_levels=n_levels, compute_uniformity=1)
+        assert len(uniformity) == 40
+
+
+def test_fewer_ffts_than_ifta():
+    # uniformity IftaImproved reaches in 50 iterations (2 FFTs each) from the same random phase
+    np.random.seed(0)
+    _, ifta_uniformity = IftaImproved(Target(), n_iter_ph1=50, n_iter_ph2=0, compute_uniformity=1)
+    np.random.seed(0)
+    _, uniformity = GradientDesign(Target(), n_iter=50, target_uniformity=ifta_uniformity[-1], compute_uniformity=1)
+    assert uniformity[-1] <= ifta_uniformity[-1]
+    # 2 FFTs per evaluation : fewer than 50 FFTs, half of the 100 FFTs of the IFTA
+    assert len(uniformity) < 25
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from ifta import IftaImproved, IftaMultiPlane
+from performance_criterias import ComputeEfficiency, ComputeUniformity
+from tools import IsBinaryPhase, PropagationKernel
+
+
+def Target(shape=(32, 32)):
+    target = np.zeros(shape)
+    target[8:14, 10:24] = 1
+    target[18:26, 14:18] = 1
+    return target
+
+
+def test_real_fft_binary_loop_has_no_schedule():
+    with pytest.raises(ValueError):
+        IftaImproved(Target(), n_iter_ph1=2, n_iter_ph2=2, n_levels=2, delta_power=2., real_fft=1)
+    # the default soft quantized complex loop takes the schedule
+    phases = IftaImproved(Target(), n_iter_ph1=2, n_iter_ph2=4, n_levels=2, delta_power=2., keep_history=False)
+    assert IsBinaryPhase(phases[-1])
+
+
+@pytest.mark.parametrize("symmetric", [False, True])
+def test_real_fft_binary_loop_against_the_complex_loop(symmetric):
+    # the real FFT loop gives at most a few % of efficiency away (more on targets that are not point symmetric) for a
+    # better uniformity
+    target = Target((64, 64))
+    if symmetric:
+        target = np.maximum(target, target[::-1, ::-1])
+    results = {}
+    for real_fft in (0, 1):
+        np.random.seed(0)                           # same random initial phase
+        phase = IftaImproved(target, n_iter_ph1=25, n_iter_ph2=25, n_levels=2, real_fft=real_fft, seed=0,
+                             keep_history=False)[-1]
+        assert IsBinaryPhase(phase)
+        results[real_fft] = ComputeEfficiency(phase, target, 2), ComputeUniformity(phase, target, 2)
+    (efficiency, uniformity), (real_efficiency, real_uniformity) = results[0], results[1]
+    assert real_efficiency > efficiency - (0.03 if symmetric else 0.08)
+    assert real_uniformity < uniformity
+
+
+@pytest.mark.parametrize("planes_per_iter", [None, 1])
+def test_multi_plane_metrics_from_the_batch_fields(planes_per_iter):
+    dx, shape = 1.0, (32, 32)
+    targets = [Target(shape), Target(shape).T]
+    planes = [(0.5, 200.0), (0.6, 300.0)]
+    phases, efficiency, uniformity = IftaMultiPlane(targets, planes, dx=dx, n_iter_ph1=4, n_iter_ph2=3, n_levels=4,
+                                                    compute_efficiency=1, compute_uniformity=1,
+                                                    planes_per_iter=planes_per_iter)
+    assert efficiency.shape == uniformity.shape == (7, 2)
+    for k in range(7):
+        for p, ((wavelength, distance), target) in enumerate(zip(planes, targets)):
+            if planes_per_iter == 1 and k % 2 != p:
+                # plane outside the batch of iteration k
+                assert np.isnan(efficiency[k, p]) and np.isnan(uniformity[k, p])
+                continue
+            # phase of iteration k, scaled to the wavelength of the plane
+            phase = phases[k + 1] * planes[0][0] / wavelength
+            kernel = PropagationKernel(shape, wavelength, distance, dx)
+            assert efficiency[k, p] == pytest.approx(ComputeEfficiency(phase, target, kernel=kernel), rel=1e-9)
+            assert uniformity[k, p] == pytest.approx(ComputeUniformity(phase, target, kernel=kernel), rel=1e-9)
+
+
+def test_multi_wavelength_phases_combined_around_the_doe_phase():
+    # the estimates of the two wavelengths are combined on the branch of their phase closest to the DOE phase,
+    # dividing the wrapped phases by the scale lost a few % of efficiency in the second plane
+    targets = [Target(), Target().T]
+    for seed in range(3):
+        np.random.seed(seed)
+        _, efficiency = IftaMultiPlane(targets, [(0.5, 200.0), (0.6, 300.0)], dx=1.0, n_iter_ph1=30,
+                                       compute_efficiency=1)
+        assert efficiency[-1].min() > 0.65
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from performance_criterias import ComputeEfficiency, ComputeUniformity
+from tools import HalfSpectrum, HalfSpectrumCount, HermitianAmplitude, MirrorSpectrum
+
+
+@pytest.mark.parametrize("shape", [(8, 8), (7, 9), (6, 5)])
+def test_half_spectrum_is_rfft2(shape):
+    field = np.random.default_rng(0).standard_normal(shape)
+    np.testing.assert_allclose(HalfSpectrum(np.fft.fft2(field)), np.fft.rfft2(field), atol=1e-12)
+
+
+@pytest.mark.parametrize("shape", [(8, 8), (7, 9), (6, 5)])
+def test_mirror_spectrum(shape):
+    rng = np.random.default_rng(1)
+    field = rng.standard_normal(shape)
+    spectrum = np.fft.fft2(field)
+    # hermitian spectrum of a real field : E(-k) = conj(E(k))
+    np.testing.assert_allclose(MirrorSpectrum(spectrum), np.conj(spectrum), atol=1e-12)
+    array = rng.standard_normal(shape)
+    np.testing.assert_array_equal(MirrorSpectrum(MirrorSpectrum(array)), array)
+    assert MirrorSpectrum(array)[0, 0] == array[0, 0]
+    assert MirrorSpectrum(array)[1, 2] == array[-1, -2]
+
+
+def test_hermitian_amplitude_is_point_symmetric():
+    amplitude = HermitianAmplitude(np.random.default_rng(2).random((8, 7)))
+    np.testing.assert_allclose(MirrorSpectrum(amplitude), amplitude)
+
+
+@pytest.mark.parametrize("shape", [(8, 8), (7, 9), (6, 5)])
+def test_half_spectrum_count(shape):
+    # point symmetric irradiance I(-k) = I(k) : the half spectrum weighted by the count sums like the full one
+    rng = np.random.default_rng(3)
+    mask = rng.random(shape) < 0.4
+    intensity = np.abs(np.fft.fft2(rng.standard_normal(shape)))**2
+    count = HalfSpectrumCount(mask)
+    assert count.shape == np.fft.rfft2(intensity).shape
+    assert set(np.unique(count)) <= {0, 1, 2}
+    assert np.sum(HalfSpectrum(intensity)*count) == pytest.approx(np.sum(intensity[mask]))
+
+
+def BinaryPhase(shape, seed=0):
+    return np.pi*(np.random.default_rng(seed).random(shape) < 0.5)
+
+
+def Target(shape):
+    target = np.zeros(shape)
+    target[1:4, 2:6] = 1
+    target[shape[0]//2:, shape[1]//2 + 1:] = 0.5            # not point symmetric
+    return target
+
+
+@pytest.mark.parametrize("shape", [(16, 16), (15, 17)])
+def test_binary_criteria_match_the_full_spectrum(shape):
+    # rfft2 path of n_levels = 2 against the complex path
+    phase, target = BinaryPhase(shape), Target(shape)
+    assert ComputeEfficiency(phase, target, 2) == pytest.approx(ComputeEfficiency(phase, target), rel=1e-10)
+    assert ComputeUniformity(phase, target, 2) == pytest.approx(ComputeUniformity(phase, target), rel=1e-10)
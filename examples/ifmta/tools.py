@@ -7,6 +7,7 @@ Created on Thu Feb 29 13:44:30 2024 under Python 3.11.7
 
 # 8<----------------------------------------- Import modules -----------------------------------
 
+import time
 import numpy as np
 
 # 8<--------------------------------------- Functions definitions ------------------------------
@@ -100,6 +101,206 @@ def SoftDiscretization(phase, n_levels, half_interval):
     return phase
 
 
+def HalfSpectrum(spectrum):
+    """
+    HalfSpectrum : return the non redundant half of an unshifted 2D spectrum, as computed by np.fft.rfft2
+
+    Author : Bao Chau Tran
+    Status : done
+    Last update : 2025.07.01
+
+    Comments : the spectrum of a real field is hermitian, E(-k) = conj(E(k)). Only the columns
+               0 .. w//2 are kept, the other ones can be recovered by symmetry.
+
+    Inputs : MANDATORY : spectrum {2D np.array} : spectrum (or image plane amplitude), unshifted
+
+    Outputs : half_spectrum {2D np.array (h, w//2+1)}
+    """
+
+    w = spectrum.shape[-1]
+
+    return spectrum[..., : w // 2 + 1]
+
+
+def MirrorSpectrum(spectrum):
+    """
+    MirrorSpectrum : return the array A(-k) of an unshifted 2D array A(k)
+
+    Author : Bao Chau Tran
+    Status : done
+    Last update : 2025.07.01
+
+    Comments : index n is sent to index (-n) mod N along each axis
+
+    Inputs : MANDATORY : spectrum {2D np.array} : unshifted array
+
+    Outputs : mirrored {2D np.array}
+    """
+
+    h, w = spectrum.shape[-2:]
+
+    return spectrum[..., (-np.arange(h)) % h, :][..., (-np.arange(w)) % w]
+
+
+def HermitianAmplitude(image_amp):
+    """
+    HermitianAmplitude : return the amplitude a binary (real) hologram can reach, closest to image_amp
+
+    Author : Bao Chau Tran
+    Status : done
+    Last update : 2025.07.01
+
+    Comments : the image of a real hologram is point symmetric, I(-k) = I(k). The target irradiance
+               is symmetrized so that no information is lost when only half of the spectrum is kept.
+
+    Inputs : MANDATORY : image_amp {2D np.array} : image plane amplitude, unshifted
+
+    Outputs : amplitude {2D np.array} : sqrt((A(k)^2 + A(-k)^2) / 2)
+    """
+
+    return np.sqrt((image_amp**2 + MirrorSpectrum(image_amp) ** 2) / 2)
+
+
+def HalfSpectrumCount(mask):
+    """
+    HalfSpectrumCount : count how many pixels of the full spectrum each pixel of the half spectrum stands for
+
+    Author : Bao Chau Tran
+    Status : done
+    Last update : 2025.07.01
+
+    Comments : a pixel k of the half spectrum stands for k and -k, except in the columns that are their
+               own mirror (column 0, and column w/2 for even w), where -k is also in the half spectrum.
+
+    Inputs : MANDATORY : mask {2D bool np.array} : pixels to count in the full spectrum, unshifted
+
+    Outputs : count {2D float np.array (h, w//2+1)} : values in {0, 1, 2}
+    """
+
+    w = mask.shape[-1]
+    count = HalfSpectrum(mask.astype(float) + MirrorSpectrum(mask)).copy()
+
+    count[..., 0] = mask[..., 0]
+    if w % 2 == 0:
+        count[..., w // 2] = mask[..., w // 2]
+
+    return count
+
+
+def IsBinaryPhase(phase):
+    """
+    IsBinaryPhase : check whether a phase mask only contains the two levels 0 and pi
+
+    Author : Bao Chau Tran
+    Status : done
+    Last update : 2025.07.01
+
+    Inputs : MANDATORY : phase {np.array}[rad]
+
+    Outputs : True if exp(1j*phase) is real (+1 or -1) everywhere
+    """
+
+    phase = np.remainder(phase, 2 * np.pi)
+
+    return bool(np.all(np.isclose(phase, 0) | np.isclose(phase, np.pi) | np.isclose(phase, 2 * np.pi)))
+
+
+def PropagationKernel(shape, wavelength, z, dx, method="fresnel"):
+    """
+    PropagationKernel : transfer function of free space propagation over a distance z
+
+    Author : Bao Chau Tran
+    Status : done
+    Last update : 2025.07.01
+
+    Comments : the kernel is unshifted (same frequency layout as np.fft.fft2), so that
+               U(z) = ifft2(fft2(U(0)) * kernel) and U(0) = ifft2(fft2(U(z)) * conj(kernel)).
+               Both planes share the sampling dx. The constant phase exp(1j*k*z) is dropped.
+               Evanescent waves are removed by the angular spectrum kernel.
+
+    Inputs : MANDATORY : shape {tuple (1x2)}[pixel] : size of the fields
+                         wavelength {float} : same unit as dx
+                         z {float} : propagation distance, same unit as dx
+                         dx {float} : pixel size
+
+              OPTIONAL : method {str} : "fresnel" (paraxial transfer function) or "angular_spectrum"
+                                        default value = "fresnel"
+
+    Outputs : kernel {2D complex np.array}
+    """
+
+    fy = np.fft.fftfreq(shape[0], d=dx)
+    fx = np.fft.fftfreq(shape[1], d=dx)
+    F2 = fy[:, np.newaxis] ** 2 + fx[np.newaxis, :] ** 2
+
+    if method == "fresnel":
+        kernel = np.exp(-1j * np.pi * wavelength * z * F2)
+
+    elif method == "angular_spectrum":
+        propagating = F2 < 1 / wavelength**2
+        kz = 2 * np.pi * np.sqrt(np.where(propagating, 1 / wavelength**2 - F2, 0))
+        kernel = np.where(propagating, np.exp(1j * kz * z), 0)
+
+    else:
+        raise ValueError(f"Unknown propagation method : {method}")
+
+    return kernel
+
+
+class PreviewThrottle:
+    """
+    PreviewThrottle : send a downsampled preview of a running DOE design every k iterations or every T seconds
+
+    Author : Bao Chau Tran
+    Status : done
+    Last update : 2025.07.03
+
+    Comments : the preview is a dict {"iteration": int, "total": int,
+                                      "phase": 2D uint8 np.array (0 .. 255 for 0 .. 2pi),
+                                      "image": 2D float32 np.array (irradiance of the image plane, max = 1)}
+               The image is taken from the loop when it is given, otherwise it is computed with one FFT of the
+               DOE. Nothing is computed or copied between two previews.
+
+    Inputs : MANDATORY : preview : function called with the preview dict
+                         total {int} : number of iterations of the run
+
+              OPTIONAL : every {int} : a preview is sent every "every" iterations - default value = 10
+                         interval {float}[s] : and at least every interval seconds - default value = 0.5
+                         max_size {int}[pixel] : largest side of the preview - default value = 256
+                         kernel : propagation kernel (see PropagationKernel) when the image is at finite distance
+    """
+
+    def __init__(self, preview, total, every=10, interval=0.5, max_size=256, kernel=None):
+        self.preview = preview
+        self.total = total
+        self.every = every
+        self.interval = interval
+        self.max_size = max_size
+        self.kernel = kernel
+        self.last = time.perf_counter()
+
+    def __call__(self, iteration, holo_phase, image=None):
+        now = time.perf_counter()
+        if iteration % self.every != 0 and iteration != self.total and now - self.last < self.interval:
+            return
+        self.last = now
+
+        factor = int(np.ceil(max(holo_phase.shape) / self.max_size))
+        phase = np.remainder(holo_phase[::factor, ::factor], 2 * np.pi) * (256 / (2 * np.pi))
+
+        if image is None:
+            image = np.fft.fft2(np.exp(1j * holo_phase))
+            image = np.fft.fftshift(image) if self.kernel is None else np.fft.ifft2(image * self.kernel)
+        if np.iscomplexobj(image):
+            image = np.abs(image) ** 2
+        h, w = (np.array(image.shape) // factor) * factor
+        image = image[:h, :w].reshape(h // factor, factor, w // factor, factor).mean(axis=(1, 3))
+        image = (image / max(image.max(), np.finfo(float).tiny)).astype(np.float32)
+
+        self.preview({"iteration": iteration, "total": self.total,
+                      "phase": np.minimum(phase, 255).astype(np.uint8), "image": image})
+
+
 def GetCartesianCoordinates(nrows, **kargs):
     """
     GetCartesianCoordinates : generate two arrays representing the cartesian coordinates
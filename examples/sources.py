@@ -1,26 +1,27 @@
 import numpy as np
 import sys
+from functools import lru_cache
+from math import factorial
 from PyQt5.QtWidgets import QApplication
 from DiffractionSection import RealTimeCrossSectionViewer 
+from fields import SeparableField, ThinLensField, grid_coordinates
 
 def plane_wave_rectangular(shape = (512,512)):
     """
-    Create a centered rectangular aperture.
+    Create a uniform plane wave.
 
     Args:
         shape (tuple): Output image size (height, width).
-        size (tuple): Rectangle size (height, width).
 
     Returns:
-        2D np.array: Binary image with 1s inside the rectangle, 0s outside.
+        SeparableField: Lazy field of 1s (see fields.SeparableField).
     """
-    # Create a SQUARE aperture (instead of circular)
-    aperture = np.ones(shape)
-    return aperture.astype(np.float64)
+    h, w = shape
+    return SeparableField(np.ones(h), np.ones(w))
 
 def plane_wave_elliptical(shape = (512,512), size = (200,300), dx = 1):
     """
-    Create a centered elliptical aperture.
+    Create a centered elliptical plane wave.
     
     Args:
         shape (tuple): Output image size (height, width) in pixels.
@@ -28,24 +29,18 @@ def plane_wave_elliptical(shape = (512,512), size = (200,300), dx = 1):
         dx (float): Sampling rate (physical size per pixel).
         
     Returns:
-        2D np.array: Binary image with 1s inside the ellipse, 0s outside.
+        SeparableField: Lazy binary field, 1s inside the ellipse, 0s outside.
     """
     h, w = shape
     big_diameter, small_diameter = size
     
-    # Create coordinate grids centered at zero, scaled by dx
-    x = (np.arange(w) - w//2) * dx
-    y = (np.arange(h) - h//2) * dx
-    X, Y = np.meshgrid(x, y)
-    
     # Ellipse semi-axes
     a = big_diameter / 2
     b = small_diameter / 2
     
-    # Equation of ellipse: (X/a)^2 + (Y/b)^2 <= 1
-    aperture = ((X / a)**2 + (Y / b)**2) <= 1
-    
-    return aperture.astype(np.float64)
+    # Equation of ellipse: (X/a)^2 + (Y/b)^2 <= 1, evaluated by broadcasting the 1D coordinates
+    return SeparableField(grid_coordinates(h, dx), grid_coordinates(w, dx),
+                          lambda y, x: (x / a)**2 + (y / b)**2 <= 1, fill=np.inf, dtype=np.float64)
 
 def gaussian_beam(shape=(512, 512), w0=50, dx=1.0):
     """
@@ -57,27 +52,113 @@ def gaussian_beam(shape=(512, 512), w0=50, dx=1.0):
         dx (float): Sampling rate (size of each pixel).
 
     Returns:
-        2D np.array: Gaussian intensity profile.
+        SeparableField: Lazy gaussian profile, exp(-2 r^2 / w0^2) = exp(-2 y^2 / w0^2) * exp(-2 x^2 / w0^2).
     """
     h, w = shape
-    x = (np.arange(w) - w // 2) * dx
-    y = (np.arange(h) - h // 2) * dx
-    X, Y = np.meshgrid(x, y)
+    x = grid_coordinates(w, dx)
+    y = grid_coordinates(h, dx)
+    return SeparableField(np.exp(-2 * y**2 / w0**2), np.exp(-2 * x**2 / w0**2))
 
-    r_squared = X**2 + Y**2
-    intensity = np.exp(-2 * r_squared / w0**2)
+def converging_spherical_wave(shape=(512, 512), wavelength = 0.633, focal_length = 1e4, dx = 1.0):
+    """
+    Generate a converging spherical wave (paraxial), exp(-i pi r^2 / (lambda f)).
 
-    return intensity.astype(np.float64)
+    Args:
+        shape (tuple): Output image size (height, width) in pixels.
+        wavelength (float): Wavelength, same unit as dx.
+        focal_length (float): Distance to the focus, same unit as dx.
+        dx (float): Sampling rate (size of each pixel).
 
-def converging_spherical_wave(shape=(512, 512), wavelength = 0.633, focal_length = 1e4, dx = 1.0):
+    Returns:
+        ThinLensField: Lazy unit-modulus complex field, a plane wave through a thin lens. The propagators
+                       handle the lens analytically (lens_propagation), the phase is sampled for display only.
+    """
+    h, w = shape
+    return ThinLensField(np.ones(h), np.ones(w), focal_length, wavelength, dx)
+
+
+def noll_to_nm(j):
+    """
+    Radial and azimuthal orders (n, m) of the Zernike polynomial of Noll index j (j >= 1).
+    m > 0 is a cosine term, m < 0 a sine term.
+    """
+    n = int((-1 + np.sqrt(8 * (j - 1) + 1)) / 2)
+    p = j - n * (n + 1) // 2
+    k = n % 2
+    m = (p + k) // 2 * 2 - k
+    if m != 0 and j % 2 == 1:
+        m = -m
+    return n, m
+
+@lru_cache(maxsize=8)
+def zernike_basis(shape=(512, 512), dx=1.0, pupil_radius=256.0, n_terms=15):
+    """
+    Zernike polynomials (Noll order and normalization) sampled on the pixels of a circular pupil, cached.
+
+    Only the pixels inside the pupil are stored, as float32: a wavefront is then one matrix-vector
+    product, coefficients @ basis, whatever the number of coefficients that change.
+
+    Args:
+        shape (tuple): Output image size (height, width) in pixels.
+        dx (float): Sampling rate (size of each pixel).
+        pupil_radius (float): Radius of the pupil (rho = 1), same unit as dx.
+        n_terms (int): Number of polynomials, Noll indices 1 to n_terms.
+
+    Returns:
+        inside (np.array): Flat indices of the pupil pixels.
+        basis (np.array): Read-only float32 array (n_terms, len(inside)).
+    """
     h, w = shape
-    x = (np.arange(w) - w // 2) * dx
-    y = (np.arange(h) - h // 2) * dx
-    X,Y = np.meshgrid(x,y)
+    x = grid_coordinates(w, dx) / pupil_radius
+    y = grid_coordinates(h, dx) / pupil_radius
+    rho2 = (y**2)[:, np.newaxis] + (x**2)[np.newaxis, :]
+    inside = np.flatnonzero(rho2 <= 1)
+    rows, cols = np.divmod(inside, w)
+    rho = np.sqrt(rho2.ravel()[inside])
+    theta = np.arctan2(y[rows], x[cols])
+
+    basis = np.empty((n_terms, inside.size), dtype=np.float32)
+    for j in range(1, n_terms + 1):
+        n, m = noll_to_nm(j)
+        radial = sum((-1)**k * factorial(n - k) / (factorial(k) * factorial((n + abs(m)) // 2 - k) * factorial((n - abs(m)) // 2 - k))
+                     * rho**(n - 2 * k) for k in range((n - abs(m)) // 2 + 1))
+        if m == 0:
+            basis[j - 1] = np.sqrt(n + 1) * radial
+        elif m > 0:
+            basis[j - 1] = np.sqrt(2 * (n + 1)) * radial * np.cos(m * theta)
+        else:
+            basis[j - 1] = np.sqrt(2 * (n + 1)) * radial * np.sin(-m * theta)
+    basis.setflags(write=False)     # shared by the cache
+    return inside, basis
+
+def zernike_source(coefficients, shape=(512, 512), dx=1.0, pupil_radius=256.0, wavelength=1.0, amplitude=None):
+    """
+    Generate a field with a Zernike wavefront error over a circular pupil, exp(2i pi W / wavelength).
+
+    Args:
+        coefficients (list): Zernike coefficients in Noll order (piston, tilt x, tilt y, defocus... see noll_to_nm), same unit
+                             as wavelength (the default wavelength = 1 gives coefficients in waves).
+        shape (tuple): Output image size (height, width) in pixels.
+        dx (float): Sampling rate (size of each pixel).
+        pupil_radius (float): Radius of the pupil, same unit as dx. The field is 0 outside.
+        wavelength (float): Wavelength, same unit as the coefficients.
+        amplitude (np.array or SeparableField): Amplitude of the beam (e.g. gaussian_beam), uniform if None.
+
+    Returns:
+        2D np.array: complex64 field.
+    """
+    coefficients = np.asarray(coefficients, dtype=np.float32)
+    inside, basis = zernike_basis(tuple(shape), float(dx), float(pupil_radius), coefficients.size)
+    wavefront = coefficients @ basis
+
+    source = np.zeros(shape, dtype=np.complex64)
+    source.ravel()[inside] = np.exp((2j * np.pi / wavelength) * wavefront)
+    if amplitude is None:
+        return source
+    if isinstance(amplitude, SeparableField):
+        return amplitude.multiply(source, out=source)
+    return np.multiply(source, amplitude, out=source)
 
-    source = np.exp( -1j * np.pi/(focal_length*wavelength)*(X**2 + Y**2))
-    source /= np.abs(source)
-    return source
 
 if __name__ == "__main__":
 
@@ -90,7 +171,7 @@ if __name__ == "__main__":
     z = 10                 # 10 meters propagation distance
     radius = 0.1e-3        # 0.1 mm aperture
 
-    aperture = plane_wave_elliptical()
+    aperture = np.asarray(plane_wave_elliptical())
 
     num_slices = 1
     # Repeat the aperture and FFT along z axis
@@ -0,0 +1,177 @@
+import os
+
+import numpy as np
+import tifffile
+from PIL import Image, GifImagePlugin
+
+from display_pipeline import display_transform, estimate_levels, subsample, volume_slice
+
+
+def sweep_levels(volume, mode, levels=None, percentiles=(1, 99.98), max_samples=2**15):
+    """
+    One (low, high) pair for every slice of a sweep, so that the exported frames are comparable.
+
+    Args:
+        volume (np.array or VolumeProvider): (l, h, w) field.
+        mode (str): Display mode, see display_pipeline.display_transform.
+        levels (list): Precomputed levels of each slice (display_pipeline.field_levels): their widest range.
+                       If None, the percentiles of a subsample of the whole sweep, read one slice at a time.
+        percentiles (tuple): Percentiles, in [0, 100].
+        max_samples (int): Size of the subsample.
+
+    Returns:
+        tuple: (low, high).
+    """
+    if levels is not None:
+        return (min(slice_levels[mode][0] for slice_levels in levels),
+                max(slice_levels[mode][1] for slice_levels in levels))
+    per_slice = max(max_samples // len(volume), 1)
+    samples = np.concatenate([display_transform(subsample(volume_slice(volume, index), per_slice), mode)
+                              for index in range(len(volume))])
+    return estimate_levels(samples, percentiles, max_samples)
+
+
+def ramp_lut(color=(255, 255, 255)):
+    """(256, 3) uint8 LUT from black to color, the colour maps of the viewers (grey scale by default)."""
+    return np.linspace(0, color, 256).astype(np.uint8)
+
+
+def frame_indices(image, levels):
+    """Display image mapped to uint8 LUT indices, levels[0] -> 0, levels[1] -> 255, clipped."""
+    low, high = levels
+    scale = 255 / (high - low) if high > low else 0.0
+    indices = (image - low) * scale
+    np.clip(indices, 0, 255, out=indices)
+    return indices.astype(np.uint8)
+
+
+def iter_frames(volume, mode, levels, luts=None):
+    """
+    Frames of a sweep, computed one slice at a time: the memory used does not depend on the sweep length.
+
+    Args:
+        volume (np.array or VolumeProvider): (l, h, w) field.
+        mode (str): Display mode.
+        levels (tuple): (low, high), the same for every frame (sweep_levels).
+        luts (np.array or list): (256, 3) LUT of every frame, or one LUT per frame (wavelength sweeps).
+                                 Grey scale if None.
+
+    Yields:
+        tuple: (h, w) uint8 indices, (256, 3) uint8 LUT of the frame.
+    """
+    for index in range(len(volume)):
+        if luts is None:
+            lut = ramp_lut()
+        elif isinstance(luts, np.ndarray):
+            lut = luts
+        else:
+            lut = luts[index]
+        yield frame_indices(display_transform(volume_slice(volume, index), mode), levels), lut
+
+
+def _palette_image(indices, lut):
+    image = Image.fromarray(indices, mode="L")
+    image.putpalette(np.asarray(lut, dtype=np.uint8).tobytes())  # "L" -> "P", the indices are kept
+    return image
+
+
+def export_tiff(path, frames, n_frames, bigtiff=False, callback=None):
+    """
+    Multi-page 8-bit TIFF, one page per frame (RGB, or grey scale for grey LUTs), written page by page.
+    bigtiff is required above 4 GB.
+    """
+    with tifffile.TiffWriter(path, bigtiff=bigtiff) as tiff:
+        for index, (indices, lut) in enumerate(frames):
+            # contiguous : the pages form one (l, h, w[, 3]) series for the readers
+            if np.array_equal(lut, ramp_lut()):
+                tiff.write(indices, photometric="minisblack", contiguous=True)
+            else:
+                tiff.write(lut[indices], photometric="rgb", contiguous=True)
+            if callback:
+                callback(int((index + 1) / n_frames * 100))
+
+
+def export_gif(path, frames, n_frames, fps=10, callback=None):
+    """
+    Animated GIF, looping, written frame by frame.
+
+    Image.save(save_all=True) keeps every frame until the end of the file, the header and the frames are
+    written here with the GifImagePlugin helpers instead. The indices are stored with the LUT as palette,
+    without quantization: a local palette per frame when the LUT changes (wavelength sweeps).
+    """
+    duration = int(round(1000 / fps))
+    global_lut = None
+    with open(path, "wb") as fp:
+        for index, (indices, lut) in enumerate(frames):
+            image = _palette_image(indices, lut)
+            if global_lut is None:
+                global_lut = lut
+                header, _ = GifImagePlugin.getheader(image, info={"loop": 0, "duration": duration, "optimize": False})
+                fp.write(b"".join(header))
+            local_palette = not np.array_equal(lut, global_lut)
+            for data in GifImagePlugin.getdata(image, duration=duration, include_color_table=local_palette):
+                fp.write(data)
+            if callback:
+                callback(int((index + 1) / n_frames * 100))
+        fp.write(b";")  # trailer
+
+
+def export_png_sequence(path, frames, n_frames, callback=None):
+    """Numbered palette PNGs, path "sweep.png" -> "sweep_0000.png", "sweep_0001.png", ..."""
+    stem, extension = os.path.splitext(path)
+    digits = max(len(str(n_frames - 1)), 4)
+    for index, (indices, lut) in enumerate(frames):
+        _palette_image(indices, lut).save(f"{stem}_{index:0{digits}d}{extension}")
+        if callback:
+            callback(int((index + 1) / n_frames * 100))
+
+
+def export_sweep(path, volume, mode="Intensity", levels=None, luts=None, fps=10, callback=None):
+    """
+    Export a sweep as an animation, the format given by the extension of path: multi-page TIFF
+    (.tif, .tiff), animated GIF (.gif) or PNG sequence (.png).
+
+    The frames are streamed from the volume one slice at a time with the same levels and colour mapping,
+    so that a sweep stored on disk (volume_providers.MemmapVolume, np.load(mmap_mode="r")) is exported in
+    constant memory. No display is needed: the export can run from a batch job.
+
+    Args:
+        path (str): Output file.
+        volume (np.array or VolumeProvider): (l, h, w) field.
+        mode (str): Display mode, see display_pipeline.display_transform.
+        levels (tuple): (low, high) of every frame, sweep_levels(volume, mode) if None.
+        luts (np.array or list): See iter_frames.
+        fps (float): Frame rate of the GIF.
+        callback (callable): Progress callback, percentage.
+    """
+    if levels is None:
+        levels = sweep_levels(volume, mode)
+    frames = iter_frames(volume, mode, levels, luts)
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".tif", ".tiff"):
+        rgb_bytes = int(np.prod(volume.shape)) * 3
+        export_tiff(path, frames, len(volume), rgb_bytes > 2**32 - 2**25, callback)
+    elif extension == ".gif":
+        export_gif(path, frames, len(volume), fps, callback)
+    elif extension == ".png":
+        export_png_sequence(path, frames, len(volume), callback)
+    else:
+        raise ValueError(f"Unknown export format {extension}, use .tiff, .gif or .png")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from display_pipeline import DISPLAY_MODES
+
+    parser = argparse.ArgumentParser(description="Export a (l, h, w) sweep saved with np.save as an animation.")
+    parser.add_argument("volume", help=".npy file, read one slice at a time")
+    parser.add_argument("output", help="output .tiff, .gif or .png (numbered sequence)")
+    parser.add_argument("--mode", default="Intensity", choices=DISPLAY_MODES)
+    parser.add_argument("--levels", type=float, nargs=2, default=None, metavar=("LOW", "HIGH"))
+    parser.add_argument("--fps", type=float, default=10)
+    args = parser.parse_args()
+
+    export_sweep(args.output, np.load(args.volume, mmap_mode="r"), args.mode, args.levels, fps=args.fps,
+                 callback=lambda percent: print(f"\r{percent} %", end=""))
+    print()
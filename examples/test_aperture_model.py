@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from aperture_model import Ellipse, Rectangle, render
+from apertures import (elliptical_aperture, rectangular_aperture, slit_aperture, square_aperture_array,
+                       elliptical_aperture_array, slit_model, square_array_model, elliptical_array_model)
+
+
+def Expression():
+    # slits with a central stop, and a rotated ellipse crossing them
+    slits = Rectangle(3, 40).grid((8, 50), (5, 1)) - Rectangle(10, 10)
+    return slits | Ellipse(20, 6).rotate(0.3).translate(x=15, y=-4)
+
+
+def Contains(node, shape, dx, origin):
+    h, w = shape
+    x = (np.arange(w) - origin[1]) * dx
+    y = (np.arange(h) - origin[0]) * dx
+    return np.broadcast_to(node.contains(x[np.newaxis, :], y[:, np.newaxis]), shape)
+
+
+@pytest.mark.parametrize("tile", [7, 16, 256])
+@pytest.mark.parametrize("shape, origin", [((64, 64), None), ((57, 70), (20, 41))])
+def test_render_is_contains(tile, shape, origin):
+    # the tiles pruned by the bounding boxes are empty, whatever the tile size
+    node = Expression()
+    expected = Contains(node, shape, 0.9, (shape[0] // 2, shape[1] // 2) if origin is None else origin)
+    mask = render(node, shape, dx=0.9, tile=tile, origin=origin)
+    assert mask.shape == shape
+    np.testing.assert_array_equal(mask.unpack(), expected)
+
+
+def test_render_outside_the_image():
+    assert render(Rectangle(4, 4).translate(x=500), (32, 32)).count() == 0
+
+
+@pytest.mark.parametrize("shape, size, dx", [((64, 64), (30, 20), 1.0), ((65, 50), (21, 33), 0.7)])
+def test_primitives_match_the_generators(shape, size, dx):
+    np.testing.assert_array_equal(render(Ellipse(*size), shape, dx).unpack(),
+                                  elliptical_aperture(shape, size, dx) != 0)
+    origin = (-(-shape[0] // 2), -(-shape[1] // 2))
+    np.testing.assert_array_equal(render(Rectangle(*size), shape, dx, origin=origin).unpack(),
+                                  rectangular_aperture(shape, size, dx) != 0)
+
+
+def Pixels(model, shape):
+    return np.zeros(shape, bool) if model is None else render(model, shape, 1.0, origin=(0, 0)).unpack()
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_pixel_models_match_the_array_generators(seed):
+    rng = np.random.default_rng(seed)
+    shape = tuple(int(n) for n in rng.integers(30, 120, 2))
+    dx = float(rng.choice([0.5, 0.7, 1.0, 1.3]))
+    # slits anywhere up to twice the image, the outer ones running off the edge
+    size = tuple(float(v) for v in rng.uniform(1, 2 * min(shape) * dx, 2))
+    W = float(rng.uniform(1, 10)) * dx
+    d = W + float(rng.uniform(1, 10)) * dx
+    if max(size) <= max(shape) * dx:
+        np.testing.assert_array_equal(Pixels(slit_model(shape, size, W, d, dx), shape),
+                                      slit_aperture(shape, size, W, d, dx) != 0)
+    # array grids that fit in the image, cells not touching each other
+    grid = tuple(int(n) for n in rng.integers(1, 5, 2))
+    spacing = float(rng.uniform(4, min(shape) / max(grid))) * dx
+    big = float(rng.uniform(1, 0.9 * spacing / dx)) * dx
+    small = float(rng.uniform(1, big / dx)) * dx
+    np.testing.assert_array_equal(Pixels(square_array_model(shape, big, spacing, grid, dx), shape),
+                                  square_aperture_array(shape, big, spacing, grid, dx) != 0)
+    np.testing.assert_array_equal(Pixels(elliptical_array_model(shape, big, small, spacing, grid, dx), shape),
+                                  elliptical_aperture_array(shape, big, small, spacing, grid, dx) != 0)
+
+
+def test_slit_model_drops_the_slits_off_the_edge():
+    shape, size, W, d, dx = (59, 92), (23, 26), 9, 11, 0.5
+    mask = slit_aperture(shape, size, W, d, dx) != 0
+    np.testing.assert_array_equal(Pixels(slit_model(shape, size, W, d, dx), shape), mask)
+    assert not mask[0].any() and not mask[-1].any()
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from apertures import (coverage_stamp, element_stamp, elliptical_aperture, hexagonal_centers, interval_coverage,
+                       point_list_aperture, random_centers, rectangular_aperture)
+
+
+def Reference(shape, centers, stamp, dx):
+    # one element at a time, clipped by slicing
+    h, w = shape
+    kh, kw = stamp.shape
+    padded = np.zeros((h + 2 * kh, w + 2 * kw))
+    for x, y in centers:
+        row, col = int(np.round(y / dx)) + h // 2 - kh // 2 + kh, int(np.round(x / dx)) + w // 2 - kw // 2 + kw
+        if 0 <= row <= padded.shape[0] - kh and 0 <= col <= padded.shape[1] - kw:
+            padded[row:row + kh, col:col + kw] += stamp
+    return np.clip(padded[kh:kh + h, kw:kw + w], 0, 1)
+
+
+@pytest.mark.parametrize("method", ["scatter", "fft", "auto"])
+@pytest.mark.parametrize("element", ["ellipse", "rectangle"])
+def test_point_list_aperture(method, element):
+    # overlapping elements, and elements across the borders
+    shape, dx = (60, 75), 0.5
+    centers = np.random.default_rng(0).uniform(-22, 22, (40, 2)) * [1.0, 0.8]
+    stamp = element_stamp((5.0, 7.0), dx, element)
+    aperture = point_list_aperture(shape, centers, stamp, dx, method)
+    assert aperture.dtype == np.float32
+    np.testing.assert_array_equal(aperture, Reference(shape, centers, stamp, dx))
+
+
+def test_point_list_aperture_unknown_method():
+    with pytest.raises(ValueError):
+        point_list_aperture((8, 8), [(0, 0)], np.ones((1, 1)), method="loop")
+
+
+def test_hexagonal_centers():
+    pitch = 3.0
+    centers = hexagonal_centers((30.0, 40.0), pitch)
+    assert np.all(np.abs(centers[:, 0]) <= 20) and np.all(np.abs(centers[:, 1]) <= 15)
+    d = np.sqrt(np.sum((centers[:, np.newaxis] - centers[np.newaxis]) ** 2, axis=-1))
+    np.fill_diagonal(d, np.inf)
+    np.testing.assert_allclose(d.min(axis=1), pitch)
+
+
+@pytest.mark.parametrize("min_distance", [0.0, 1.5, 2.5])
+def test_random_centers(min_distance):
+    extent = (40.0, 60.0)
+    centers = random_centers(200, extent, min_distance, seed=1)
+    assert len(centers) == 200
+    assert np.all(np.abs(centers[:, 0]) <= 30) and np.all(np.abs(centers[:, 1]) <= 20)
+    if min_distance:
+        d = np.sqrt(np.sum((centers[:, np.newaxis] - centers[np.newaxis]) ** 2, axis=-1))
+        np.fill_diagonal(d, np.inf)
+        assert d.min() >= min_distance
+
+
+def test_random_centers_full_rectangle():
+    # at most one centre per disc of diameter min_distance : fewer than n centres, all valid
+    centers = random_centers(1000, (10.0, 10.0), 2.0, seed=2)
+    assert 0 < len(centers) < 1000
+    d = np.sqrt(np.sum((centers[:, np.newaxis] - centers[np.newaxis]) ** 2, axis=-1))
+    np.fill_diagonal(d, np.inf)
+    assert d.min() >= 2.0
+
+
+@pytest.mark.parametrize("phase", [(0.0, 0.0), (0.25, 0.5), (0.875, 0.125)])
+@pytest.mark.parametrize("size, dx", [((7.0, 4.5), 1.0), ((10.0, 13.0), 0.6)])
+def test_rectangle_stamp_area_is_exact(size, dx, phase):
+    stamp = coverage_stamp("rectangle", size, dx, phase)
+    assert stamp.min() >= 0 and stamp.max() <= 1
+    assert stamp.sum() == pytest.approx(size[0] * size[1] / dx**2, rel=1e-12)
+
+
+@pytest.mark.parametrize("phase", [(0.0, 0.0), (0.25, 0.5), (0.875, 0.125)])
+@pytest.mark.parametrize("size, dx", [((20.0, 12.0), 1.0), ((31.0, 31.0), 0.5)])
+def test_ellipse_stamp_area(size, dx, phase):
+    # supersampled edge : the error on the area is a fraction of the edge pixels, not of the pixels
+    stamp = coverage_stamp("ellipse", size, dx, phase, supersample=16)
+    area = np.pi * size[0] * size[1] / 4 / dx**2
+    assert stamp.min() >= 0 and stamp.max() <= 1
+    assert stamp.sum() == pytest.approx(area, rel=2e-3)
+
+
+def test_stamp_is_cached_and_read_only():
+    stamp = coverage_stamp("ellipse", (9.0, 9.0), 1.0, (0.5, 0.5))
+    assert coverage_stamp("ellipse", (9.0, 9.0), 1.0, (0.5, 0.5)) is stamp
+    with pytest.raises(ValueError):
+        stamp[0, 0] = 1
+    with pytest.raises(ValueError):
+        coverage_stamp("hexagon", (9.0, 9.0), 1.0, (0.0, 0.0))
+
+
+def test_interval_coverage():
+    coverage = interval_coverage(20, [5.25, 14.0], 3.5)
+    assert coverage.sum() == pytest.approx(7.0)
+    # overlapping intervals are merged
+    assert interval_coverage(20, [10.0, 10.5], 4.0).sum() == pytest.approx(4.5)
+
+
+@pytest.mark.parametrize("shape, size, dx", [((64, 64), (30, 20), 1.0), ((65, 50), (21, 33), 0.7)])
+def test_antialiased_generators_area(shape, size, dx):
+    rectangle = rectangular_aperture(shape, size, dx, antialias=True)
+    assert rectangle.sum() == pytest.approx(size[0] * size[1] / dx**2, rel=1e-12)
+    ellipse = elliptical_aperture(shape, size, dx, antialias=True)
+    assert ellipse.sum() == pytest.approx(np.pi * size[0] * size[1] / 4 / dx**2, rel=1e-2)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from automatic_sizing import zero_pad
+from binary_mask import BinaryMask, transmit
+
+
+def RandomMasks(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random(shape) < 0.5, rng.random(shape) < 0.3
+
+
+@pytest.mark.parametrize("shape", [(5, 1), (7, 64), (9, 70), (2, 3, 130)])
+def test_round_trip(shape):
+    a, _ = RandomMasks(shape)
+    mask = BinaryMask.from_array(a)
+    assert mask.packed.shape[-1] % 8 == 0
+    np.testing.assert_array_equal(mask.unpack(), a)
+    np.testing.assert_array_equal(np.asarray(mask), a.astype(np.float64))
+    assert mask.count() == a.sum()
+
+
+@pytest.mark.parametrize("width", [64, 70, 129])
+def test_operators_match_bool_arrays(width):
+    a, b = RandomMasks((11, width))
+    ma, mb = BinaryMask.from_array(a), BinaryMask.from_array(b)
+    np.testing.assert_array_equal((ma | mb).unpack(), a | b)
+    np.testing.assert_array_equal((ma & mb).unpack(), a & b)
+    np.testing.assert_array_equal((ma - mb).unpack(), a & ~b)
+    np.testing.assert_array_equal((ma ^ mb).unpack(), a ^ b)
+    np.testing.assert_array_equal((~ma).unpack(), ~a)
+    # the padding bits stay at 0 : counts and comparisons are not affected by the complement
+    assert (~ma).count() == (~a).sum()
+    assert ~~ma == ma
+    assert ma != mb
+
+
+def test_unmatched_shapes():
+    with pytest.raises(AssertionError):
+        BinaryMask.zeros((4, 8)) | BinaryMask.zeros((4, 16))
+
+
+@pytest.mark.parametrize("new_shape", [(20, 95), (21, 78), (13, 31)])
+def test_zero_pad_matches_automatic_sizing(new_shape):
+    # column shifts 32 (whole bytes), 23 (unpacked by blocks of 4 rows) and 0
+    a, _ = RandomMasks((1, 13, 31))
+    padded = BinaryMask.from_array(a).zero_pad(new_shape, block_rows=4)
+    assert padded.shape == (1, *new_shape)
+    assert padded == BinaryMask.from_array(zero_pad(a.astype(np.float64), new_shape))
+
+
+def test_transmit():
+    a, _ = RandomMasks((6, 10))
+    source = np.exp(1j * np.arange(60).reshape(6, 10))
+    np.testing.assert_array_equal(transmit(source, BinaryMask.from_array(a)), source * a)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from diffraction_propagation import angular_spectrum, hermitian_fft2, lens_propagation, meridional_plane
+
+
+def Gaussian(n, dx, waist):
+    x = (np.arange(n) - n//2) * dx
+    return np.exp(-(x[np.newaxis, :]**2 + x[:, np.newaxis]**2) / waist**2)
+
+
+@pytest.mark.parametrize("shape", [(16, 16), (15, 17), (1, 5), (3, 8, 9)])
+def test_hermitian_fft2_is_fft2(shape):
+    U0 = np.random.default_rng(0).standard_normal(shape)
+    np.testing.assert_allclose(hermitian_fft2(U0), np.fft.fft2(U0), atol=1e-10)
+    np.testing.assert_allclose(hermitian_fft2(U0, shift=True), np.fft.fftshift(np.fft.fft2(U0), axes=(-2, -1)), atol=1e-10)
+
+
+@pytest.mark.parametrize("focal_length, z, waist", [(1e3, 500.0, 40.0), (-1e3, 500.0, 25.0), (340.0, 510.0, 12.0)])
+def test_lens_propagation_is_angular_spectrum_of_the_lens_phase(focal_length, z, waist):
+    # magnification 1/2, 3/2 and -1/2 (inverted image) : the output pixels fall on the input grid, where the
+    # lens, sampled without aliasing on the beam, is propagated by the angular spectrum method as reference
+    # (exact, the paraxial error of lens_propagation is below the tolerance)
+    n, dx, wavelength = 128, 2.0, 0.5
+    x = (np.arange(n) - n//2) * dx
+    k = 2 * np.pi / wavelength
+    U0 = Gaussian(n, dx, waist)
+    lens = np.exp(-1j * k * (x[np.newaxis, :]**2 + x[:, np.newaxis]**2) / (2 * focal_length))
+
+    Uz, dx_out = lens_propagation(U0, wavelength, focal_length, z, dx)
+    assert dx_out == pytest.approx(abs(1 - z / focal_length) * dx)
+    reference = angular_spectrum(U0 * lens, wavelength, z, dx)
+
+    u = (np.arange(n) - n//2) * dx_out / dx
+    on_grid = np.nonzero((np.abs(u - np.round(u)) < 1e-6) & (np.abs(u) < n//2))[0]
+    rows = np.round(u[on_grid]).astype(int) + n//2
+    scale = np.abs(reference).max()
+    np.testing.assert_allclose(Uz[np.ix_(on_grid, on_grid)] / scale, reference[np.ix_(rows, rows)] / scale, atol=2e-3)
+
+
+def test_lens_propagation_focal_plane_energy():
+    n, dx, wavelength, focal_length = 128, 2.0, 0.5, 1e4
+    U0 = Gaussian(n, dx, 40.0)
+    Uz, dx_out = lens_propagation(U0, wavelength, focal_length, focal_length, dx)
+    assert dx_out == pytest.approx(wavelength * focal_length / (n * dx))
+    # Parseval : the energy is kept through the scaled Fourier transform
+    assert np.sum(np.abs(Uz)**2) * dx_out**2 == pytest.approx(np.sum(np.abs(U0)**2) * dx**2, rel=1e-9)
+    assert np.unravel_index(np.argmax(np.abs(Uz)), Uz.shape) == (n//2, n//2)
+
+
+@pytest.mark.parametrize("axis", ["x", "y"])
+def test_meridional_plane_is_angular_spectrum(axis):
+    n, dx, wavelength = 64, 1.0, 0.5
+    rng = np.random.default_rng(1)
+    U0 = Gaussian(n, dx, 8.0) * np.exp(1j * rng.uniform(0, 0.5, (n, n)))
+    index = 20
+    # 70 planes : the transfer function is re-seeded once (every 64 planes)
+    intensity, Z = meridional_plane(U0, wavelength, dx, 0.0, 70.0, 1.0, axis=axis, index=index)
+    assert intensity.shape == (70, n)
+    for i in (0, 1, 63, 64, 69):
+        Uz = angular_spectrum(U0, wavelength, Z[i], dx)
+        line = Uz[index] if axis == "x" else Uz[:, index]
+        np.testing.assert_allclose(intensity[i], np.abs(line)**2, atol=1e-10)
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+import tifffile
+from PIL import Image, ImageSequence
+
+from sweep_export import export_sweep, frame_indices, iter_frames, ramp_lut, sweep_levels
+
+
+def Sweep(l=4, h=12, w=9):
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((l, h, w)) + 1j * rng.standard_normal((l, h, w))
+
+
+def Indices(volume, levels, mode="Intensity"):
+    return [indices for indices, _ in iter_frames(volume, mode, levels)]
+
+
+def test_frame_indices():
+    np.testing.assert_array_equal(frame_indices(np.array([-1.0, 0.0, 0.5, 1.0, 2.0]), (0.0, 1.0)),
+                                  [0, 0, 127, 255, 255])
+    # flat image : no division by zero
+    np.testing.assert_array_equal(frame_indices(np.ones(3), (1.0, 1.0)), [0, 0, 0])
+
+
+def test_sweep_levels_from_precomputed_levels():
+    levels = [{"Intensity": (1.0, 4.0)}, {"Intensity": (0.5, 3.0)}]
+    assert sweep_levels(None, "Intensity", levels) == (0.5, 4.0)
+
+
+def test_tiff_round_trip(tmp_path):
+    volume = Sweep()
+    levels = sweep_levels(volume, "Intensity")
+    path = str(tmp_path / "sweep.tiff")
+    export_sweep(path, volume, levels=levels)
+    np.testing.assert_array_equal(tifffile.imread(path), Indices(volume, levels))
+
+
+def test_tiff_rgb_lut(tmp_path):
+    volume = Sweep()
+    lut = ramp_lut((255, 0, 0))
+    path = str(tmp_path / "sweep.tif")
+    export_sweep(path, volume, mode="Amplitude", levels=(0.0, 2.0), luts=lut)
+    np.testing.assert_array_equal(tifffile.imread(path), lut[np.array(Indices(volume, (0.0, 2.0), "Amplitude"))])
+
+
+def test_gif_round_trip(tmp_path):
+    # one LUT per frame : local palettes, the indices are kept (colour LUTs : Pillow reads the frames after
+    # a grey first frame as grey, whatever their local palette)
+    volume = Sweep()
+    levels = (0.0, 3.0)
+    luts = [ramp_lut((255, 0, 0)), ramp_lut((0, 255, 0)), ramp_lut((0, 255, 0)), ramp_lut((255, 0, 0))]
+    path = str(tmp_path / "sweep.gif")
+    export_sweep(path, volume, levels=levels, luts=luts)
+    with Image.open(path) as gif:
+        # the iterator seeks the same image : each frame is read before the next one
+        frames = [np.asarray(frame.convert("RGB")) for frame in ImageSequence.Iterator(gif)]
+    assert len(frames) == len(volume)
+    for frame, indices, lut in zip(frames, Indices(volume, levels), luts):
+        np.testing.assert_array_equal(frame, lut[indices])
+
+
+def test_png_sequence_round_trip(tmp_path):
+    volume = Sweep()
+    levels = sweep_levels(volume, "Phase")
+    export_sweep(str(tmp_path / "sweep.png"), volume, mode="Phase", levels=levels)
+    for index, indices in enumerate(Indices(volume, levels, "Phase")):
+        with Image.open(tmp_path / f"sweep_{index:04d}.png") as image:
+            np.testing.assert_array_equal(np.asarray(image), indices)
+
+
+def test_memmap_volume(tmp_path):
+    volume = Sweep()
+    np.save(tmp_path / "sweep.npy", volume)
+    path = str(tmp_path / "sweep.tiff")
+    export_sweep(path, np.load(tmp_path / "sweep.npy", mmap_mode="r"))
+    np.testing.assert_array_equal(tifffile.imread(path), Indices(volume, sweep_levels(volume, "Intensity")))
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        export_sweep(str(tmp_path / "sweep.avi"), Sweep())
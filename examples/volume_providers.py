@@ -0,0 +1,186 @@
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import numpy as np
+
+
+class VolumeProvider(ABC):
+    """
+    (l, h, w) volume read one slice at a time.
+
+    The viewers only use shape, dtype, len(volume) and volume[index], a (h, w) slice: the volume does not
+    have to be resident in memory. Subclasses are backed by an array (ArrayVolume), a file on disk
+    (MemmapVolume) or a function computing the slices on demand (ComputedVolume); they implement __getitem__.
+    """
+
+    def __init__(self, shape, dtype):
+        """
+        Args:
+            shape (tuple): (l, h, w).
+            dtype (np.dtype): Type of the slices.
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        return int(np.prod(self.shape)) * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    @abstractmethod
+    def __getitem__(self, index):
+        """(h, w) slice index."""
+
+    def gather(self, rows, cols, stop=None):
+        """
+        Values at the same pixels of every slice, e.g. the neighbours of a line profile (kymograph). Read slice
+        by slice here, the volumes backed by an array read only the pixels asked for.
+
+        Args:
+            rows (np.array), cols (np.array): Pixel indices, same shape.
+            stop (int): Number of slices read from the first one, all by default.
+
+        Returns:
+            np.array: (stop, *rows.shape) values.
+        """
+        stop = len(self) if stop is None else stop
+        values = np.empty((stop, *np.shape(rows)), dtype=self.dtype)
+        for index in range(stop):
+            values[index] = np.asarray(self[index])[rows, cols]
+        return values
+
+    def __array__(self, dtype=None, copy=None):
+        # the whole volume in memory, for the code that needs it at once
+        volume = np.empty(self.shape, dtype=self.dtype if dtype is None else dtype)
+        for index in range(len(self)):
+            volume[index] = self[index]
+        return volume
+
+    def __repr__(self):
+        return f"{type(self).__name__}(shape={self.shape}, dtype={self.dtype})"
+
+
+class ArrayVolume(VolumeProvider):
+    """Volume held in an array (or any object indexable by slice)."""
+
+    def __init__(self, array):
+        super().__init__(array.shape, array.dtype)
+        self.array = array
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def gather(self, rows, cols, stop=None):
+        if isinstance(self.array, np.ndarray):
+            return self.array[:stop, rows, cols]
+        return super().gather(rows, cols, stop)
+
+
+class MemmapVolume(VolumeProvider):
+    """
+    Volume stored in a raw binary file, mapped in memory: the slices are read from disk when accessed and
+    the operating system keeps the recently used pages, so a volume larger than the RAM can be browsed.
+    """
+
+    def __init__(self, file, shape, dtype, mode="r", offset=0):
+        """
+        Args:
+            file (str or file object): File of the volume, C order.
+            shape (tuple): (l, h, w).
+            dtype (np.dtype): Type of the values.
+            mode (str): np.memmap mode, "r" to read an existing volume, "w+" to create it.
+            offset (int): Position of the volume in the file, in bytes.
+        """
+        super().__init__(shape, dtype)
+        self.file = file
+        self.array = np.memmap(file, dtype=self.dtype, mode=mode, shape=self.shape, offset=offset)
+
+    @classmethod
+    def temporary(cls, shape, dtype):
+        """Writable volume in an anonymous temporary file, deleted with the volume."""
+        return cls(tempfile.TemporaryFile(), shape, dtype, mode="w+")
+
+    def __getitem__(self, index):
+        return np.array(self.array[index])
+
+    def gather(self, rows, cols, stop=None):
+        # only the pages holding the pixels are read from disk
+        return np.array(self.array[:stop, rows, cols])
+
+    def __setitem__(self, index, value):
+        self.array[index] = value
+
+
+class ComputedVolume(VolumeProvider):
+    """
+    Volume whose slices are computed on demand by a function, the last computed ones kept in a small LRU.
+
+    The slices are computed in the thread asking for them (the display worker for the viewers).
+    """
+
+    def __init__(self, compute, shape, dtype, cache_size=4):
+        """
+        Args:
+            compute (callable): index -> (h, w) slice.
+            shape (tuple): (l, h, w).
+            dtype (np.dtype): Type of the slices.
+            cache_size (int): Number of slices kept.
+        """
+        super().__init__(shape, dtype)
+        self.compute = compute
+        self.cache_size = cache_size
+        self._slices = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, index):
+        with self._lock:
+            if index in self._slices:
+                self._slices.move_to_end(index)
+                return self._slices[index]
+        value = np.asarray(self.compute(index), dtype=self.dtype)
+        with self._lock:
+            self._slices[index] = value
+            while len(self._slices) > self.cache_size:
+                self._slices.popitem(last=False)
+        return value
+
+
+class GrowingVolume(VolumeProvider):
+    """
+    Volume filled one slice at a time, e.g. the planes of a sweep displayed while the next ones are computed.
+
+    The producer writes the slices in store; grow() makes the first slices visible once they are written, so
+    the readers only see complete slices.
+    """
+
+    def __init__(self, store):
+        """
+        Args:
+            store (np.array or VolumeProvider): (capacity, h, w) volume the slices are written to.
+        """
+        super().__init__((0, *store.shape[1:]), store.dtype)
+        self.store = store
+        self.capacity = store.shape[0]
+
+    def grow(self, length):
+        """The first length slices are complete."""
+        assert length <= self.capacity, f"Volume full. {length} slices, capacity {self.capacity}."
+        self.shape = (length, *self.shape[1:])
+
+    def __getitem__(self, index):
+        assert 0 <= index < len(self), f"Slice {index} not computed yet, {len(self)} slices."
+        return self.store[index]
+
+    def gather(self, rows, cols, stop=None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        if isinstance(self.store, VolumeProvider):
+            return self.store.gather(rows, cols, stop)
+        return self.store[:stop, rows, cols]